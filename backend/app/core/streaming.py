@@ -0,0 +1,45 @@
+"""Helpers for streaming responses: opt-in NDJSON and server-sent events."""
+
+import json
+from typing import Any, AsyncIterable, Iterable, Optional
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+SSE_MEDIA_TYPE = "text/event-stream"
+
+
+def wants_ndjson(request: Request, format: Optional[str] = None) -> bool:
+    """True when the client asked for NDJSON via ?format=ndjson or the Accept header."""
+    if format:
+        return format == "ndjson"
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def ndjson_response(lines: Iterable[str], headers: Optional[dict] = None) -> StreamingResponse:
+    """Stream an iterable of JSON documents, one per line."""
+    return StreamingResponse(
+        (line + "\n" for line in lines),
+        media_type=NDJSON_MEDIA_TYPE,
+        headers=headers,
+    )
+
+
+def sse_event(event: str, data: Any) -> str:
+    """Format one server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def sse_response(events: AsyncIterable[str]) -> StreamingResponse:
+    """Stream pre-formatted SSE events, unbuffered by proxies.
+
+    Each event is sent as soon as it is produced; the generator is only
+    resumed once the previous event has been handed to the server, and it
+    is cancelled when the client disconnects.
+    """
+    return StreamingResponse(
+        events,
+        media_type=SSE_MEDIA_TYPE,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
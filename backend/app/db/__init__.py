@@ -1,4 +1,4 @@
 from app.db.database import Base, engine, SessionLocal, get_db
-from app.db.models import Book, Chapter, Insight, UserBook
+from app.db.models import Book, Chapter, ChapterSegment, Insight, UserBook
 
-__all__ = ["Base", "engine", "SessionLocal", "get_db", "Book", "Chapter", "Insight", "UserBook"]
+__all__ = ["Base", "engine", "SessionLocal", "get_db", "Book", "Chapter", "ChapterSegment", "Insight", "UserBook"]
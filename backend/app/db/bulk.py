@@ -0,0 +1,109 @@
+"""Bulk row loading: PostgreSQL COPY, executemany INSERT elsewhere.
+
+Ingesting a book writes hundreds of chapters and insights at once. On
+PostgreSQL those rows are streamed with ``COPY ... FROM STDIN`` inside the
+session's transaction, which skips per-row statement parsing and planning.
+Column defaults (ids, JSON lists) are filled in Python first so the caller
+knows every row's id without a RETURNING round trip.
+"""
+
+import io
+import json
+from datetime import date, datetime
+from typing import Any, Dict, List
+
+from sqlalchemy import JSON, insert
+from sqlalchemy.orm import Session
+from sqlalchemy.types import TypeDecorator
+
+
+def copy_supported(bind) -> bool:
+    """COPY is used on PostgreSQL only."""
+    return bind.dialect.name == "postgresql"
+
+
+def with_defaults(model, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Fill client-side column defaults (e.g. generated ids) into every row."""
+    filled = []
+    for row in rows:
+        row = dict(row)
+        for column in model.__table__.columns:
+            default = column.default
+            if column.key in row or default is None:
+                continue
+            if default.is_callable:
+                row[column.key] = default.arg(None)
+            elif default.is_scalar:
+                row[column.key] = default.arg
+        filled.append(row)
+    return filled
+
+
+def bulk_insert(db: Session, model, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Insert rows inside the session's transaction; returns them with defaults filled.
+
+    The caller commits. Server-side defaults (``created_at``) are applied by
+    the database as usual.
+    """
+    if not rows:
+        return []
+    rows = with_defaults(model, rows)
+    db.flush()  # Pending ORM changes must land before the raw COPY
+    if copy_supported(db.get_bind()):
+        _copy(db, model.__table__, rows)
+    else:
+        db.execute(insert(model.__table__), rows)
+    return rows
+
+
+def _copy(db: Session, table, rows: List[Dict[str, Any]]) -> None:
+    """Stream rows through COPY on the session's own connection."""
+    columns = [c for c in table.columns if c.key in rows[0]]
+    connection = db.connection()
+    dialect = connection.dialect
+    processors = [_value_processor(column, dialect) for column in columns]
+    names = ", ".join(dialect.identifier_preparer.quote(c.name) for c in columns)
+    statement = f"COPY {dialect.identifier_preparer.format_table(table)} ({names}) FROM STDIN"
+    values = ([process(row.get(c.key)) for c, process in zip(columns, processors)] for row in rows)
+
+    raw = connection.connection.driver_connection
+    cursor = raw.cursor()
+    try:
+        if hasattr(cursor, "copy"):  # psycopg 3: typed rows, adapted by the driver
+            with cursor.copy(statement) as copy:
+                for row in values:
+                    copy.write_row(row)
+        else:  # psycopg2: COPY text format
+            buffer = io.StringIO()
+            for row in values:
+                buffer.write("\t".join(_copy_text(v) for v in row) + "\n")
+            buffer.seek(0)
+            cursor.copy_expert(statement, buffer)
+    finally:
+        cursor.close()
+
+
+def _value_processor(column, dialect):
+    """Python-side conversion a normal INSERT would apply to this column."""
+    if isinstance(column.type, TypeDecorator):
+        return lambda value: column.type.process_bind_param(value, dialect)
+    if isinstance(column.type, JSON):
+        return lambda value: None if value is None else json.dumps(value)
+    return lambda value: value
+
+
+# Characters with a meaning in COPY text format
+COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def _copy_text(value) -> str:
+    """Render one value as a COPY text-format field (``\\N`` is NULL)."""
+    if value is None:
+        return "\\N"
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        value = "\\x" + bytes(value).hex()
+    elif isinstance(value, bool):
+        value = "t" if value else "f"
+    elif isinstance(value, (datetime, date)):
+        value = value.isoformat()
+    return str(value).translate(COPY_ESCAPES)
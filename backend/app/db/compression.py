@@ -0,0 +1,144 @@
+"""Transparent compressed storage for large text columns.
+
+Values are stored as bytes prefixed with a one-byte codec marker so every row
+records how it was written. Rows written before compression was enabled are
+plain TEXT and are returned untouched, so old and new rows can coexist until
+``migrate_content.py`` rewrites them.
+
+SQLite stores either kind in the same column; on PostgreSQL the column is
+``bytea`` and values are always written with a marker (raw when compression
+is disabled).
+"""
+
+import zlib
+from typing import Optional
+
+from sqlalchemy import LargeBinary, Text
+from sqlalchemy.types import TypeDecorator
+
+from app.core.config import get_settings
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional, zlib is always available
+    zstandard = None
+
+settings = get_settings()
+
+# Codec markers (first byte of the stored value)
+CODEC_RAW = 0x00
+CODEC_ZLIB = 0x01
+CODEC_ZSTD = 0x02
+
+CODEC_NAMES = {"none": CODEC_RAW, "zlib": CODEC_ZLIB, "zstd": CODEC_ZSTD}
+
+# Below this size the header and codec overhead outweigh the savings
+MIN_COMPRESS_BYTES = 256
+
+
+def zstd_available() -> bool:
+    """Whether the optional zstandard package is installed."""
+    return zstandard is not None
+
+
+def resolve_codec(name: Optional[str] = None) -> int:
+    """Map a codec name (or the configured default) to its marker."""
+    name = (name or settings.CONTENT_COMPRESSION).lower()
+    if name == "auto":
+        return CODEC_ZSTD if zstd_available() else CODEC_ZLIB
+    if name not in CODEC_NAMES:
+        raise ValueError(f"Unknown compression codec: {name}")
+    if name == "zstd" and not zstd_available():
+        raise ValueError("zstd compression requested but the zstandard package is not installed")
+    return CODEC_NAMES[name]
+
+
+def compress_text(text: str, codec: Optional[int] = None, level: Optional[int] = None) -> bytes:
+    """Encode text and compress it with the given (or configured) codec."""
+    codec = resolve_codec() if codec is None else codec
+    level = settings.CONTENT_COMPRESSION_LEVEL if level is None else level
+    raw = text.encode("utf-8")
+
+    if codec == CODEC_RAW or len(raw) < MIN_COMPRESS_BYTES:
+        return bytes([CODEC_RAW]) + raw
+    if codec == CODEC_ZLIB:
+        return bytes([CODEC_ZLIB]) + zlib.compress(raw, level)
+    if codec == CODEC_ZSTD:
+        return bytes([CODEC_ZSTD]) + zstandard.ZstdCompressor(level=level).compress(raw)
+    raise ValueError(f"Unknown compression codec marker: {codec}")
+
+
+def decompress_text(value) -> Optional[str]:
+    """Decode a stored value; plain strings (legacy rows) pass through."""
+    if value is None or isinstance(value, str):
+        return value
+
+    value = bytes(value)
+    if not value:
+        return ""
+    codec, payload = value[0], value[1:]
+    if codec == CODEC_RAW:
+        return payload.decode("utf-8")
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(payload).decode("utf-8")
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise ValueError("Row is zstd-compressed but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompress(payload).decode("utf-8")
+    raise ValueError(f"Unknown compression codec marker: {codec}")
+
+
+def decompress_prefix(value, size: int) -> bytes:
+    """The first ``size`` UTF-8 bytes of a stored value, decompressing no more than that.
+
+    The result may end inside a character; callers decode it leniently.
+    """
+    if value is None or size <= 0:
+        return b""
+    if isinstance(value, str):
+        return value.encode("utf-8")[:size]
+
+    value = bytes(value)
+    if not value:
+        return b""
+    codec, payload = value[0], value[1:]
+    if codec == CODEC_RAW:
+        return payload[:size]
+    if codec == CODEC_ZLIB:
+        return zlib.decompressobj().decompress(payload, size)
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise ValueError("Row is zstd-compressed but the zstandard package is not installed")
+        chunks, remaining = [], size
+        with zstandard.ZstdDecompressor().stream_reader(payload) as reader:
+            while remaining > 0:
+                chunk = reader.read(remaining)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                remaining -= len(chunk)
+        return b"".join(chunks)
+    raise ValueError(f"Unknown compression codec marker: {codec}")
+
+
+class CompressedText(TypeDecorator):
+    """Text column stored compressed, with a per-row codec marker."""
+
+    impl = Text
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "postgresql":
+            return dialect.type_descriptor(LargeBinary())
+        return dialect.type_descriptor(Text())
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return value
+        if not settings.CONTENT_COMPRESSION_ENABLED:
+            # A bytea column can't take str, so keep the marker and skip compression
+            return compress_text(value, CODEC_RAW) if dialect.name == "postgresql" else value
+        return compress_text(value)
+
+    def process_result_value(self, value, dialect):
+        return decompress_text(value)
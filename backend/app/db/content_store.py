@@ -0,0 +1,160 @@
+"""Append-only, memory-mapped segment store for chapter text.
+
+Chapter text is appended as UTF-8 to segment files (``segment-00001.dat``,
+...) and located through the ``chapter_segments`` table. Each record is the
+text followed by a table of word checkpoints (the byte offset of every
+``WORD_STRIDE``-th word), so a window of words can be found without scanning
+the whole chapter.
+
+Reads go through ``mmap``: byte ranges come back as memoryviews over the
+mapping, and the OS page cache is shared by every worker process that maps
+the same segment. Rewritten chapters are appended again; the old bytes stay
+in place until segments are compacted.
+"""
+
+import mmap
+import os
+import re
+import threading
+from array import array
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+from app.core.config import get_settings
+from app.db.database import DATA_DIR
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are serialized per process only
+    fcntl = None
+
+settings = get_settings()
+
+WORD_STRIDE = 256
+WORD_PATTERN = re.compile(rb"\S+")
+
+
+class SegmentLocation(NamedTuple):
+    """Where a chapter's record lives inside the segment files."""
+    segment: int
+    offset: int
+    length: int
+    checkpoint_count: int
+
+
+class SegmentStore:
+    """Append-only chapter text storage read through mmap."""
+
+    def __init__(self, directory: str, max_segment_bytes: int = 64 * 1024 * 1024):
+        self.directory = directory
+        self.max_segment_bytes = max_segment_bytes
+        self._lock = threading.Lock()
+        self._maps: dict[int, mmap.mmap] = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"segment-{segment:05d}.dat")
+
+    def _current_segment(self) -> int:
+        segments = [
+            int(name[8:13]) for name in os.listdir(self.directory)
+            if name.startswith("segment-") and name.endswith(".dat")
+        ]
+        return max(segments) if segments else 1
+
+    def append(self, text: str) -> SegmentLocation:
+        """Append chapter text and its word checkpoints; returns the record location."""
+        raw = text.encode("utf-8")
+        checkpoints = array("I")
+        for i, match in enumerate(WORD_PATTERN.finditer(raw)):
+            if i % WORD_STRIDE == 0:
+                checkpoints.append(match.start())
+        record = raw + checkpoints.tobytes()
+
+        with self._lock:
+            segment = self._current_segment()
+            if os.path.exists(self._path(segment)) and \
+                    os.path.getsize(self._path(segment)) + len(record) > self.max_segment_bytes:
+                segment += 1
+            with open(self._path(segment), "ab") as f:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    offset = f.seek(0, os.SEEK_END)
+                    f.write(record)
+                    f.flush()
+                    os.fsync(f.fileno())
+                finally:
+                    if fcntl:
+                        fcntl.flock(f, fcntl.LOCK_UN)
+        return SegmentLocation(segment, offset, len(raw), len(checkpoints))
+
+    def _map(self, segment: int, needed: int) -> mmap.mmap:
+        """Return a mapping of the segment covering at least ``needed`` bytes."""
+        mapped = self._maps.get(segment)
+        if mapped is None or len(mapped) < needed:
+            with open(self._path(segment), "rb") as f:
+                # Old mappings are dropped, not closed: callers may still hold views into them
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[segment] = mapped
+        return mapped
+
+    def _bounds(self, loc: SegmentLocation, start: int, end: Optional[int]) -> tuple[int, int]:
+        end = loc.length if end is None else min(end, loc.length)
+        start = max(0, min(start, end))
+        return loc.offset + start, loc.offset + end
+
+    def read_bytes(self, loc: SegmentLocation, start: int = 0, end: Optional[int] = None) -> memoryview:
+        """Zero-copy view of bytes [start, end) of a chapter's UTF-8 text."""
+        mapped = self._map(loc.segment, loc.offset + loc.length)
+        begin, stop = self._bounds(loc, start, end)
+        return memoryview(mapped)[begin:stop]
+
+    def read_text(self, loc: SegmentLocation, start: int = 0, end: Optional[int] = None) -> str:
+        """Decode bytes [start, end) of a chapter, snapped to character boundaries."""
+        mapped = self._map(loc.segment, loc.offset + loc.length)
+        begin, stop = self._bounds(loc, start, end)
+        chapter_end = loc.offset + loc.length
+        # Skip UTF-8 continuation bytes so we never split a character
+        while begin < stop and (mapped[begin] & 0xC0) == 0x80:
+            begin += 1
+        while stop < chapter_end and (mapped[stop] & 0xC0) == 0x80:
+            stop += 1
+        return mapped[begin:stop].decode("utf-8")
+
+    def read_words(self, loc: SegmentLocation, start_word: int, count: int) -> str:
+        """Text spanning words [start_word, start_word + count) of a chapter."""
+        if count <= 0 or start_word < 0:
+            return ""
+        checkpoint = start_word // WORD_STRIDE
+        if checkpoint >= loc.checkpoint_count:
+            return ""
+
+        table_offset = loc.offset + loc.length
+        mapped = self._map(loc.segment, table_offset + 4 * loc.checkpoint_count)
+        checkpoints = memoryview(mapped)[table_offset:table_offset + 4 * loc.checkpoint_count].cast("I")
+        pos = loc.offset + checkpoints[checkpoint]
+        checkpoints.release()
+
+        skip = start_word - checkpoint * WORD_STRIDE
+        first = last = None
+        for i, match in enumerate(WORD_PATTERN.finditer(mapped, pos, table_offset)):
+            if i < skip:
+                continue
+            if first is None:
+                first = match.start()
+            last = match.end()
+            if i - skip + 1 >= count:
+                break
+        if first is None:
+            return ""
+        return mapped[first:last].decode("utf-8", errors="replace")
+
+
+@lru_cache()
+def get_content_store() -> Optional[SegmentStore]:
+    """The configured segment store, or None when text lives in the database."""
+    if settings.CONTENT_BACKEND != "segments":
+        return None
+    directory = settings.CONTENT_SEGMENT_DIR or os.path.join(DATA_DIR, "segments")
+    return SegmentStore(directory, settings.CONTENT_SEGMENT_MAX_BYTES)
@@ -1,10 +1,21 @@
 """CRUD operations for database models."""
 
-from typing import List, Optional, Dict, Any
-from sqlalchemy.orm import Session
-from sqlalchemy import desc
-
-from app.db.models import Book, Chapter, Insight, UserBook, Note
+import re
+from datetime import datetime, timezone
+from typing import List, Optional, Dict, Any, Iterator, Tuple
+from sqlalchemy.orm import Session, undefer
+from sqlalchemy import (
+    and_, desc, func, insert, inspect, literal_column, or_, select, update, DateTime, String, tuple_, type_coerce
+)
+
+from app.db.models import Book, Chapter, ChapterSegment, Insight, UserBook, Note
+from app.db.content_store import SegmentLocation, get_content_store
+from app.db.search import index_chapter
+from app.db import intervals as note_intervals
+from app.db.bulk import bulk_insert, copy_supported
+from app.db.compression import decompress_prefix
+from app.db.response_cache import invalidate as invalidate_cached
+from app.db.pagination import InvalidCursor, encode_cursor, decode_cursor
 
 
 # ==================== Book CRUD ====================
@@ -50,12 +61,96 @@ def get_or_create_book(
     return book
 
 
+BOOK_SORT_COLUMNS = {"created_at": Book.created_at, "title": Book.title}
+
+
+def _stored_as_text(db: Session) -> bool:
+    """SQLite keeps timestamps as text, so they are compared as stored; servers compare native values."""
+    return db.get_bind().dialect.name == "sqlite"
+
+
+def _sort_key(db: Session, column):
+    """``column`` as compared in keyset cursors and range filters."""
+    return type_coerce(column, String) if _stored_as_text(db) else column
+
+
+def _cursor_value(db: Session, column, value):
+    """A cursor's sort value, converted back to a timestamp where the database compares those."""
+    if value is None or _stored_as_text(db) or not isinstance(column.type, DateTime):
+        return value
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise InvalidCursor("Malformed cursor")
+
+
+def _stored_timestamp(db: Session, value: datetime):
+    """``value`` as a created_at bound; stored times are UTC, as are naive inputs.
+
+    On SQLite this is the stored text format (server default), so boundaries are exact.
+    """
+    value = value.astimezone(timezone.utc) if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+    if not _stored_as_text(db):
+        return value
+    return value.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def list_books(
+    db: Session,
+    category: Optional[str] = None,
+    author: Optional[str] = None,
+    is_sample: Optional[bool] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    sort: str = "created_at",
+    descending: bool = True,
+    limit: int = 50,
+    cursor: Optional[str] = None
+) -> Tuple[List[Book], Optional[str]]:
+    """List books (content not loaded) with filters and keyset pagination.
+
+    Sorting is on (sort column, id); the cursor records the sort column and
+    the last row's key so each page is an index range scan.
+    """
+    sort_column = _sort_key(db, BOOK_SORT_COLUMNS[sort])
+    query = db.query(Book, sort_column)
+    if category:
+        query = query.filter(Book.category == category)
+    if author:
+        query = query.filter(Book.author == author)
+    if is_sample is not None:
+        query = query.filter(Book.sample_id.isnot(None) if is_sample else Book.sample_id.is_(None))
+    if created_after:
+        query = query.filter(_sort_key(db, Book.created_at) >= _stored_timestamp(db, created_after))
+    if created_before:
+        query = query.filter(_sort_key(db, Book.created_at) < _stored_timestamp(db, created_before))
+
+    if cursor:
+        cursor_sort, value, book_id = decode_cursor(cursor, 3)
+        if cursor_sort != f"{'-' if descending else ''}{sort}":
+            raise InvalidCursor("Cursor was issued for a different sort order")
+        value = _cursor_value(db, BOOK_SORT_COLUMNS[sort], value)
+        key = tuple_(sort_column, Book.id)
+        query = query.filter(key < tuple_(value, book_id) if descending else key > tuple_(value, book_id))
+
+    order = [desc(BOOK_SORT_COLUMNS[sort]), desc(Book.id)] if descending else [BOOK_SORT_COLUMNS[sort], Book.id]
+    rows = query.order_by(*order).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last_book, last_value = rows[-1]
+        next_cursor = encode_cursor(f"{'-' if descending else ''}{sort}", last_value, last_book.id)
+    return [book for book, _ in rows], next_cursor
+
+
 def update_book(db: Session, book_id: str, **kwargs) -> Optional[Book]:
     """Update book fields."""
     book = get_book(db, book_id)
     if not book:
         return None
     
+    invalidate_cached(db, ("book", book_id))
     for key, value in kwargs.items():
         if hasattr(book, key):
             setattr(book, key, value)
@@ -72,6 +167,19 @@ def get_chapter(db: Session, chapter_id: str) -> Optional[Chapter]:
     return db.query(Chapter).filter(Chapter.id == chapter_id).first()
 
 
+def get_chapter_token_count(db: Session, chapter_id: str, content: str) -> Optional[int]:
+    """Stored prompt token count of a chapter, if ``content`` is its stored text (None otherwise).
+
+    Callers pair the count with text sent by the client, which may be an
+    edited or different chapter; the word count rules most of those out
+    before the stored text is read.
+    """
+    chapter = get_chapter(db, chapter_id)
+    if chapter is None or chapter.token_count is None or chapter.word_count != len(content.split()):
+        return None
+    return chapter.token_count if get_chapter_content(db, chapter) == content else None
+
+
 def get_chapter_by_number(db: Session, book_id: str, chapter_number: int) -> Optional[Chapter]:
     """Get a chapter by book ID and chapter number."""
     return db.query(Chapter).filter(
@@ -87,41 +195,231 @@ def get_or_create_chapter(
     title: str,
     content: Optional[str] = None,
     summary: Optional[str] = None,
-    key_points: Optional[List[str]] = None
+    key_points: Optional[List[str]] = None,
+    token_count: Optional[int] = None
 ) -> Chapter:
-    """Get existing chapter or create new one."""
+    """Get existing chapter or create new one.
+
+    With the segment content backend the text is appended to the segment
+    store and Chapter.content is left empty. ``token_count`` is the prompt
+    token count of ``content``, counted by the caller.
+    """
+    store = get_content_store()
     existing = get_chapter_by_number(db, book_id, number)
     if existing:
         # Update if content changed
-        if content and existing.content != content:
-            existing.content = content
+        if content and get_chapter_content(db, existing) != content:
+            invalidate_cached(db, ("book", book_id))
+            existing.content = None if store else content
             existing.summary = summary or existing.summary
             existing.key_points = key_points or existing.key_points
+            existing.word_count = len(content.split())
+            existing.token_count = token_count
+            if store:
+                _store_chapter_content(db, existing.id, content)
+            index_chapter(db.connection(), existing.id, existing.title, content)
             db.commit()
             db.refresh(existing)
         return existing
     
     # Create new chapter
+    invalidate_cached(db, ("book", book_id))
     chapter = Chapter(
         book_id=book_id,
         number=number,
         title=title,
-        content=content,
+        content=None if store else content,
         summary=summary,
         key_points=key_points or [],
-        word_count=len(content.split()) if content else 0
+        word_count=len(content.split()) if content else 0,
+        token_count=token_count
     )
     db.add(chapter)
+    db.flush()  # Assign the chapter id before indexing its text
+    if store and content:
+        _store_chapter_content(db, chapter.id, content)
+    index_chapter(db.connection(), chapter.id, title, content)
     db.commit()
     db.refresh(chapter)
     return chapter
 
 
-def get_chapters_by_book(db: Session, book_id: str) -> List[Chapter]:
-    """Get all chapters for a book, ordered by number."""
-    return db.query(Chapter).filter(
-        Chapter.book_id == book_id
-    ).order_by(Chapter.number).all()
+def create_chapters(db: Session, book_id: str, chapters_data: List[Dict[str, Any]]) -> List[Chapter]:
+    """Bulk-create the chapters of a new book (COPY on PostgreSQL).
+
+    ``chapters_data`` items carry number, title, content, summary,
+    key_points and optionally token_count. Text goes to the segment store
+    when that backend is active, and every chapter is indexed for search
+    before the single commit.
+    """
+    store = get_content_store()
+    invalidate_cached(db, ("book", book_id))
+    rows = bulk_insert(db, Chapter, [
+        {
+            "book_id": book_id,
+            "number": data["number"],
+            "title": data["title"],
+            "content": None if store else data.get("content"),
+            "summary": data.get("summary"),
+            "key_points": data.get("key_points") or [],
+            "word_count": len(data["content"].split()) if data.get("content") else 0,
+            "token_count": data.get("token_count"),
+        }
+        for data in chapters_data
+    ])
+    for row, data in zip(rows, chapters_data):
+        if store and data.get("content"):
+            _store_chapter_content(db, row["id"], data["content"])
+        index_chapter(db.connection(), row["id"], row["title"], data.get("content"))
+    db.commit()
+    return _load_in_order(db, Chapter, [row["id"] for row in rows])
+
+
+def get_chapters_by_book(
+    db: Session,
+    book_id: str,
+    with_content: bool = False,
+    after_number: Optional[int] = None,
+    limit: Optional[int] = None
+) -> List[Chapter]:
+    """Get chapters for a book, ordered by number.
+
+    Chapter text is a deferred column; pass with_content=True to load it in
+    the same query instead of one lazy load per chapter. ``after_number`` and
+    ``limit`` page through the chapters by keyset on (book_id, number).
+    """
+    query = db.query(Chapter).filter(Chapter.book_id == book_id)
+    if with_content:
+        query = query.options(undefer(Chapter.content))
+    if after_number is not None:
+        query = query.filter(Chapter.number > after_number)
+    query = query.order_by(Chapter.number)
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
+
+
+def get_chapters_page(
+    db: Session,
+    book_id: str,
+    limit: int,
+    cursor: Optional[str] = None,
+    with_content: bool = False
+) -> Tuple[List[Chapter], Optional[str]]:
+    """Get one page of chapters and the cursor for the next page (None on the last)."""
+    after_number = None
+    if cursor:
+        try:
+            after_number = int(decode_cursor(cursor, 1)[0])
+        except (TypeError, ValueError):
+            raise InvalidCursor("Malformed cursor")
+    chapters = get_chapters_by_book(db, book_id, with_content, after_number, limit + 1)
+    if len(chapters) <= limit:
+        return chapters, None
+    chapters = chapters[:limit]
+    return chapters, encode_cursor(chapters[-1].number)
+
+
+def iter_chapter_pages(
+    db: Session,
+    book_id: str,
+    with_content: bool = False,
+    cursor: Optional[str] = None,
+    page_size: int = 50
+) -> Iterator[List[Chapter]]:
+    """Yield a book's chapters page by page, releasing each page once consumed."""
+    while True:
+        chapters, cursor = get_chapters_page(db, book_id, page_size, cursor, with_content)
+        if chapters:
+            yield chapters
+        db.expunge_all()
+        if cursor is None:
+            return
+
+
+# ==================== Chapter Text ====================
+
+def _store_chapter_content(db: Session, chapter_id: str, content: str) -> None:
+    """Append chapter text to the segment store and point the index at it."""
+    location = get_content_store().append(content)
+    entry = db.get(ChapterSegment, chapter_id)
+    if entry is None:
+        db.add(ChapterSegment(chapter_id=chapter_id, **location._asdict()))
+    else:
+        for key, value in location._asdict().items():
+            setattr(entry, key, value)
+
+
+def get_chapter_location(db: Session, chapter_id: str) -> Optional[SegmentLocation]:
+    """Get where a chapter's text lives in the segment store, if it is stored there."""
+    entry = db.get(ChapterSegment, chapter_id)
+    if entry is None:
+        return None
+    return SegmentLocation(entry.segment, entry.offset, entry.length, entry.checkpoint_count)
+
+
+def get_chapter_content(db: Session, chapter: Chapter) -> Optional[str]:
+    """Get a chapter's full text from whichever backend holds it."""
+    store = get_content_store()
+    if store:
+        location = get_chapter_location(db, chapter.id)
+        if location:
+            return store.read_text(location)
+    return chapter.content
+
+
+def get_chapter_contents(db: Session, chapters: List[Chapter]) -> Dict[str, Optional[str]]:
+    """Get the text of several chapters, resolving segment locations in one query."""
+    store = get_content_store()
+    if not store or not chapters:
+        return {c.id: c.content for c in chapters}
+
+    entries = db.query(ChapterSegment).filter(
+        ChapterSegment.chapter_id.in_([c.id for c in chapters])
+    ).all()
+    locations = {
+        e.chapter_id: SegmentLocation(e.segment, e.offset, e.length, e.checkpoint_count)
+        for e in entries
+    }
+    return {
+        c.id: store.read_text(locations[c.id]) if c.id in locations else c.content
+        for c in chapters
+    }
+
+
+def read_chapter_range(db: Session, chapter: Chapter, start: int, end: Optional[int] = None) -> str:
+    """Read UTF-8 byte range [start, end) of a chapter, snapped to character boundaries.
+
+    Served straight from the memory-mapped segment when available. From the
+    database, a bounded range of text not loaded yet is decompressed only as
+    far as ``end``; otherwise the full text is loaded and sliced.
+    """
+    store = get_content_store()
+    location = get_chapter_location(db, chapter.id) if store else None
+    if location:
+        return store.read_text(location, start, end)
+
+    if end is not None and "content" in inspect(chapter).unloaded:
+        stored = db.execute(select(literal_column("content")).select_from(Chapter.__table__)
+                            .where(Chapter.id == chapter.id)).scalar()
+        raw = decompress_prefix(stored, end)
+    else:
+        raw = (chapter.content or "").encode("utf-8")
+    return raw[start:end].decode("utf-8", errors="ignore")
+
+
+def read_chapter_words(db: Session, chapter: Chapter, start_word: int, count: int) -> str:
+    """Read a window of ``count`` words starting at word ``start_word``."""
+    store = get_content_store()
+    location = get_chapter_location(db, chapter.id) if store else None
+    if location:
+        return store.read_words(location, start_word, count)
+
+    content = chapter.content or ""
+    words = list(re.finditer(r"\S+", content))[start_word:start_word + count] if count > 0 else []
+    if not words:
+        return ""
+    return content[words[0].start():words[-1].end()]
 
 
 # ==================== Insight CRUD ====================
@@ -138,11 +436,57 @@ def get_insights_by_chapter(db: Session, chapter_id: str) -> List[Insight]:
     ).order_by(desc(Insight.created_at)).all()
 
 
-def get_insights_by_book(db: Session, book_id: str, limit: int = 100) -> List[Insight]:
-    """Get all insights for a book."""
-    return db.query(Insight).filter(
-        Insight.book_id == book_id
-    ).order_by(desc(Insight.created_at)).limit(limit).all()
+def get_insights_by_book(
+    db: Session,
+    book_id: str,
+    limit: int = 100,
+    cursor: Optional[str] = None
+) -> List[Insight]:
+    """Get insights for a book, newest first."""
+    return get_insights_page(db, book_id, limit, cursor)[0]
+
+
+def get_insights_page(
+    db: Session,
+    book_id: str,
+    limit: int = 100,
+    cursor: Optional[str] = None
+) -> Tuple[List[Insight], Optional[str]]:
+    """Get one page of a book's insights (newest first) and the next-page cursor.
+
+    Keyset pagination on (created_at, id): the cursor holds the stored
+    created_at value of the last row, compared as stored so rows sharing a
+    timestamp are split on id without gaps or repeats.
+    """
+    created_raw = _sort_key(db, Insight.created_at)
+    query = db.query(Insight, created_raw).filter(Insight.book_id == book_id)
+    if cursor:
+        created_at, insight_id = decode_cursor(cursor, 2)
+        created_at = _cursor_value(db, Insight.created_at, created_at)
+        query = query.filter(tuple_(created_raw, Insight.id) < tuple_(created_at, insight_id))
+    rows = query.order_by(desc(Insight.created_at), desc(Insight.id)).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][1], rows[-1][0].id)
+    return [insight for insight, _ in rows], next_cursor
+
+
+def iter_insight_pages(
+    db: Session,
+    book_id: str,
+    cursor: Optional[str] = None,
+    page_size: int = 200
+) -> Iterator[List[Insight]]:
+    """Yield a book's insights page by page, releasing each page once consumed."""
+    while True:
+        insights, cursor = get_insights_page(db, book_id, page_size, cursor)
+        if insights:
+            yield insights
+        db.expunge_all()
+        if cursor is None:
+            return
 
 
 def create_insight(
@@ -157,6 +501,7 @@ def create_insight(
     ai_model: Optional[str] = None
 ) -> Insight:
     """Create a new insight."""
+    invalidate_cached(db, ("chapter-insights", chapter_id), ("book-insights", book_id))
     insight = Insight(
         book_id=book_id,
         chapter_id=chapter_id,
@@ -181,26 +526,74 @@ def create_insights_batch(
     insights_data: List[Dict[str, Any]],
     ai_model: Optional[str] = None
 ) -> List[Insight]:
-    """Create multiple insights at once."""
-    insights = []
-    for data in insights_data:
-        insight = Insight(
-            book_id=book_id,
-            chapter_id=chapter_id,
-            title=data.get("title", ""),
-            summary=data.get("summary", ""),
-            evidence=data.get("evidence", ""),
-            implication=data.get("implication", ""),
-            insight_type=data.get("insight_type", "pattern"),
-            ai_model=ai_model,
-            is_ai_generated=1
-        )
-        db.add(insight)
-        insights.append(insight)
-    
+    """Create multiple insights at once (COPY on PostgreSQL, one executemany elsewhere)."""
+    invalidate_cached(db, ("chapter-insights", chapter_id), ("book-insights", book_id))
+    rows = bulk_insert(db, Insight, _insight_rows(book_id, chapter_id, insights_data, ai_model))
     db.commit()
-    for insight in insights:
-        db.refresh(insight)
+    return _load_in_order(db, Insight, [row["id"] for row in rows])
+
+
+def _insight_rows(
+    book_id: str,
+    chapter_id: str,
+    insights_data: List[Dict[str, Any]],
+    ai_model: Optional[str]
+) -> List[Dict[str, Any]]:
+    return [
+        {
+            "book_id": book_id,
+            "chapter_id": chapter_id,
+            "title": data.get("title", ""),
+            "summary": data.get("summary", ""),
+            "evidence": data.get("evidence", ""),
+            "implication": data.get("implication", ""),
+            "insight_type": data.get("insight_type", "pattern"),
+            "ai_model": ai_model,
+            "is_ai_generated": 1,
+        }
+        for data in insights_data
+    ]
+
+
+def _load_in_order(db: Session, model, ids: List[str]) -> list:
+    """Load rows by primary key in one query, in the order of ``ids``."""
+    if not ids:
+        return []
+    by_id = {obj.id: obj for obj in db.query(model).filter(model.id.in_(ids))}
+    return [by_id[i] for i in ids]
+
+
+def replace_chapter_insights(
+    db: Session,
+    book_id: str,
+    chapter_id: str,
+    insights_data: List[Dict[str, Any]],
+    ai_model: Optional[str] = None
+) -> List[Insight]:
+    """Atomically replace all insights of a chapter.
+
+    The delete and the bulk insert share one transaction, so readers see
+    either the old set or the new one, never an empty chapter. Rows come back
+    through INSERT ... RETURNING and are detached before the commit, so no
+    refresh SELECTs are issued. On PostgreSQL the rows are COPYed and read
+    back with a single SELECT in the same transaction instead.
+    """
+    try:
+        invalidate_cached(db, ("chapter-insights", chapter_id), ("book-insights", book_id))
+        db.query(Insight).filter(Insight.chapter_id == chapter_id).delete(synchronize_session=False)
+        insights = []
+        rows = _insight_rows(book_id, chapter_id, insights_data, ai_model)
+        if rows and copy_supported(db.get_bind()):
+            rows = bulk_insert(db, Insight, rows)
+            insights = _load_in_order(db, Insight, [row["id"] for row in rows])
+        elif rows:
+            insights = list(db.scalars(insert(Insight).returning(Insight), rows))
+        for insight in insights:
+            db.expunge(insight)  # Keep the loaded state instead of expiring it on commit
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
     return insights
 
 
@@ -214,6 +607,7 @@ def update_insight(
     if not insight:
         return None
     
+    invalidate_cached(db, ("chapter-insights", insight.chapter_id), ("book-insights", insight.book_id))
     for key, value in kwargs.items():
         if hasattr(insight, key):
             setattr(insight, key, value)
@@ -230,6 +624,7 @@ def delete_insight(db: Session, insight_id: str) -> bool:
     if not insight:
         return False
     
+    invalidate_cached(db, ("chapter-insights", insight.chapter_id), ("book-insights", insight.book_id))
     db.delete(insight)
     db.commit()
     return True
@@ -237,6 +632,8 @@ def delete_insight(db: Session, insight_id: str) -> bool:
 
 def delete_insights_by_chapter(db: Session, chapter_id: str) -> int:
     """Delete all insights for a chapter. Returns count deleted."""
+    book_id = db.query(Chapter.book_id).filter(Chapter.id == chapter_id).scalar()
+    invalidate_cached(db, ("chapter-insights", chapter_id), ("book-insights", book_id))
     count = db.query(Insight).filter(Insight.chapter_id == chapter_id).delete()
     db.commit()
     return count
@@ -275,9 +672,7 @@ def create_or_update_user_book(
             user_book.progress_percent = progress_percent
         if is_completed is not None:
             user_book.is_completed = 1 if is_completed else 0
-            if is_completed:
-                from sqlalchemy.sql import func
-                user_book.completed_at = func.now()
+            user_book.completed_at = func.now() if is_completed else None
         db.commit()
         db.refresh(user_book)
         return user_book
@@ -288,7 +683,8 @@ def create_or_update_user_book(
         book_id=book_id,
         current_chapter=current_chapter or 1,
         progress_percent=progress_percent or 0,
-        is_completed=1 if is_completed else 0
+        is_completed=1 if is_completed else 0,
+        completed_at=func.now() if is_completed else None
     )
     db.add(user_book)
     db.commit()
@@ -296,6 +692,64 @@ def create_or_update_user_book(
     return user_book
 
 
+PROGRESS_FIELDS = ("current_chapter", "progress_percent", "is_completed", "completed_at", "last_read_at")
+PROGRESS_BATCH_SIZE = 500
+
+
+def apply_progress_updates(db: Session, updates: List[Dict[str, Any]]) -> int:
+    """Write the latest progress for many (user, book) pairs in one transaction.
+
+    Each update carries ``user_id``, ``book_id`` and any of ``PROGRESS_FIELDS``.
+    Existing rows are updated by primary key and missing ones inserted in bulk;
+    updates for books that no longer exist are dropped. Reopening a book
+    (``is_completed`` 0) clears its ``completed_at``. Returns rows written.
+    """
+    written = 0
+    try:
+        for start in range(0, len(updates), PROGRESS_BATCH_SIZE):
+            batch = updates[start:start + PROGRESS_BATCH_SIZE]
+            keys = [(u["user_id"], u["book_id"]) for u in batch]
+            existing = {
+                (row.user_id, row.book_id): row.id
+                for row in db.query(UserBook.id, UserBook.user_id, UserBook.book_id).filter(
+                    tuple_(UserBook.user_id, UserBook.book_id).in_(keys)
+                )
+            }
+            missing_books = {u["book_id"] for u in batch if (u["user_id"], u["book_id"]) not in existing}
+            live_books = {
+                row.id for row in db.query(Book.id).filter(Book.id.in_(missing_books))
+            } if missing_books else set()
+
+            to_update, to_insert = [], []
+            for u in batch:
+                fields = {k: u[k] for k in PROGRESS_FIELDS if u.get(k) is not None}
+                if fields.get("is_completed") == 0:
+                    fields["completed_at"] = None
+                row_id = existing.get((u["user_id"], u["book_id"]))
+                if row_id:
+                    to_update.append({"id": row_id, **fields})
+                elif u["book_id"] in live_books:
+                    to_insert.append({
+                        "user_id": u["user_id"],
+                        "book_id": u["book_id"],
+                        "current_chapter": 1,
+                        "progress_percent": 0,
+                        "is_completed": 0,
+                        **fields,
+                    })
+
+            if to_update:
+                db.execute(update(UserBook), to_update)
+            if to_insert:
+                db.execute(insert(UserBook), to_insert)
+            written += len(to_update) + len(to_insert)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return written
+
+
 def get_user_books(db: Session, user_id: str) -> List[UserBook]:
     """Get all books for a user."""
     return db.query(UserBook).filter(
@@ -303,6 +757,43 @@ def get_user_books(db: Session, user_id: str) -> List[UserBook]:
     ).order_by(desc(UserBook.last_read_at)).all()
 
 
+def get_shelf(
+    db: Session,
+    user_id: str,
+    limit: int = 50,
+    cursor: Optional[str] = None
+) -> Tuple[List[Tuple[UserBook, Book, int, int]], Optional[str]]:
+    """One page of a user's shelf, most recently read first, in a single query.
+
+    Each row is (progress, book without content, chapter count, insight
+    count). Rows are walked in idx_userbook_recent order and progress read by
+    rowid, books by primary key and the counts from index-only correlated subqueries.
+    Keyset pagination on (last_read_at, id), compared as stored.
+    """
+    chapter_count = select(func.count()).where(
+        Chapter.book_id == UserBook.book_id
+    ).correlate(UserBook).scalar_subquery()
+    insight_count = select(func.count()).where(
+        Insight.book_id == UserBook.book_id
+    ).correlate(UserBook).scalar_subquery()
+    read_raw = _sort_key(db, UserBook.last_read_at)
+
+    query = db.query(UserBook, Book, chapter_count, insight_count, read_raw).join(
+        Book, Book.id == UserBook.book_id
+    ).filter(UserBook.user_id == user_id)
+    if cursor:
+        last_read_at, user_book_id = decode_cursor(cursor, 2)
+        last_read_at = _cursor_value(db, UserBook.last_read_at, last_read_at)
+        query = query.filter(tuple_(read_raw, UserBook.id) < tuple_(last_read_at, user_book_id))
+    rows = query.order_by(desc(UserBook.last_read_at), desc(UserBook.id)).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][4], rows[-1][0].id)
+    return [(user_book, book, chapters or 0, insights or 0) for user_book, book, chapters, insights, _ in rows], next_cursor
+
+
 # ==================== Note CRUD ====================
 
 def create_note(
@@ -341,6 +832,36 @@ def get_notes_by_chapter(db: Session, user_id: str, chapter_id: str) -> List[Not
     ).order_by(desc(Note.created_at)).all()
 
 
+def get_notes_in_range(
+    db: Session,
+    user_id: str,
+    chapter_id: str,
+    start: int,
+    end: int,
+    limit: Optional[int] = None
+) -> List[Note]:
+    """Get a user's notes in a chapter whose range overlaps [start, end), by position.
+
+    On SQLite candidates come from the R-tree interval index, so the cost
+    depends on the notes in the window rather than in the chapter. Zero-width
+    notes count when their position lies in the window; notes without a
+    range are never returned.
+    """
+    if note_intervals.interval_index_enabled(db.get_bind()):
+        # Drive from the R-tree; its scope axis already pins user and chapter
+        candidates = note_intervals.overlapping_note_ids(user_id, chapter_id, start, end).subquery()
+        query = db.query(Note).join(candidates, Note.id == candidates.c.note_id)
+    else:
+        query = db.query(Note).filter(Note.user_id == user_id, Note.chapter_id == chapter_id)
+    notes = query.filter(
+        Note.start_index < end,
+        or_(Note.end_index > start, and_(Note.end_index == Note.start_index, Note.start_index >= start))
+    ).all()
+    # Only the window's notes are sorted, so do it here rather than in a temp B-tree
+    notes.sort(key=lambda n: (n.start_index, n.end_index))
+    return notes[:limit] if limit is not None else notes
+
+
 def delete_note(db: Session, note_id: str, user_id: str) -> bool:
     """Delete a note (only if owned by user)."""
     note = db.query(Note).filter(Note.id == note_id, Note.user_id == user_id).first()
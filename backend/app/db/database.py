@@ -1,30 +1,111 @@
 """Database configuration and session management."""
 
-from sqlalchemy import create_engine
+from fastapi import HTTPException, Request
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from typing import Optional
 import os
 
-# SQLite for simplicity - can migrate to PostgreSQL later
+from app.core.config import get_settings
+from app.db.search import init_search
+from app.db.intervals import init_note_intervals
+from app.db.sharding import EngineLRU, InvalidTenant, validate_tenant
+
+settings = get_settings()
+
+# SQLite by default; set DATABASE_URL to use PostgreSQL
 # Store in a data directory within backend
 DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data")
 os.makedirs(DATA_DIR, exist_ok=True)
 
-SQLALCHEMY_DATABASE_URL = f"sqlite:///{os.path.join(DATA_DIR, 'bookmind.db')}"
+DATABASE_PATH = os.path.join(DATA_DIR, 'bookmind.db')
+SQLALCHEMY_DATABASE_URL = f"sqlite:///{DATABASE_PATH}"
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False},  # Required for SQLite
-    echo=False  # Set to True for SQL logging
-)
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Per-connection SQLite settings for the main database and tenant shards."""
+    cursor = dbapi_connection.cursor()
+    # Only takes effect on a new file (existing ones: python maintenance.py --enable-incremental-vacuum)
+    cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    if settings.SQLITE_WAL:
+        # Readers (and backups) no longer block the writer; checkpoints run from the maintenance scheduler
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
+def create_db_engine(url: str) -> Engine:
+    """Engine for the bundled SQLite file or a database server.
+
+    Server databases (PostgreSQL) get a tuned connection pool and a
+    per-connection statement timeout; SQLite gets its pragmas instead.
+    """
+    if url.startswith("sqlite"):
+        sqlite_engine = create_engine(
+            url,
+            connect_args={"check_same_thread": False},  # Required for SQLite
+            echo=False  # Set to True for SQL logging
+        )
+        event.listen(sqlite_engine, "connect", set_sqlite_pragmas)
+        return sqlite_engine
+
+    connect_args = {}
+    if url.startswith("postgresql") and settings.DB_STATEMENT_TIMEOUT_MS > 0:
+        connect_args["options"] = f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}"
+    return create_engine(
+        url,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        connect_args=connect_args,
+        echo=False
+    )
+
+
+if settings.DATABASE_SHARDING and settings.DATABASE_URL and not settings.DATABASE_URL.startswith("sqlite"):
+    raise ValueError("DATABASE_SHARDING needs SQLite; unset DATABASE_URL or disable sharding")
+
+engine = create_db_engine(settings.DATABASE_URL or SQLALCHEMY_DATABASE_URL)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
 
-def get_db():
-    """Dependency to get database session."""
+def get_tenant(request: Request) -> Optional[str]:
+    """Dependency resolving the request's tenant (None unless sharding is on)."""
+    if not settings.DATABASE_SHARDING:
+        return None
+    tenant = request.headers.get(settings.TENANT_HEADER) or settings.DEFAULT_TENANT
+    try:
+        return validate_tenant(tenant)
+    except InvalidTenant as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def session_for_tenant(tenant: Optional[str] = None) -> Session:
+    """Session on the tenant's shard, or on the main database when unsharded."""
+    if tenant is None or not settings.DATABASE_SHARDING:
+        return SessionLocal()
+    return shards.session(tenant)
+
+
+def get_db(request: Request):
+    """Dependency to get database session (routed to the tenant's shard when sharding)."""
+    db = session_for_tenant(get_tenant(request))
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_catalog_db():
+    """Dependency for the shared catalog (the main database)."""
     db = SessionLocal()
     try:
         yield db
@@ -32,6 +113,50 @@ def get_db():
         db.close()
 
 
-def init_db():
-    """Initialize database tables."""
-    Base.metadata.create_all(bind=engine)
+# Indexes replaced by composite indexes in models.py; dropped from existing databases
+RETIRED_INDEXES = [
+    "ix_books_title",
+    "ix_books_sample_id",
+    "ix_chapters_book_id",
+    "ix_insights_book_id",
+    "ix_insights_chapter_id",
+    "idx_insight_book",
+    "idx_insight_chapter",
+    "ix_user_books_user_id",
+    "idx_userbook_user",
+    "idx_userbook_user_read",
+    "idx_userbook_shelf",
+    "ix_notes_user_id",
+    "idx_note_user",
+]
+
+# Columns added to existing tables after release; create_all only creates missing tables
+ADDED_COLUMNS = [
+    ("chapters", "token_count", "INTEGER"),
+]
+
+
+def init_db(bind=None):
+    """Initialize database tables, full-text search and note interval indexes."""
+    bind = bind or engine
+    Base.metadata.create_all(bind=bind)
+    with bind.begin() as conn:
+        for table, column, ddl in ADDED_COLUMNS:
+            if column not in {c["name"] for c in inspect(conn).get_columns(table)}:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+        for name in RETIRED_INDEXES:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        # Rows created before last_read_at had a default sort last on the shelf otherwise
+        conn.execute(text("UPDATE user_books SET last_read_at = started_at WHERE last_read_at IS NULL"))
+    init_search(bind)
+    init_note_intervals(bind)
+
+
+# Tenant shards; the main database above doubles as the sample-book catalog
+shards = EngineLRU(
+    settings.SHARD_DIR or os.path.join(DATA_DIR, "tenants"),
+    init=init_db,
+    on_connect=set_sqlite_pragmas,
+    max_open=settings.SHARD_MAX_OPEN_ENGINES,
+    idle_seconds=settings.SHARD_IDLE_SECONDS,
+)
@@ -0,0 +1,182 @@
+"""Per-request SQL instrumentation and N+1 detection.
+
+SQLAlchemy cursor-execute hooks time every statement and attribute it to the
+HTTP request that issued it (tracked through a context variable). At the end
+of a request the totals are folded into per-route metrics, optionally exposed
+as response headers, and a warning is printed when the same statement shape
+ran more often than ``SQL_N_PLUS_ONE_THRESHOLD`` times.
+"""
+
+import heapq
+import re
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import get_settings
+
+settings = get_settings()
+
+SLOWEST_PER_REQUEST = 3
+SLOWEST_GLOBAL = 20
+
+_PLACEHOLDER_LIST = re.compile(r"\(\s*(?:\?|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|:\w+))+\s*\)")
+_NUMBER = re.compile(r"\b\d+\b")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    """Normalize a statement so repeats with different parameters compare equal."""
+    shape = _WHITESPACE.sub(" ", statement).strip()
+    shape = _PLACEHOLDER_LIST.sub("(?)", shape)
+    return _NUMBER.sub("N", shape)
+
+
+@dataclass
+class QueryStats:
+    """SQL activity of one request."""
+    count: int = 0
+    total_ms: float = 0.0
+    slowest: List[Tuple[float, str]] = field(default_factory=list)
+    shapes: Counter = field(default_factory=Counter)
+
+    def record(self, statement: str, elapsed_ms: float) -> None:
+        self.count += 1
+        self.total_ms += elapsed_ms
+        shape = statement_shape(statement)
+        self.shapes[shape] += 1
+        if len(self.slowest) < SLOWEST_PER_REQUEST:
+            heapq.heappush(self.slowest, (elapsed_ms, shape))
+        else:
+            heapq.heappushpop(self.slowest, (elapsed_ms, shape))
+
+    def repeated_shapes(self, threshold: int) -> List[Tuple[str, int]]:
+        return [(shape, n) for shape, n in self.shapes.most_common() if n >= threshold]
+
+
+@dataclass
+class RouteMetrics:
+    """Aggregated SQL activity for one route."""
+    requests: int = 0
+    queries: int = 0
+    db_ms: float = 0.0
+    max_queries: int = 0
+    n_plus_one_warnings: int = 0
+
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar("sql_query_stats", default=None)
+_lock = threading.Lock()
+_routes: dict[str, RouteMetrics] = {}
+_slowest: List[Tuple[float, str, str]] = []  # (ms, route, shape) min-heap
+
+
+def current_stats() -> Optional[QueryStats]:
+    """Stats of the request being handled, if any."""
+    return _current.get()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info["query_start"].pop()
+    stats = _current.get()
+    if stats is not None:
+        stats.record(statement, (time.perf_counter() - start) * 1000)
+
+
+def install_sql_instrumentation() -> None:
+    """Attach the timing hooks to every engine (idempotent)."""
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def finish_request(route: str, stats: QueryStats) -> None:
+    """Fold a finished request into the route metrics and warn about N+1 patterns."""
+    repeated = stats.repeated_shapes(settings.SQL_N_PLUS_ONE_THRESHOLD)
+    for shape, n in repeated:
+        print(f"⚠️  Possible N+1 on {route}: statement ran {n} times: {shape[:200]}")
+
+    with _lock:
+        metrics = _routes.setdefault(route, RouteMetrics())
+        metrics.requests += 1
+        metrics.queries += stats.count
+        metrics.db_ms += stats.total_ms
+        metrics.max_queries = max(metrics.max_queries, stats.count)
+        metrics.n_plus_one_warnings += len(repeated)
+        for ms, shape in stats.slowest:
+            entry = (ms, route, shape)
+            if len(_slowest) < SLOWEST_GLOBAL:
+                heapq.heappush(_slowest, entry)
+            else:
+                heapq.heappushpop(_slowest, entry)
+
+
+def get_sql_metrics() -> dict:
+    """Snapshot of per-route SQL metrics and the slowest statements seen."""
+    with _lock:
+        routes = {
+            route: {
+                "requests": m.requests,
+                "queries": m.queries,
+                "avg_queries": round(m.queries / m.requests, 2) if m.requests else 0,
+                "max_queries": m.max_queries,
+                "db_ms": round(m.db_ms, 2),
+                "avg_db_ms": round(m.db_ms / m.requests, 2) if m.requests else 0,
+                "n_plus_one_warnings": m.n_plus_one_warnings,
+            }
+            for route, m in sorted(_routes.items())
+        }
+        slowest = [
+            {"ms": round(ms, 2), "route": route, "statement": shape}
+            for ms, route, shape in sorted(_slowest, reverse=True)
+        ]
+    return {"routes": routes, "slowest": slowest}
+
+
+def reset_sql_metrics() -> None:
+    with _lock:
+        _routes.clear()
+        _slowest.clear()
+
+
+class SQLInstrumentationMiddleware:
+    """ASGI middleware that scopes query stats to each HTTP request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = _current.set(stats)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and settings.SQL_METRICS_HEADERS:
+                headers = list(message.get("headers", []))
+                headers += [
+                    (b"x-db-query-count", str(stats.count).encode()),
+                    (b"x-db-time-ms", f"{stats.total_ms:.2f}".encode()),
+                    (b"server-timing", f"db;dur={stats.total_ms:.2f};desc=\"{stats.count} queries\"".encode()),
+                ]
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            # Label by route template so metrics stay bounded (unmatched paths share one bucket)
+            path = getattr(scope.get("route"), "path", None) or "<unmatched>"
+            finish_request(f"{scope.get('method', '')} {path}", stats)
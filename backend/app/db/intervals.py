@@ -0,0 +1,132 @@
+"""SQLite R-tree interval index over note/highlight ranges.
+
+Each note with a ``[start_index, end_index]`` range is a box in a 2-D R-tree:
+one axis is a per-(user, chapter) scope key from ``note_scopes``, the other
+the character range. "Notes overlapping [a, b) in this chapter" is then a
+single R-tree box query, O(log n + k) however many notes the chapter holds.
+SQL triggers keep the R-tree in sync with ``notes``.
+"""
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, and_, select, text
+from sqlalchemy.engine import Engine
+
+_metadata = MetaData()
+
+# Query-building handles only; both tables are created by init_note_intervals
+note_scopes = Table(
+    "note_scopes", _metadata,
+    Column("key", Integer, primary_key=True),
+    Column("user_id", String),
+    Column("chapter_id", String),
+)
+notes_rtree = Table(
+    "notes_rtree", _metadata,
+    Column("id", Integer, primary_key=True),
+    Column("scope_lo", Integer),
+    Column("scope_hi", Integer),
+    Column("start_lo", Integer),
+    Column("end_hi", Integer),
+    Column("note_id", String),
+)
+
+NOTE_SCOPES_DDL = """
+    CREATE TABLE IF NOT EXISTS note_scopes (
+        key INTEGER PRIMARY KEY,
+        user_id TEXT NOT NULL,
+        chapter_id TEXT NOT NULL,
+        UNIQUE (user_id, chapter_id)
+    )"""
+
+# rtree_i32 keeps character offsets exact (plain rtree rounds to float32)
+NOTES_RTREE_DDL = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS notes_rtree USING rtree_i32(
+        id, scope_lo, scope_hi, start_lo, end_hi, +note_id
+    )"""
+
+SCOPE_FOR = "(SELECT key FROM note_scopes WHERE user_id = {row}.user_id AND chapter_id = {row}.chapter_id)"
+HAS_RANGE = "{row}.start_index IS NOT NULL AND {row}.end_index >= {row}.start_index"
+
+
+def _insert_sql(row: str) -> str:
+    return (f"INSERT OR IGNORE INTO note_scopes (user_id, chapter_id) VALUES ({row}.user_id, {row}.chapter_id); "
+            f"INSERT INTO notes_rtree (scope_lo, scope_hi, start_lo, end_hi, note_id) "
+            f"VALUES ({SCOPE_FOR.format(row=row)}, {SCOPE_FOR.format(row=row)}, "
+            f"{row}.start_index, {row}.end_index, {row}.id);")
+
+
+def _delete_sql(row: str) -> str:
+    # Found through its own box, so the delete is an R-tree lookup too
+    scope = SCOPE_FOR.format(row=row)
+    return (f"DELETE FROM notes_rtree WHERE id IN (SELECT id FROM notes_rtree "
+            f"WHERE scope_lo <= {scope} AND scope_hi >= {scope} "
+            f"AND start_lo <= {row}.start_index AND end_hi >= {row}.end_index "
+            f"AND note_id = {row}.id);")
+
+
+TRIGGERS = {
+    "notes_rtree_ai": f"""CREATE TRIGGER IF NOT EXISTS notes_rtree_ai AFTER INSERT ON notes
+        WHEN {HAS_RANGE.format(row="new")} BEGIN
+        {_insert_sql("new")}
+    END""",
+    "notes_rtree_ad": f"""CREATE TRIGGER IF NOT EXISTS notes_rtree_ad AFTER DELETE ON notes
+        WHEN {HAS_RANGE.format(row="old")} BEGIN
+        {_delete_sql("old")}
+    END""",
+    "notes_rtree_au_old": f"""CREATE TRIGGER IF NOT EXISTS notes_rtree_au_old
+        AFTER UPDATE OF user_id, chapter_id, start_index, end_index ON notes
+        WHEN {HAS_RANGE.format(row="old")} BEGIN
+        {_delete_sql("old")}
+    END""",
+    "notes_rtree_au_new": f"""CREATE TRIGGER IF NOT EXISTS notes_rtree_au_new
+        AFTER UPDATE OF user_id, chapter_id, start_index, end_index ON notes
+        WHEN {HAS_RANGE.format(row="new")} BEGIN
+        {_insert_sql("new")}
+    END""",
+}
+
+
+def interval_index_enabled(bind) -> bool:
+    """The R-tree index is only available on SQLite."""
+    return bind.dialect.name == "sqlite"
+
+
+def init_note_intervals(engine: Engine) -> None:
+    """Create the scope table, R-tree and triggers, backfilling a new R-tree."""
+    if not interval_index_enabled(engine):
+        return
+
+    with engine.begin() as conn:
+        created = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE name = 'notes_rtree'")
+        ).first() is None
+        conn.execute(text(NOTE_SCOPES_DDL))
+        conn.execute(text(NOTES_RTREE_DDL))
+        for ddl in TRIGGERS.values():
+            conn.execute(text(ddl))
+
+        if created:
+            conn.execute(text("INSERT OR IGNORE INTO note_scopes (user_id, chapter_id) "
+                              "SELECT DISTINCT user_id, chapter_id FROM notes"))
+            conn.execute(text(f"""
+                INSERT INTO notes_rtree (scope_lo, scope_hi, start_lo, end_hi, note_id)
+                SELECT s.key, s.key, n.start_index, n.end_index, n.id
+                FROM notes n JOIN note_scopes s ON s.user_id = n.user_id AND s.chapter_id = n.chapter_id
+                WHERE {HAS_RANGE.format(row="n")}"""))
+
+
+def overlapping_note_ids(user_id: str, chapter_id: str, start: int, end: int):
+    """Subquery of note ids whose range may overlap ``[start, end)``.
+
+    The box test is inclusive at both ends, so callers apply the exact
+    half-open comparison on the (few) rows it returns.
+    """
+    scope = select(note_scopes.c.key).where(
+        note_scopes.c.user_id == user_id,
+        note_scopes.c.chapter_id == chapter_id,
+    ).scalar_subquery()
+    return select(notes_rtree.c.note_id).where(and_(
+        notes_rtree.c.scope_lo <= scope,
+        notes_rtree.c.scope_hi >= scope,
+        notes_rtree.c.start_lo <= end,
+        notes_rtree.c.end_hi >= start,
+    ))
@@ -0,0 +1,200 @@
+"""Background SQLite maintenance and online backups.
+
+A scheduler started from the app lifespan wakes every
+``MAINTENANCE_INTERVAL_SECONDS``. Each tick runs a passive WAL checkpoint
+(never waits on readers or writers) and disposes idle tenant engines. Inside
+the off-peak ``MAINTENANCE_WINDOW`` it also does the heavier work in small
+increments: ``PRAGMA optimize`` (bounded ANALYZE), an incremental vacuum of at
+most ``MAINTENANCE_VACUUM_PAGES`` free pages, a truncating checkpoint and, when
+one is due, an online backup of every database through SQLite's backup API.
+"""
+
+import asyncio
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from app.core.config import get_settings
+from app.db.database import DATA_DIR, engine, shards
+
+settings = get_settings()
+
+ANALYSIS_LIMIT = 400  # Rows sampled per index by ANALYZE; keeps optimize cheap on big tables
+
+
+def is_sqlite(bind) -> bool:
+    return bind.dialect.name == "sqlite"
+
+
+def sqlite_engines() -> Dict[str, Engine]:
+    """The main database plus every open tenant shard."""
+    engines = {"main": engine} if is_sqlite(engine) else {}
+    if settings.DATABASE_SHARDING:
+        engines.update({f"tenant:{t}": e for t, e in shards.open_engines().items()})
+    return engines
+
+
+def checkpoint(bind: Engine, mode: str = "PASSIVE") -> dict:
+    """Copy WAL frames into the database file (TRUNCATE also resets the WAL)."""
+    with bind.connect() as conn:
+        busy, log, done = conn.execute(text(f"PRAGMA wal_checkpoint({mode})")).one()
+    return {"busy": bool(busy), "wal_frames": log, "checkpointed": done}
+
+
+def optimize(bind: Engine) -> None:
+    """Refresh planner statistics where they are stale (full ANALYZE the first time)."""
+    with bind.connect() as conn:
+        conn.execute(text(f"PRAGMA analysis_limit={ANALYSIS_LIMIT}"))
+        has_stats = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'")).first()
+        conn.execute(text("PRAGMA optimize" if has_stats else "ANALYZE"))
+        conn.commit()
+
+
+def incremental_vacuum(bind: Engine, max_pages: int) -> int:
+    """Return up to ``max_pages`` free pages to the OS; returns pages freed."""
+    with bind.connect() as conn:
+        if conn.execute(text("PRAGMA auto_vacuum")).scalar() != 2:
+            return 0  # Not INCREMENTAL; see maintenance.py --enable-incremental-vacuum
+        before = conn.execute(text("PRAGMA freelist_count")).scalar()
+        if not before:
+            return 0
+        # executescript steps the pragma to completion (execute() frees a single page)
+        conn.connection.driver_connection.executescript(f"PRAGMA incremental_vacuum({int(max_pages)});")
+        return before - conn.execute(text("PRAGMA freelist_count")).scalar()
+
+
+def backup_file(source_path: str, dest_path: str) -> None:
+    """Copy a live SQLite database with the online backup API.
+
+    The copy runs in one read transaction: in WAL mode writers carry on
+    meanwhile, and the backup is a consistent snapshot of its start.
+    """
+    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+    source = sqlite3.connect(source_path)
+    dest = sqlite3.connect(dest_path)
+    try:
+        source.backup(dest)
+    finally:
+        dest.close()
+        source.close()
+
+
+def backup_all(backup_dir: Optional[str] = None, keep: int = settings.BACKUP_KEEP) -> str:
+    """Back up the main database and every tenant shard into a timestamped directory."""
+    backup_dir = backup_dir or settings.BACKUP_DIR or os.path.join(DATA_DIR, "backups")
+    target = os.path.join(backup_dir, datetime.now().strftime("%Y%m%d-%H%M%S"))
+    backup_file(engine.url.database, os.path.join(target, os.path.basename(engine.url.database)))
+    if settings.DATABASE_SHARDING:
+        for tenant in shards.tenants():
+            backup_file(shards.path(tenant), os.path.join(target, "tenants", f"{tenant}.db"))
+    prune_backups(backup_dir, keep)
+    return target
+
+
+def prune_backups(backup_dir: str, keep: int) -> List[str]:
+    """Delete all but the newest ``keep`` backup directories."""
+    runs = sorted(
+        name for name in os.listdir(backup_dir)
+        if os.path.isdir(os.path.join(backup_dir, name))
+    )
+    removed = runs[:-keep] if keep > 0 else []
+    for name in removed:
+        shutil.rmtree(os.path.join(backup_dir, name))
+    return removed
+
+
+def in_window(window: str, now: Optional[datetime] = None) -> bool:
+    """Whether local time falls in an ``HH:MM-HH:MM`` window (may wrap midnight)."""
+    if not window:
+        return True
+    start, end = (datetime.strptime(t.strip(), "%H:%M").time() for t in window.split("-"))
+    current = (now or datetime.now()).time()
+    return start <= current < end if start <= end else current >= start or current < end
+
+
+class MaintenanceScheduler:
+    """Runs SQLite maintenance in small increments from a background task."""
+
+    def __init__(self, interval: float = settings.MAINTENANCE_INTERVAL_SECONDS, window: str = settings.MAINTENANCE_WINDOW):
+        self.interval = interval
+        self.window = window
+        self._task: Optional[asyncio.Task] = None
+        self._lock = threading.Lock()
+        self.last_optimize = 0.0
+        self.last_backup = 0.0
+        self.status = {"runs": 0, "last_run": None, "last_backup": None, "last_results": {}, "errors": 0}
+
+    def run_once(self, force: bool = False) -> dict:
+        """One maintenance pass; ``force`` runs the off-peak tasks regardless of window and schedule."""
+        with self._lock:
+            results = {}
+            off_peak = force or in_window(self.window)
+            now = time.time()
+            optimize_due = force or now - self.last_optimize >= settings.MAINTENANCE_OPTIMIZE_HOURS * 3600
+            backup_due = force or (
+                settings.BACKUP_INTERVAL_HOURS > 0
+                and now - self.last_backup >= settings.BACKUP_INTERVAL_HOURS * 3600
+            )
+
+            for name, bind in sqlite_engines().items():
+                try:
+                    result = {"checkpoint": checkpoint(bind, "TRUNCATE" if off_peak else "PASSIVE")}
+                    if off_peak:
+                        result["vacuumed_pages"] = incremental_vacuum(bind, settings.MAINTENANCE_VACUUM_PAGES)
+                        if optimize_due:
+                            optimize(bind)
+                            result["optimized"] = True
+                    results[name] = result
+                except Exception as e:
+                    self.status["errors"] += 1
+                    results[name] = {"error": str(e)}
+                    print(f"⚠️  Maintenance failed for {name}: {e}")
+
+            if off_peak and optimize_due:
+                self.last_optimize = now
+            if off_peak and backup_due and is_sqlite(engine):
+                try:
+                    results["backup"] = backup_all()
+                    self.last_backup = now
+                    self.status["last_backup"] = datetime.now().isoformat()
+                except Exception as e:
+                    self.status["errors"] += 1
+                    results["backup"] = {"error": str(e)}
+                    print(f"⚠️  Backup failed: {e}")
+
+            results["idle_shards_closed"] = shards.evict_idle()
+            self.status["runs"] += 1
+            self.status["last_run"] = datetime.now().isoformat()
+            self.status["last_results"] = results
+            return results
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await asyncio.to_thread(self.run_once)
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def get_status(self) -> dict:
+        return {**self.status, "interval_seconds": self.interval, "window": self.window,
+                "in_window": in_window(self.window)}
+
+
+scheduler = MaintenanceScheduler()
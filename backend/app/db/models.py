@@ -1,11 +1,12 @@
 """SQLAlchemy models for BookMind AI."""
 
 from sqlalchemy import Column, String, Text, Integer, DateTime, ForeignKey, JSON, Index
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.sql import func
 import uuid
 
 from app.db.database import Base
+from app.db.compression import CompressedText
 
 
 def generate_uuid():
@@ -18,12 +19,12 @@ class Book(Base):
     __tablename__ = "books"
 
     id = Column(String, primary_key=True, default=generate_uuid)
-    title = Column(String(500), nullable=False, index=True)
+    title = Column(String(500), nullable=False)
     author = Column(String(255), nullable=True)
     category = Column(String(100), nullable=True)
     description = Column(Text, nullable=True)
     cover_color = Column(String(50), default="#d0ff59")
-    content = Column(Text, nullable=True)  # Full book content
+    content = deferred(Column(CompressedText, nullable=True))  # Full book content, loaded on access
     
     # Metadata
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -35,10 +36,17 @@ class Book(Base):
     insights = relationship("Insight", back_populates="book", cascade="all, delete-orphan")
     
     # For sample books, we store the sample_id to link them
-    sample_id = Column(String(100), nullable=True, index=True)
+    sample_id = Column(String(100), nullable=True)
     
     __table_args__ = (
         Index('idx_book_sample', 'sample_id'),
+        # Library listing: keyset sort keys, optionally behind an equality filter
+        Index('idx_book_created', 'created_at', 'id'),
+        Index('idx_book_title_id', 'title', 'id'),
+        Index('idx_book_category_created', 'category', 'created_at', 'id'),
+        Index('idx_book_category_title', 'category', 'title', 'id'),
+        Index('idx_book_author_created', 'author', 'created_at', 'id'),
+        Index('idx_book_author_title', 'author', 'title', 'id'),
     )
 
 
@@ -47,17 +55,18 @@ class Chapter(Base):
     __tablename__ = "chapters"
 
     id = Column(String, primary_key=True, default=generate_uuid)
-    book_id = Column(String, ForeignKey("books.id", ondelete="CASCADE"), nullable=False, index=True)
+    book_id = Column(String, ForeignKey("books.id", ondelete="CASCADE"), nullable=False)
     
     # Chapter info
     number = Column(Integer, nullable=False)
     title = Column(String(500), nullable=False)
-    content = Column(Text, nullable=True)
+    content = deferred(Column(CompressedText, nullable=True))  # Loaded on access or via undefer()
     summary = Column(Text, nullable=True)
     key_points = Column(JSON, default=list)  # Store as JSON array
     
     # Metadata
     word_count = Column(Integer, default=0)
+    token_count = Column(Integer, nullable=True)  # Prompt tokens of the text, counted at ingest
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # Relationships
@@ -69,6 +78,18 @@ class Chapter(Base):
     )
 
 
+class ChapterSegment(Base):
+    """Offset index for chapter text kept in the mmap segment store."""
+    __tablename__ = "chapter_segments"
+
+    chapter_id = Column(String, ForeignKey("chapters.id", ondelete="CASCADE"), primary_key=True)
+    segment = Column(Integer, nullable=False)
+    offset = Column(Integer, nullable=False)  # Byte offset of the record in the segment file
+    length = Column(Integer, nullable=False)  # UTF-8 byte length of the text
+    checkpoint_count = Column(Integer, nullable=False, default=0)  # Word checkpoints after the text
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
 class Insight(Base):
     """Represents an AI-generated insight for a chapter."""
     __tablename__ = "insights"
@@ -76,8 +97,8 @@ class Insight(Base):
     id = Column(String, primary_key=True, default=generate_uuid)
     
     # Relationships
-    book_id = Column(String, ForeignKey("books.id", ondelete="CASCADE"), nullable=False, index=True)
-    chapter_id = Column(String, ForeignKey("chapters.id", ondelete="CASCADE"), nullable=False, index=True)
+    book_id = Column(String, ForeignKey("books.id", ondelete="CASCADE"), nullable=False)
+    chapter_id = Column(String, ForeignKey("chapters.id", ondelete="CASCADE"), nullable=False)
     
     # Insight content
     title = Column(String(500), nullable=False)
@@ -102,8 +123,8 @@ class Insight(Base):
     chapter = relationship("Chapter", back_populates="insights")
     
     __table_args__ = (
-        Index('idx_insight_book', 'book_id'),
-        Index('idx_insight_chapter', 'chapter_id'),
+        Index('idx_insight_book_created', 'book_id', 'created_at', 'id'),  # Keyset pagination
+        Index('idx_insight_chapter_created', 'chapter_id', 'created_at'),
         Index('idx_insight_type', 'insight_type'),
     )
 
@@ -113,7 +134,7 @@ class UserBook(Base):
     __tablename__ = "user_books"
     
     id = Column(String, primary_key=True, default=generate_uuid)
-    user_id = Column(String(100), nullable=False, index=True)  # Will link to users table later
+    user_id = Column(String(100), nullable=False)  # Will link to users table later
     book_id = Column(String, ForeignKey("books.id", ondelete="CASCADE"), nullable=False)
     
     # Reading progress
@@ -123,11 +144,13 @@ class UserBook(Base):
     
     # Timestamps
     started_at = Column(DateTime(timezone=True), server_default=func.now())
-    last_read_at = Column(DateTime(timezone=True), onupdate=func.now())
+    last_read_at = Column(DateTime(timezone=True), default=func.now(), onupdate=func.now())
     completed_at = Column(DateTime(timezone=True), nullable=True)
     
     __table_args__ = (
-        Index('idx_userbook_user', 'user_id'),
+        Index('idx_userbook_user_book', 'user_id', 'book_id'),
+        # Shelf order; the progress columns stay out of the key so progress flushes don't rewrite it
+        Index('idx_userbook_recent', 'user_id', 'last_read_at', 'id'),
         Index('idx_userbook_book', 'book_id'),
     )
 
@@ -137,7 +160,7 @@ class Note(Base):
     __tablename__ = "notes"
     
     id = Column(String, primary_key=True, default=generate_uuid)
-    user_id = Column(String(100), nullable=False, index=True)
+    user_id = Column(String(100), nullable=False)
     book_id = Column(String, ForeignKey("books.id", ondelete="CASCADE"), nullable=False)
     chapter_id = Column(String, ForeignKey("chapters.id", ondelete="CASCADE"), nullable=False)
     
@@ -155,7 +178,7 @@ class Note(Base):
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
     __table_args__ = (
-        Index('idx_note_user', 'user_id'),
+        Index('idx_note_user_chapter', 'user_id', 'chapter_id', 'created_at'),
         Index('idx_note_book', 'book_id'),
         Index('idx_note_chapter', 'chapter_id'),
     )
@@ -0,0 +1,31 @@
+"""Opaque cursors for keyset pagination.
+
+A cursor encodes the sort key of the last row a client has seen; the next
+page starts strictly after it, so page N costs the same as page 1.
+"""
+
+import base64
+import json
+from typing import Any, List
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client sends a cursor we did not issue."""
+
+
+def encode_cursor(*values: Any) -> str:
+    """Encode sort-key values into a URL-safe cursor string."""
+    raw = json.dumps([str(v) if v is not None else None for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """Decode a cursor produced by encode_cursor with ``size`` values."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(f"Malformed cursor: {e}")
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor("Malformed cursor")
+    return values
@@ -0,0 +1,204 @@
+"""In-process LRU of serialized read responses, invalidated by crud writes.
+
+Book, chapter-list and insight-list responses are cached as rendered JSON
+bytes, bounded by ``RESPONSE_CACHE_MAX_BYTES`` (least recently used first
+out). Every entry carries tags naming the rows it was built from, e.g.
+``("book", id)`` or ``("chapter-insights", id)``, scoped to the database
+the session is bound to (main database or a tenant shard).
+
+crud write paths call :func:`invalidate` before changing anything. That
+drops the tagged entries and bars caching those tags until the writing
+session's transaction has committed or rolled back. A reader snapshots the
+tags' generations before querying and its result is only stored if no write
+touched them meanwhile, so a response built from data a write has
+superseded is never served (no stale window).
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Iterable, NamedTuple, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+
+settings = get_settings()
+
+Tag = Tuple[str, str, str]  # (database scope, kind, id)
+
+PENDING_KEY = "response_cache_pending"  # Session.info: tags to release when the transaction ends
+
+
+class _Entry(NamedTuple):
+    body: bytes
+    headers: Dict[str, str]
+    tags: Tuple[Tag, ...]
+
+
+class ResponseCache:
+    """Size-bounded LRU of response bodies with tag-based invalidation."""
+
+    def __init__(self, max_bytes: int = settings.RESPONSE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._by_tag: Dict[Tag, set] = {}
+        self._generations: Dict[Tag, int] = {}  # Only tags with a write in progress
+        self._floor = 0  # Generation of every other tag; only ever grows
+        self._writers: Dict[Tag, int] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "skipped_stores": 0,
+                      "evictions": 0, "invalidations": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def get(self, key: Hashable) -> Optional[_Entry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry
+
+    def snapshot(self, tags: Iterable[Tag]) -> Optional[tuple]:
+        """Generations of ``tags`` before a read; None while any of them is being written."""
+        with self._lock:
+            if any(self._writers.get(tag) for tag in tags):
+                return None
+            return tuple(self._generation(tag) for tag in tags)
+
+    def put(self, key: Hashable, body: bytes, headers: Dict[str, str], tags: Tuple[Tag, ...], token: Optional[tuple]) -> bool:
+        """Store a response read after ``snapshot(tags)`` returned ``token``, unless a write intervened."""
+        if token is None or len(body) > self.max_bytes:
+            self.stats["skipped_stores"] += 1
+            return False
+        with self._lock:
+            if tuple(self._generation(tag) for tag in tags) != token:
+                self.stats["skipped_stores"] += 1
+                return False
+            self._remove(key)
+            self._entries[key] = _Entry(body, headers, tags)
+            for tag in tags:
+                self._by_tag.setdefault(tag, set()).add(key)
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.stats["evictions"] += 1
+            self.stats["stores"] += 1
+            return True
+
+    def _generation(self, tag: Tag) -> int:
+        return self._generations.get(tag, self._floor)
+
+    def _remove(self, key: Hashable) -> None:
+        """Drop one entry (caller holds the lock)."""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= len(entry.body)
+        for tag in entry.tags:
+            keys = self._by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[tag]
+
+    def begin_write(self, tags: Iterable[Tag]) -> None:
+        """Drop entries for ``tags`` and stop caching them until end_write."""
+        with self._lock:
+            for tag in tags:
+                self._generations[tag] = self._generation(tag) + 1
+                self._writers[tag] = self._writers.get(tag, 0) + 1
+                for key in list(self._by_tag.get(tag, ())):
+                    self._remove(key)
+                self.stats["invalidations"] += 1
+
+    def end_write(self, tags: Iterable[Tag]) -> None:
+        with self._lock:
+            for tag in tags:
+                generation = self._generation(tag) + 1
+                remaining = self._writers.get(tag, 0) - 1
+                if remaining > 0:
+                    self._generations[tag] = generation
+                    self._writers[tag] = remaining
+                else:
+                    # Raising the floor keeps generations monotonic without remembering every tag
+                    self._writers.pop(tag, None)
+                    self._generations.pop(tag, None)
+                    self._floor = max(self._floor, generation)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_tag.clear()
+            self._bytes = 0
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {**self.stats, "entries": len(self._entries), "bytes": self._bytes,
+                    "max_bytes": self.max_bytes, "writes_in_progress": len(self._writers)}
+
+
+response_cache = ResponseCache()
+
+
+def scope(db: Session) -> str:
+    """Cache namespace of the database a session is bound to."""
+    return str(db.get_bind().url)
+
+
+def invalidate(db: Session, *tags: Tuple[str, str]) -> None:
+    """Invalidate ``(kind, id)`` tags for a write made in ``db``'s current transaction.
+
+    Call before the write; caching of the tags resumes once the transaction
+    ends (commit or rollback).
+    """
+    scoped = [(scope(db), kind, str(ident)) for kind, ident in tags if ident is not None]
+    if not scoped:
+        return
+    if not db.in_transaction():
+        db.begin()  # Make sure a transaction end will release the tags
+    response_cache.begin_write(scoped)
+    db.info.setdefault(PENDING_KEY, []).extend(scoped)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _release_tags(session: Session, transaction) -> None:
+    if transaction.parent is None and session.info.get(PENDING_KEY):
+        response_cache.end_write(session.info.pop(PENDING_KEY))
+
+
+def cached_json(
+    db: Session,
+    key: Tuple[Hashable, ...],
+    tags: Iterable[Tuple[str, str]],
+    build: Callable[[], Tuple[object, Dict[str, str]]],
+) -> Response:
+    """Serve a JSON response from the cache, or build, render and cache it.
+
+    ``build`` returns ``(content, headers)``; exceptions (404s, bad cursors)
+    propagate and nothing is cached.
+    """
+    if not response_cache.enabled:
+        content, headers = build()
+        return JSONResponse(content=jsonable_encoder(content), headers=headers)
+
+    db_scope = scope(db)
+    key = (db_scope, *key)
+    entry = response_cache.get(key)
+    if entry is not None:
+        return Response(entry.body, media_type="application/json", headers={**entry.headers, "X-Cache": "HIT"})
+
+    scoped = tuple((db_scope, kind, str(ident)) for kind, ident in tags)
+    token = response_cache.snapshot(scoped)
+    content, headers = build()
+    body = JSONResponse(content=jsonable_encoder(content)).body
+    response_cache.put(key, body, headers, scoped, token)
+    return Response(body, media_type="application/json", headers={**headers, "X-Cache": "MISS"})
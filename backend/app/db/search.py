@@ -0,0 +1,345 @@
+"""SQLite FTS5 full-text search over chapters, insights and notes.
+
+Each searchable table has an FTS5 shadow table, keyed through ``search_keys``.
+Insights and notes are kept in sync by SQL triggers. Chapter text may be
+compressed or live in the segment store, so chapters are indexed explicitly
+by ``crud`` when they are written (deletes are still handled by a trigger).
+
+The chapter index is contentless: it holds only the inverted index, not a
+second uncompressed copy of every chapter. Hits are mapped back to chapters
+through ``search_keys`` and snippets are cut from the opening of the stored
+text. Deleting from a contentless table needs SQLite 3.43
+(``contentless_delete``); older SQLite keeps the text in the index as before,
+and its snippets come from FTS5 ``snippet()``.
+"""
+
+import re
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+TOKENIZER = "porter unicode61 remove_diacritics 2"
+PREFIX_INDEX = "2 3"  # Makes short prefix queries (typeahead) cheap
+
+CHAPTERS_FTS_DDL = """
+        CREATE VIRTUAL TABLE IF NOT EXISTS chapters_fts USING fts5(
+            title, content,{storage}
+            tokenize = '{tokenizer}', prefix = '{prefix}'
+        )"""
+CONTENTLESS = " content = '', contentless_delete = 1,"
+CONTENTLESS_DELETE_VERSION = (3, 43, 0)
+
+FTS_TABLES = {
+    "chapters_fts": CHAPTERS_FTS_DDL,
+    "insights_fts": f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS insights_fts USING fts5(
+            title, summary, evidence, implication,
+            insight_id UNINDEXED, book_id UNINDEXED, chapter_id UNINDEXED,
+            tokenize = '{TOKENIZER}', prefix = '{PREFIX_INDEX}'
+        )""",
+    "notes_fts": f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+            content, highlight_text,
+            note_id UNINDEXED, user_id UNINDEXED, book_id UNINDEXED, chapter_id UNINDEXED,
+            tokenize = '{TOKENIZER}', prefix = '{PREFIX_INDEX}'
+        )""",
+}
+
+# bm25 column weights: titles count more than body text
+RANK_WEIGHTS = {
+    "chapters_fts": "bm25(10.0, 1.0)",
+    "insights_fts": "bm25(8.0, 4.0, 1.0, 1.0)",
+    "notes_fts": "bm25(2.0, 1.0)",
+}
+
+# FTS rows are keyed by a stable integer from search_keys (one per source row
+# id), so syncing a row is a rowid lookup rather than a scan over the
+# UNINDEXED id columns. Source tables have text primary keys, whose implicit
+# rowids VACUUM may renumber, so they cannot be used directly.
+SEARCH_KEYS_DDL = """
+    CREATE TABLE IF NOT EXISTS search_keys (
+        key INTEGER PRIMARY KEY,
+        source_id TEXT NOT NULL UNIQUE
+    )"""
+
+KEY_FOR = "(SELECT key FROM search_keys WHERE source_id = {ref})"
+
+
+def fts_delete_sql(fts_table: str, ref: str) -> str:
+    """Statement removing the FTS row (and its key) for source id ``ref``."""
+    return (f"DELETE FROM {fts_table} WHERE rowid = {KEY_FOR.format(ref=ref)}; "
+            f"DELETE FROM search_keys WHERE source_id = {ref};")
+
+
+def _fts_insert_sql(fts_table: str, columns: List[str], values: List[str], ref: str) -> str:
+    return (f"INSERT OR IGNORE INTO search_keys (source_id) VALUES ({ref}); "
+            f"INSERT INTO {fts_table} (rowid, {', '.join(columns)}) "
+            f"VALUES ({KEY_FOR.format(ref=ref)}, {', '.join(values)});")
+
+
+INSIGHT_COLUMNS = ["title", "summary", "evidence", "implication", "insight_id", "book_id", "chapter_id"]
+INSIGHT_VALUES = ["new.title", "new.summary", "new.evidence", "new.implication", "new.id", "new.book_id", "new.chapter_id"]
+NOTE_COLUMNS = ["content", "highlight_text", "note_id", "user_id", "book_id", "chapter_id"]
+NOTE_VALUES = ["new.content", "new.highlight_text", "new.id", "new.user_id", "new.book_id", "new.chapter_id"]
+
+TRIGGERS = {
+    "chapters_fts_ad": f"""CREATE TRIGGER IF NOT EXISTS chapters_fts_ad AFTER DELETE ON chapters BEGIN
+        {fts_delete_sql("chapters_fts", "old.id")}
+    END""",
+    "insights_fts_ai": f"""CREATE TRIGGER IF NOT EXISTS insights_fts_ai AFTER INSERT ON insights BEGIN
+        {_fts_insert_sql("insights_fts", INSIGHT_COLUMNS, INSIGHT_VALUES, "new.id")}
+    END""",
+    "insights_fts_ad": f"""CREATE TRIGGER IF NOT EXISTS insights_fts_ad AFTER DELETE ON insights BEGIN
+        {fts_delete_sql("insights_fts", "old.id")}
+    END""",
+    "insights_fts_au": f"""CREATE TRIGGER IF NOT EXISTS insights_fts_au AFTER UPDATE ON insights BEGIN
+        {fts_delete_sql("insights_fts", "old.id")}
+        {_fts_insert_sql("insights_fts", INSIGHT_COLUMNS, INSIGHT_VALUES, "new.id")}
+    END""",
+    "notes_fts_ai": f"""CREATE TRIGGER IF NOT EXISTS notes_fts_ai AFTER INSERT ON notes BEGIN
+        {_fts_insert_sql("notes_fts", NOTE_COLUMNS, NOTE_VALUES, "new.id")}
+    END""",
+    "notes_fts_ad": f"""CREATE TRIGGER IF NOT EXISTS notes_fts_ad AFTER DELETE ON notes BEGIN
+        {fts_delete_sql("notes_fts", "old.id")}
+    END""",
+    "notes_fts_au": f"""CREATE TRIGGER IF NOT EXISTS notes_fts_au AFTER UPDATE ON notes BEGIN
+        {fts_delete_sql("notes_fts", "old.id")}
+        {_fts_insert_sql("notes_fts", NOTE_COLUMNS, NOTE_VALUES, "new.id")}
+    END""",
+}
+
+SEARCH_TYPES = ("chapters", "insights", "notes")
+
+
+def search_enabled(bind) -> bool:
+    """FTS5 search is only available on SQLite."""
+    return bind.dialect.name == "sqlite"
+
+
+def _contentless_supported(conn: Connection) -> bool:
+    version = conn.execute(text("SELECT sqlite_version()")).scalar()
+    return tuple(int(part) for part in version.split(".")) >= CONTENTLESS_DELETE_VERSION
+
+
+def _chapters_fts_ddl(conn: Connection) -> str:
+    storage = CONTENTLESS if _contentless_supported(conn) else ""
+    return CHAPTERS_FTS_DDL.format(storage=storage, tokenizer=TOKENIZER, prefix=PREFIX_INDEX)
+
+
+def _chapters_fts_outdated(conn: Connection) -> bool:
+    """True for the old layout (text and ids stored in the index) once SQLite can drop it."""
+    ddl = conn.execute(text("SELECT sql FROM sqlite_master WHERE name = 'chapters_fts'")).scalar() or ""
+    return "chapter_id" in ddl or ("contentless_delete" not in ddl and _contentless_supported(conn))
+
+
+def init_search(engine: Engine) -> None:
+    """Create FTS tables and triggers, backfilling any table created just now.
+
+    Indexes built before search_keys existed are dropped and rebuilt.
+    """
+    if not search_enabled(engine):
+        return
+
+    with engine.begin() as conn:
+        existing = {
+            row[0] for row in conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'table'"))
+        }
+        if "search_keys" not in existing:
+            for name in TRIGGERS:
+                conn.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+            for name in FTS_TABLES:
+                conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
+            existing -= set(FTS_TABLES)
+            conn.execute(text(SEARCH_KEYS_DDL))
+        if "chapters_fts" in existing and _chapters_fts_outdated(conn):
+            conn.execute(text("DROP TABLE chapters_fts"))
+            existing.discard("chapters_fts")
+
+        created = []
+        for name, ddl in FTS_TABLES.items():
+            if name not in existing:
+                conn.execute(text(_chapters_fts_ddl(conn) if name == "chapters_fts" else ddl))
+                conn.execute(text(f"INSERT INTO {name} ({name}, rank) VALUES ('rank', :rank)"),
+                             {"rank": RANK_WEIGHTS[name]})
+                created.append(name)
+        for ddl in TRIGGERS.values():
+            conn.execute(text(ddl))
+
+        if "insights_fts" in created:
+            conn.execute(text("INSERT OR IGNORE INTO search_keys (source_id) SELECT id FROM insights"))
+            conn.execute(text("""
+                INSERT INTO insights_fts (rowid, title, summary, evidence, implication, insight_id, book_id, chapter_id)
+                SELECT k.key, i.title, i.summary, i.evidence, i.implication, i.id, i.book_id, i.chapter_id
+                FROM insights i JOIN search_keys k ON k.source_id = i.id"""))
+        if "notes_fts" in created:
+            conn.execute(text("INSERT OR IGNORE INTO search_keys (source_id) SELECT id FROM notes"))
+            conn.execute(text("""
+                INSERT INTO notes_fts (rowid, content, highlight_text, note_id, user_id, book_id, chapter_id)
+                SELECT k.key, n.content, n.highlight_text, n.id, n.user_id, n.book_id, n.chapter_id
+                FROM notes n JOIN search_keys k ON k.source_id = n.id"""))
+
+    if "chapters_fts" in created:
+        rebuild_chapter_index(engine)
+
+
+def rebuild_chapter_index(engine: Engine) -> int:
+    """Re-index every chapter's text (decoded through the ORM/content store)."""
+    from app.db import crud
+    from app.db.models import Chapter
+
+    count = 0
+    with Session(bind=engine) as db:
+        db.execute(text("DELETE FROM chapters_fts"))
+        for chapter in db.query(Chapter).yield_per(200):
+            index_chapter(db.connection(), chapter.id, chapter.title, crud.get_chapter_content(db, chapter))
+            count += 1
+        db.commit()
+    return count
+
+
+def index_chapter(conn: Connection, chapter_id: str, title: str, content: Optional[str]) -> None:
+    """(Re)index one chapter inside the caller's transaction."""
+    if not search_enabled(conn):
+        return
+    params = {"title": title, "content": content or "", "chapter_id": chapter_id}
+    conn.execute(text("INSERT OR IGNORE INTO search_keys (source_id) VALUES (:chapter_id)"), params)
+    conn.execute(text(f"DELETE FROM chapters_fts WHERE rowid = {KEY_FOR.format(ref=':chapter_id')}"), params)
+    conn.execute(
+        text(f"INSERT INTO chapters_fts (rowid, title, content) "
+             f"VALUES ({KEY_FOR.format(ref=':chapter_id')}, :title, :content)"),
+        params,
+    )
+
+
+def to_match_query(query: str) -> str:
+    """Turn free text into a safe FTS5 query: all terms required, last one as a prefix."""
+    terms = re.findall(r"\w+", query)
+    if not terms:
+        return ""
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+SNIPPET_WORDS = 24
+# Chapter text read to cut a snippet when the index holds no text; a match
+# further in gets the chapter's opening as its snippet
+SNIPPET_SCAN_BYTES = 32 * 1024
+
+
+def _term_matcher(query: str) -> re.Pattern:
+    """Words matching any query term, loosely following the porter stemmer (and prefix last term)."""
+    stems = [re.sub(r"(?:ing|ed|es|s)$", "", term) if len(term) > 4 else term
+             for term in (t.lower() for t in re.findall(r"\w+", query))]
+    return re.compile(r"\b(?:" + "|".join(re.escape(stem) for stem in stems) + r")\w*", re.IGNORECASE)
+
+
+def make_snippet(content: str, query: str, words: int = SNIPPET_WORDS) -> str:
+    """About ``words`` words of ``content`` around the first match, matches in ``<mark>``."""
+    matcher = _term_matcher(query)
+    tokens = list(re.finditer(r"\S+", content))
+    first = next((i for i, t in enumerate(tokens) if matcher.search(t.group())), 0)
+    start = max(min(first - words // 4, len(tokens) - words), 0)
+    end = min(start + words, len(tokens))
+    if not tokens:
+        return ""
+    excerpt = content[tokens[start].start():tokens[end - 1].end()]
+    excerpt = matcher.sub(lambda m: f"<mark>{m.group()}</mark>", excerpt)
+    return ("…" if start > 0 else "") + excerpt + ("…" if end < len(tokens) else "")
+
+
+def _normalize(results: List[dict]) -> List[dict]:
+    """Scale one kind's bm25 scores to (0, 1] of its best hit, so kinds can be merged."""
+    if results:
+        best = max(r["score"] for r in results) or 1.0
+        for r in results:
+            r["score"] = round(r["score"] / best, 4)
+    return results
+
+
+def search(
+    db: Session,
+    query: str,
+    types: List[str],
+    book_id: Optional[str] = None,
+    chapter_id: Optional[str] = None,
+    user_id: Optional[str] = None,
+    limit: int = 20,
+) -> List[dict]:
+    """Search the FTS indexes, best matches first.
+
+    bm25 scores depend on each index's column weights and corpus statistics,
+    so every kind is scored relative to its own best hit before the lists
+    are merged. Notes are private, so they are only searched when
+    ``user_id`` is given.
+    """
+    from app.db import crud
+    from app.db.models import Chapter
+
+    match = to_match_query(query)
+    if not match:
+        return []
+
+    filters = ""
+    chapter_filters = ""
+    params = {"match": match, "limit": limit}
+    if book_id:
+        filters += " AND book_id = :book_id"
+        chapter_filters += " AND c.book_id = :book_id"
+        params["book_id"] = book_id
+    if chapter_id:
+        filters += " AND chapter_id = :chapter_id"
+        chapter_filters += " AND c.id = :chapter_id"
+        params["chapter_id"] = chapter_id
+
+    results = []
+    if "chapters" in types:
+        contentless = _contentless_supported(db.connection())  # init_search rebuilds the index to match
+        snippet = "NULL" if contentless else "snippet(chapters_fts, 1, '<mark>', '</mark>', '…', 24)"
+        rows = db.execute(text(f"""
+            SELECT c.id AS chapter_id, c.book_id, c.title, {snippet} AS snippet, chapters_fts.rank
+            FROM chapters_fts
+            JOIN search_keys k ON k.key = chapters_fts.rowid
+            JOIN chapters c ON c.id = k.source_id
+            WHERE chapters_fts MATCH :match{chapter_filters}
+            ORDER BY chapters_fts.rank LIMIT :limit"""), params).all()
+        snippets = {r.chapter_id: r.snippet for r in rows}
+        if contentless and rows:
+            # Only the opening of each chapter is read (and decompressed)
+            for chapter in db.query(Chapter).filter(Chapter.id.in_(list(snippets))):
+                opening = crud.read_chapter_range(db, chapter, 0, SNIPPET_SCAN_BYTES)
+                if len(opening.encode("utf-8")) >= SNIPPET_SCAN_BYTES:
+                    opening = opening[:opening.rfind(" ") + 1 or len(opening)]  # Drop a cut-off word
+                snippets[chapter.id] = make_snippet(opening, query)
+        results += _normalize([
+            {"type": "chapter", "id": r.chapter_id, "book_id": r.book_id, "chapter_id": r.chapter_id,
+             "title": r.title, "snippet": snippets[r.chapter_id] or "", "score": -r.rank}
+            for r in rows
+        ])
+    if "insights" in types:
+        rows = db.execute(text(f"""
+            SELECT insight_id, book_id, chapter_id, title,
+                   snippet(insights_fts, -1, '<mark>', '</mark>', '…', 24) AS snippet, rank
+            FROM insights_fts WHERE insights_fts MATCH :match{filters}
+            ORDER BY rank LIMIT :limit"""), params)
+        results += _normalize([
+            {"type": "insight", "id": r.insight_id, "book_id": r.book_id, "chapter_id": r.chapter_id,
+             "title": r.title, "snippet": r.snippet, "score": -r.rank}
+            for r in rows
+        ])
+    if "notes" in types and user_id:
+        rows = db.execute(text(f"""
+            SELECT note_id, book_id, chapter_id,
+                   snippet(notes_fts, -1, '<mark>', '</mark>', '…', 24) AS snippet, rank
+            FROM notes_fts WHERE notes_fts MATCH :match AND user_id = :user_id{filters}
+            ORDER BY rank LIMIT :limit"""), {**params, "user_id": user_id})
+        results += _normalize([
+            {"type": "note", "id": r.note_id, "book_id": r.book_id, "chapter_id": r.chapter_id,
+             "title": None, "snippet": r.snippet, "score": -r.rank}
+            for r in rows
+        ])
+
+    results.sort(key=lambda r: r["score"], reverse=True)
+    return results[:limit]
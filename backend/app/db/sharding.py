@@ -0,0 +1,204 @@
+"""Per-tenant SQLite shards behind an LRU of open engines.
+
+With ``DATABASE_SHARDING`` on, each tenant's data lives in its own SQLite
+file (``<SHARD_DIR>/<tenant>.db``), so tenants never wait on each other's
+write lock. Engines are opened on first use and kept in an LRU bounded by
+``SHARD_MAX_OPEN_ENGINES``; engines idle for ``SHARD_IDLE_SECONDS`` are
+disposed as well. The main database acts as the shared catalog of sample
+books, which are copied into a tenant's shard when the tenant syncs them.
+"""
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, NamedTuple, Optional
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+TENANT_ID = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$")
+
+
+class InvalidTenant(ValueError):
+    """Raised for tenant ids that are not safe to use as a file name."""
+
+
+def validate_tenant(tenant: str) -> str:
+    if not TENANT_ID.match(tenant or ""):
+        raise InvalidTenant("Tenant id must be 1-64 letters, digits, '-' or '_'")
+    return tenant
+
+
+class _OpenShard(NamedTuple):
+    engine: Engine
+    sessions: sessionmaker
+    last_used: float
+
+
+class EngineLRU:
+    """Open shard engines, least recently used evicted first."""
+
+    def __init__(
+        self,
+        directory: str,
+        init: Callable[[Engine], None],
+        on_connect: Optional[Callable] = None,
+        max_open: int = 32,
+        idle_seconds: float = 600,
+    ):
+        self.directory = directory
+        self.init = init
+        self.on_connect = on_connect
+        self.max_open = max_open
+        self.idle_seconds = idle_seconds
+        self._open: "OrderedDict[str, _OpenShard]" = OrderedDict()
+        self._initialized: set[str] = set()
+        self._lock = threading.Lock()
+        self.stats = {"opens": 0, "hits": 0, "evictions": 0, "idle_evictions": 0}
+
+    def path(self, tenant: str) -> str:
+        return os.path.join(self.directory, f"{validate_tenant(tenant)}.db")
+
+    def engine(self, tenant: str) -> Engine:
+        return self._get(tenant).engine
+
+    def session(self, tenant: str) -> Session:
+        return self._get(tenant).sessions()
+
+    def _get(self, tenant: str) -> _OpenShard:
+        now = time.monotonic()
+        with self._lock:
+            shard = self._open.get(tenant)
+            if shard:
+                self._open[tenant] = shard._replace(last_used=now)
+                self._open.move_to_end(tenant)
+                self.stats["hits"] += 1
+                return self._open[tenant]
+
+            os.makedirs(self.directory, exist_ok=True)
+            engine = create_engine(
+                f"sqlite:///{self.path(tenant)}",
+                connect_args={"check_same_thread": False},
+            )
+            if self.on_connect:
+                event.listen(engine, "connect", self.on_connect)
+            if tenant not in self._initialized:
+                self.init(engine)
+                self._initialized.add(tenant)
+            shard = _OpenShard(engine, sessionmaker(autocommit=False, autoflush=False, bind=engine), now)
+            self._open[tenant] = shard
+            self.stats["opens"] += 1
+
+            while len(self._open) > self.max_open:
+                _, evicted = self._open.popitem(last=False)
+                evicted.engine.dispose()
+                self.stats["evictions"] += 1
+            self._evict_idle(now)
+            return shard
+
+    def _evict_idle(self, now: float) -> int:
+        """Dispose engines unused for idle_seconds (caller holds the lock)."""
+        idle = [t for t, shard in self._open.items() if now - shard.last_used > self.idle_seconds]
+        for tenant in idle:
+            self._open.pop(tenant).engine.dispose()
+        self.stats["idle_evictions"] += len(idle)
+        return len(idle)
+
+    def evict_idle(self) -> int:
+        with self._lock:
+            return self._evict_idle(time.monotonic())
+
+    def open_engines(self) -> dict[str, Engine]:
+        """Snapshot of the currently open engines by tenant."""
+        with self._lock:
+            return {tenant: shard.engine for tenant, shard in self._open.items()}
+
+    def tenants(self) -> list[str]:
+        """Every tenant with a shard file, open or not."""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name[:-3] for name in os.listdir(self.directory) if name.endswith(".db"))
+
+    def dispose_all(self) -> None:
+        with self._lock:
+            for shard in self._open.values():
+                shard.engine.dispose()
+            self._open.clear()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {**self.stats, "open": len(self._open), "max_open": self.max_open,
+                    "idle_seconds": self.idle_seconds}
+
+
+# Tables copied from the catalog into a tenant shard when it syncs a sample book
+CATALOG_FILTERS = {
+    "books": "id = :book_id",
+    "chapters": "book_id = :book_id",
+    "chapter_segments": "chapter_id IN (SELECT id FROM catalog.chapters WHERE book_id = :book_id)",
+}
+
+# Tenant rows of a chapter, deleted with it when the chapter leaves the catalog
+# (SQLite foreign keys are off, so ON DELETE CASCADE does not fire); deleting
+# notes fires the triggers that clear their R-tree and search rows
+CHAPTER_DEPENDENTS = ("insights", "notes", "note_scopes", "chapter_segments")
+
+REMOVED_CHAPTERS = ("SELECT id FROM main.chapters WHERE book_id = :book_id "
+                    "AND id NOT IN (SELECT id FROM catalog.chapters WHERE book_id = :book_id)")
+
+
+def copy_from_catalog(tenant_db: Session, catalog_path: str, book_id: str) -> None:
+    """Copy a catalog book and its chapters into a tenant shard, rows as stored.
+
+    Rows already in the shard are updated (upsert on the primary key), so
+    re-syncing picks up catalog edits; chapters since removed from the
+    catalog are deleted together with the tenant's insights and notes on
+    them. Content is copied still compressed (segment-store locations are
+    shared), then the copied chapters are indexed for search in the shard.
+    """
+    from app.db import crud
+    from app.db.database import Base
+    from app.db.response_cache import invalidate
+    from app.db.search import index_chapter
+
+    chapter_ids = tenant_db.execute(
+        text("SELECT id FROM chapters WHERE book_id = :book_id"), {"book_id": book_id}
+    ).scalars().all()
+    # Held until tenant_db commits below, after the copied rows are visible
+    invalidate(tenant_db, ("book", book_id), ("book-insights", book_id),
+               *(("chapter-insights", chapter_id) for chapter_id in chapter_ids))
+
+    # ATTACH is per connection and not allowed inside a transaction
+    with tenant_db.get_bind().connect() as conn:
+        conn.execute(text("ATTACH DATABASE :path AS catalog"), {"path": catalog_path})
+        conn.commit()
+        try:
+            with conn.begin():
+                for table in CHAPTER_DEPENDENTS:
+                    conn.execute(text(f"DELETE FROM main.{table} WHERE chapter_id IN ({REMOVED_CHAPTERS})"),
+                                 {"book_id": book_id})
+                conn.execute(text(f"DELETE FROM main.chapters WHERE id IN ({REMOVED_CHAPTERS})"),
+                             {"book_id": book_id})
+                for table, where in CATALOG_FILTERS.items():
+                    table_columns = Base.metadata.tables[table].columns
+                    columns = ", ".join(f'"{c.name}"' for c in table_columns)
+                    keys = ", ".join(f'"{c.name}"' for c in table_columns if c.primary_key)
+                    updates = ", ".join(f'"{c.name}" = excluded."{c.name}"' for c in table_columns if not c.primary_key)
+                    conn.execute(
+                        text(f"INSERT INTO main.{table} ({columns}) "
+                             f"SELECT {columns} FROM catalog.{table} WHERE {where} "
+                             f"ON CONFLICT ({keys}) DO UPDATE SET {updates}"),
+                        {"book_id": book_id},
+                    )
+        finally:
+            conn.execute(text("DETACH DATABASE catalog"))
+            conn.commit()
+
+    chapters = crud.get_chapters_by_book(tenant_db, book_id, with_content=True)
+    contents = crud.get_chapter_contents(tenant_db, chapters)
+    for chapter in chapters:
+        index_chapter(tenant_db.connection(), chapter.id, chapter.title, contents[chapter.id])
+    tenant_db.commit()
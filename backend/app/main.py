@@ -5,8 +5,12 @@ from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
 from app.core.config import get_settings
-from app.routers import books, analysis, mappings, news
-from app.db.database import init_db
+from app.routers import books, analysis, mappings, news, search, metrics, progress, notes, maintenance
+from app.db.database import init_db, shards
+from app.db.maintenance import scheduler as maintenance_scheduler
+from app.db.instrumentation import SQLInstrumentationMiddleware, install_sql_instrumentation
+from app.services.progress_service import progress_buffer
+from app.services.http_client import start_http_client, close_http_client
 
 settings = get_settings()
 
@@ -18,9 +22,17 @@ async def lifespan(app: FastAPI):
     print("🚀 Starting up BookMind AI API...")
     init_db()
     print("✅ Database initialized")
+    await start_http_client()
+    await progress_buffer.start()
+    if settings.MAINTENANCE_ENABLED:
+        await maintenance_scheduler.start()
     yield
     # Shutdown
     print("🛑 Shutting down...")
+    await maintenance_scheduler.stop()
+    await progress_buffer.stop()
+    shards.dispose_all()
+    await close_http_client()
 
 
 app = FastAPI(
@@ -40,11 +52,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-request SQL instrumentation
+if settings.SQL_INSTRUMENTATION_ENABLED:
+    install_sql_instrumentation()
+    app.add_middleware(SQLInstrumentationMiddleware)
+
 # Include routers
 app.include_router(books.router)
 app.include_router(analysis.router)
 app.include_router(mappings.router)
 app.include_router(news.router)
+app.include_router(search.router)
+app.include_router(metrics.router)
+app.include_router(progress.router)
+app.include_router(notes.router)
+app.include_router(maintenance.router)
 
 
 @app.get("/")
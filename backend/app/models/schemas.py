@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 from typing import List, Optional, Literal
 from datetime import datetime
 
@@ -38,6 +38,20 @@ class Book(BaseModel):
     category: Optional[str] = None
 
 
+class BookSummary(BaseModel):
+    """Library listing entry: book metadata without its content."""
+    id: str
+    title: str
+    author: Optional[str] = None
+    category: Optional[str] = None
+    description: Optional[str] = None
+    coverColor: Optional[str] = None
+    sampleId: Optional[str] = None
+    isSample: bool = False
+    totalChapters: int = 0
+    createdAt: Optional[datetime] = None
+
+
 # ==================== AI Analysis Models ====================
 
 class Insight(BaseModel):
@@ -210,12 +224,14 @@ class GenerateInsightsRequest(BaseModel):
     book_id: Optional[str] = None  # For saving to DB
     chapter_id: Optional[str] = None  # For saving to DB
     save_to_db: bool = True  # Whether to save the generated insights
+    use_cache: bool = True  # False bypasses the LLM response cache
 
 
 class GenerateFirstPrinciplesRequest(BaseModel):
     chapter_title: str
     chapter_content: str
     concept: str
+    use_cache: bool = True  # False bypasses the LLM response cache
 
 
 class GenerateDialecticRequest(BaseModel):
@@ -223,6 +239,7 @@ class GenerateDialecticRequest(BaseModel):
     chapter_content: str
     book_title: str
     author: str = "Unknown"
+    use_cache: bool = True  # False bypasses the LLM response cache
 
 
 class FindConceptMappingsRequest(BaseModel):
@@ -230,6 +247,7 @@ class FindConceptMappingsRequest(BaseModel):
     source_book_id: str
     source_domain: str
     user_book_ids: List[str] = Field(default_factory=list)
+    use_cache: bool = True  # False bypasses the LLM response cache
 
 
 class GetEvidenceRequest(BaseModel):
@@ -286,6 +304,102 @@ class DeleteInsightResponse(BaseModel):
     deleted_id: Optional[str] = None
 
 
+# ==================== Note Models ====================
+
+class CreateNoteRequest(BaseModel):
+    """Request to create a note or highlight on a chapter."""
+    user_id: str
+    book_id: str
+    chapter_id: str
+    content: str
+    highlight_text: Optional[str] = None
+    note_type: Literal["note", "highlight", "question"] = "note"
+    start_index: Optional[int] = Field(None, ge=0)
+    end_index: Optional[int] = Field(None, ge=0)
+
+    @model_validator(mode="after")
+    def check_range(self):
+        if (self.start_index is None) != (self.end_index is None):
+            raise ValueError("start_index and end_index must be given together")
+        if self.start_index is not None and self.end_index < self.start_index:
+            raise ValueError("end_index must not be before start_index")
+        return self
+
+
+class NoteResponse(BaseModel):
+    """Response model for a saved note."""
+    id: str
+    user_id: str
+    book_id: str
+    chapter_id: str
+    content: str
+    highlight_text: Optional[str] = None
+    note_type: str
+    start_index: Optional[int] = None
+    end_index: Optional[int] = None
+    created_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
+
+
+class DeleteNoteResponse(BaseModel):
+    """Response after deleting a note."""
+    success: bool
+    message: str
+    deleted_id: Optional[str] = None
+
+
+# ==================== Search Models ====================
+
+class SearchResult(BaseModel):
+    """A single full-text search hit."""
+    type: Literal["chapter", "insight", "note"]
+    id: str
+    book_id: str
+    chapter_id: str
+    title: Optional[str] = None
+    snippet: str
+    score: float
+
+
+class SearchResponse(BaseModel):
+    """Ranked search results."""
+    query: str
+    results: List[SearchResult]
+    total: int
+
+
+# ==================== Reading Progress Models ====================
+
+class ProgressUpdateRequest(BaseModel):
+    """A reading-progress report; omitted fields keep their current value."""
+    current_chapter: Optional[int] = Field(None, ge=1)
+    progress_percent: Optional[int] = Field(None, ge=0, le=100)
+    is_completed: Optional[bool] = None
+
+
+class ReadingProgress(BaseModel):
+    """A user's progress in one book; ``pending`` means not yet written to the database."""
+    user_id: str
+    book_id: str
+    current_chapter: Optional[int] = None
+    progress_percent: Optional[int] = None
+    is_completed: Optional[bool] = None
+    started_at: Optional[datetime] = None
+    last_read_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+    pending: bool = False
+
+
+class ShelfEntry(BaseModel):
+    """A book on a user's shelf with the user's progress and content counts."""
+    book: BookSummary
+    progress: ReadingProgress
+    chapter_count: int = 0
+    insight_count: int = 0
+
+
 # ==================== Sample Book Models ====================
 
 class SampleBook(BaseModel):
@@ -1,8 +1,10 @@
 """Router for AI analysis endpoints."""
 
-from fastapi import APIRouter, HTTPException, Body, Depends
-from typing import List
+from fastapi import APIRouter, HTTPException, Body, Depends, Query, Request
+from typing import List, Optional
 from sqlalchemy.orm import Session
+import itertools
+import time
 
 from app.models.schemas import (
     GenerateInsightsRequest, Insight, SavedInsightResponse, InsightsListResponse,
@@ -16,10 +18,17 @@ from app.services.openai_service import (
     generate_first_principles,
     generate_dialectical_analysis,
     generate_ai_response,
+    stream_ai_response,
+    stream_insights,
+    stream_dialectical_analysis,
+    FALLBACK_INSIGHT,
 )
 from app.data import get_fallback_dialectic
 from app.db import get_db
 from app.db import crud
+from app.db.pagination import InvalidCursor
+from app.db.response_cache import cached_json
+from app.core.streaming import wants_ndjson, ndjson_response, sse_event, sse_response
 
 router = APIRouter(prefix="/analysis", tags=["analysis"])
 
@@ -37,26 +46,35 @@ async def analyze_insights(
             chapter_content=request.chapter_content,
             chapter_summary=request.chapter_summary,
             book_title=request.book_title,
-            book_author=request.book_author
+            book_author=request.book_author,
+            use_cache=request.use_cache,
+            chapter_tokens=(crud.get_chapter_token_count(db, request.chapter_id, request.chapter_content)
+                            if request.chapter_id else None)
         )
         
         # Save to database if requested and we have book/chapter IDs
         if request.save_to_db and request.book_id and request.chapter_id:
-            # Check if we already have insights for this chapter
-            existing_insights = crud.get_insights_by_chapter(db, request.chapter_id)
-            
-            if existing_insights:
-                # Delete old insights before saving new ones
-                crud.delete_insights_by_chapter(db, request.chapter_id)
-            
-            # Save new insights
-            crud.create_insights_batch(
+            # Replace any previous insights in a single transaction
+            saved = crud.replace_chapter_insights(
                 db=db,
                 book_id=request.book_id,
                 chapter_id=request.chapter_id,
                 insights_data=insights_data,
                 ai_model="gpt-4o-mini"
             )
+            return [
+                Insight(
+                    id=i.id,
+                    title=i.title,
+                    summary=i.summary,
+                    evidence=i.evidence,
+                    implication=i.implication,
+                    insight_type=i.insight_type,
+                    created_at=i.created_at,
+                    is_ai_generated=bool(i.is_ai_generated)
+                )
+                for i in saved
+            ]
         
         # Convert to Pydantic models and return
         return [Insight(**insight) for insight in insights_data]
@@ -74,22 +92,126 @@ async def analyze_insights(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/insights/stream")
+async def analyze_insights_stream(
+    request: GenerateInsightsRequest,
+    db: Session = Depends(get_db)
+):
+    """Generate AI insights for a chapter, streamed as server-sent events.
+
+    Emits an ``insight`` event as soon as the model has finished writing
+    each one, then ``done`` with the count and timings. With ``save_to_db``
+    the insights are saved once all have arrived and ``done`` carries the
+    saved rows (with IDs). If generation fails before the first insight the
+    fallback insight is sent; after it, an ``error`` event ends the stream.
+    """
+    chapter_tokens = (crud.get_chapter_token_count(db, request.chapter_id, request.chapter_content)
+                      if request.chapter_id else None)
+
+    async def events():
+        started = time.perf_counter()
+        first_at = None
+        insights = []
+        try:
+            try:
+                async for insight in stream_insights(
+                    chapter_title=request.chapter_title,
+                    chapter_content=request.chapter_content,
+                    chapter_summary=request.chapter_summary,
+                    book_title=request.book_title,
+                    book_author=request.book_author,
+                    use_cache=request.use_cache,
+                    chapter_tokens=chapter_tokens
+                ):
+                    payload = Insight(**insight).model_dump(mode="json")
+                    if first_at is None:
+                        first_at = time.perf_counter()
+                    insights.append(insight)
+                    yield sse_event("insight", payload)
+            except Exception as e:
+                print(f"Failed to stream insights: {e}")
+                if insights:
+                    yield sse_event("error", {"detail": str(e)})
+                    return
+                insights = [dict(FALLBACK_INSIGHT)]
+                yield sse_event("insight", Insight(**FALLBACK_INSIGHT).model_dump(mode="json"))
+
+            done = {
+                "count": len(insights),
+                "first_insight_ms": round((first_at - started) * 1000, 1) if first_at else None,
+                "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+            }
+            if request.save_to_db and request.book_id and request.chapter_id:
+                saved = crud.replace_chapter_insights(
+                    db=db,
+                    book_id=request.book_id,
+                    chapter_id=request.chapter_id,
+                    insights_data=insights,
+                    ai_model="gpt-4o-mini"
+                )
+                done["saved"] = [SavedInsightResponse.model_validate(i).model_dump(mode="json") for i in saved]
+            yield sse_event("done", done)
+        finally:
+            db.close()
+
+    return sse_response(events())
+
+
 @router.get("/insights/chapter/{chapter_id}", response_model=InsightsListResponse)
 async def get_chapter_insights(chapter_id: str, db: Session = Depends(get_db)):
-    """Get saved insights for a specific chapter."""
-    insights = crud.get_insights_by_chapter(db, chapter_id)
-    return InsightsListResponse(
-        insights=[SavedInsightResponse.model_validate(i) for i in insights],
-        total=len(insights),
-        chapter_id=chapter_id
-    )
+    """Get saved insights for a specific chapter (served from the read cache until they change)."""
+    def build():
+        insights = crud.get_insights_by_chapter(db, chapter_id)
+        return InsightsListResponse(
+            insights=[SavedInsightResponse.model_validate(i) for i in insights],
+            total=len(insights),
+            chapter_id=chapter_id
+        ), {}
+
+    return cached_json(db, ("chapter-insights", chapter_id), [("chapter-insights", chapter_id)], build)
 
 
 @router.get("/insights/book/{book_id}", response_model=List[SavedInsightResponse])
-async def get_book_insights(book_id: str, limit: int = 100, db: Session = Depends(get_db)):
-    """Get all insights for a book."""
-    insights = crud.get_insights_by_book(db, book_id, limit)
-    return [SavedInsightResponse.model_validate(i) for i in insights]
+async def get_book_insights(
+    book_id: str,
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Page size (default 100; unlimited when streaming)"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    format: Optional[str] = Query(None, pattern="^(json|ndjson)$", description="ndjson streams one insight per line"),
+    db: Session = Depends(get_db)
+):
+    """Get insights for a book, newest first.
+
+    Paged by keyset on (created_at, id); the cursor for the next page is
+    returned in the ``X-Next-Cursor`` header. Ask for ``application/x-ndjson``
+    (or ``?format=ndjson``) to stream every insight as it is fetched. JSON
+    pages are served from the read cache until the book's insights change.
+    """
+    try:
+        if wants_ndjson(request, format):
+            pages = crud.iter_insight_pages(db, book_id, cursor=cursor, page_size=limit or 200)
+            first = next(pages, [])  # Validate the cursor before the response starts
+
+            def lines():
+                try:
+                    for page in itertools.chain([first], pages):
+                        for insight in page:
+                            yield SavedInsightResponse.model_validate(insight).model_dump_json()
+                finally:
+                    db.close()
+
+            return ndjson_response(lines())
+
+        def build():
+            insights, next_cursor = crud.get_insights_page(db, book_id, limit or 100, cursor)
+            return (
+                [SavedInsightResponse.model_validate(i) for i in insights],
+                {"X-Next-Cursor": next_cursor} if next_cursor else {},
+            )
+
+        return cached_json(db, ("book-insights", book_id, limit, cursor), [("book-insights", book_id)], build)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.put("/insights/{insight_id}", response_model=SavedInsightResponse)
@@ -130,7 +252,8 @@ async def analyze_first_principles(request: GenerateFirstPrinciplesRequest):
         principles = await generate_first_principles(
             chapter_title=request.chapter_title,
             chapter_content=request.chapter_content,
-            concept=request.concept
+            concept=request.concept,
+            use_cache=request.use_cache
         )
         return principles
     except ValueError as e:
@@ -157,7 +280,8 @@ async def analyze_dialectic(request: GenerateDialecticRequest):
             chapter_title=request.chapter_title,
             chapter_content=request.chapter_content,
             book_title=request.book_title,
-            author=request.author
+            author=request.author,
+            use_cache=request.use_cache
         )
         return analysis
     except ValueError as e:
@@ -167,6 +291,50 @@ async def analyze_dialectic(request: GenerateDialecticRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/dialectic/stream")
+async def analyze_dialectic_stream(request: GenerateDialecticRequest):
+    """Generate dialectical analysis, streamed as server-sent events.
+
+    Emits a ``section`` event (``{"name", "content"}``) for thesis,
+    antithesis, synthesis and implications as each is completed, then
+    ``done``. If generation fails before the first section the fallback
+    analysis is sent section by section; after it, an ``error`` event ends
+    the stream.
+    """
+    async def events():
+        started = time.perf_counter()
+        first_at = None
+        sections = []
+        try:
+            async for name, content in stream_dialectical_analysis(
+                chapter_title=request.chapter_title,
+                chapter_content=request.chapter_content,
+                book_title=request.book_title,
+                author=request.author,
+                use_cache=request.use_cache
+            ):
+                if first_at is None:
+                    first_at = time.perf_counter()
+                sections.append(name)
+                yield sse_event("section", {"name": name, "content": content})
+        except Exception as e:
+            print(f"Failed to stream dialectical analysis: {e}")
+            if sections:
+                yield sse_event("error", {"detail": str(e)})
+                return
+            for name, content in get_fallback_dialectic(request.chapter_title, request.book_title).items():
+                sections.append(name)
+                yield sse_event("section", {"name": name, "content": content})
+
+        yield sse_event("done", {
+            "sections": sections,
+            "first_section_ms": round((first_at - started) * 1000, 1) if first_at else None,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        })
+
+    return sse_response(events())
+
+
 @router.post("/chat", response_model=str)
 async def chat_with_ai(request: ChatRequest):
     """Chat with AI about a chapter."""
@@ -180,3 +348,48 @@ async def chat_with_ai(request: ChatRequest):
         return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/chat/stream")
+async def chat_with_ai_stream(request: ChatRequest):
+    """Chat with AI about a chapter, streamed as server-sent events.
+
+    Emits a ``token`` event (``{"text": ...}``) per chunk as the model
+    produces it, then a ``done`` event with the full text, finish reason,
+    token usage and timings, or an ``error`` event. Disconnecting cancels
+    the upstream completion.
+    """
+    async def events():
+        started = time.perf_counter()
+        first_token_at = None
+        parts = []
+        final = {}
+        try:
+            async for item in stream_ai_response(
+                question=request.question,
+                chapter_title=request.chapter_title,
+                chapter_content=request.chapter_content,
+                conversation_history=[m.model_dump() for m in request.conversation_history]
+            ):
+                if "delta" not in item:
+                    final = item
+                    continue
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                parts.append(item["delta"])
+                yield sse_event("token", {"text": item["delta"]})
+        except Exception as e:
+            print(f"Failed to stream AI response: {e}")
+            yield sse_event("error", {"detail": str(e)})
+            return
+
+        yield sse_event("done", {
+            "text": "".join(parts),
+            "finish_reason": final.get("finish_reason"),
+            "usage": final.get("usage"),
+            "chunks": len(parts),
+            "ttft_ms": round((first_token_at - started) * 1000, 1) if first_token_at else None,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        })
+
+    return sse_response(events())
@@ -1,17 +1,125 @@
 """Router for book-related endpoints."""
 
-from fastapi import APIRouter, File, UploadFile, HTTPException, Depends
-from typing import List, Optional
+from fastapi import APIRouter, File, UploadFile, HTTPException, Depends, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from typing import List, Optional, Set
+from datetime import datetime
+import itertools
+import json
 from sqlalchemy.orm import Session
 
-from app.models.schemas import Book, SampleBook
+from app.models.schemas import Book, BookSummary, SampleBook
 from app.data import get_all_sample_books, get_sample_book, CATEGORIES
 from app.services.file_service import extract_text_from_file, analyze_book_content
+from app.services.context_packing import count_tokens
+from app.core.config import get_settings
 from app.db import get_db
 from app.db import crud
+from app.db.database import get_catalog_db
+from app.db.sharding import copy_from_catalog
+from app.db.pagination import InvalidCursor
+from app.db.response_cache import cached_json
+from app.core.streaming import wants_ndjson, ndjson_response
+
+settings = get_settings()
 
 router = APIRouter(prefix="/books", tags=["books"])
 
+# Sparse fieldsets: fields clients may ask for with ?fields= / ?include=
+BOOK_FIELDS = {"id", "title", "author", "content", "chapters", "concepts", "uploadedAt", "totalPages", "category"}
+CHAPTER_FIELDS = {"id", "number", "title", "content", "summary", "keyPoints", "startIndex", "endIndex", "concepts"}
+CHAPTER_LIST_FIELDS = {"id", "number", "title", "content", "summary", "word_count", "token_count", "key_points"}
+BOOK_INCLUDES = {"content", "chapters", "chapter_content"}
+
+
+def _parse_csv(raw: Optional[str], allowed: Set[str], param: str) -> Optional[Set[str]]:
+    """Parse a comma-separated query parameter, rejecting unknown names."""
+    if raw is None:
+        return None
+    values = {v.strip() for v in raw.split(",") if v.strip()}
+    unknown = values - allowed
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown {param}: {', '.join(sorted(unknown))}. Allowed: {', '.join(sorted(allowed))}"
+        )
+    return values
+
+
+def _book_selection(fields: Optional[str], include: Optional[str]) -> Optional[Set[str]]:
+    """Resolve ?fields= and ?include= into the set of book keys to return.
+
+    Returns None when neither parameter is given (full legacy response).
+    Text payloads (book content, chapter content) are only returned when
+    named explicitly, so a table-of-contents request never reads them.
+    """
+    selected = _parse_csv(fields, BOOK_FIELDS, "fields")
+    includes = _parse_csv(include, BOOK_INCLUDES, "include")
+    if selected is None and includes is None:
+        return None
+
+    if selected is None:
+        selected = BOOK_FIELDS - {"content", "chapters"}
+    selected = set(selected) | {"id"}
+    for name in includes or set():
+        selected.add("chapters" if name == "chapter_content" else name)
+    if "chapter_content" in (includes or set()):
+        selected.add("chapters.content")
+    return selected
+
+
+@router.get("", response_model=List[BookSummary])
+async def list_books(
+    response: Response,
+    category: Optional[str] = None,
+    author: Optional[str] = None,
+    source: Optional[str] = Query(None, pattern="^(sample|uploaded)$", description="Only sample or only uploaded books"),
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    sort: str = Query("-created_at", pattern="^-?(created_at|title)$", description="Sort key; prefix with - for descending"),
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    db: Session = Depends(get_db)
+):
+    """List books in the library without their content.
+
+    Keyset-paginated: the cursor for the next page is returned in the
+    ``X-Next-Cursor`` header, so deep pages cost the same as the first.
+    """
+    try:
+        books, next_cursor = crud.list_books(
+            db,
+            category=category,
+            author=author,
+            is_sample=None if source is None else source == "sample",
+            created_after=created_after,
+            created_before=created_before,
+            sort=sort.lstrip("-"),
+            descending=sort.startswith("-"),
+            limit=limit,
+            cursor=cursor
+        )
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return [
+        BookSummary(
+            id=b.id,
+            title=b.title,
+            author=b.author,
+            category=b.category,
+            description=b.description,
+            coverColor=b.cover_color,
+            sampleId=b.sample_id,
+            isSample=b.sample_id is not None,
+            totalChapters=b.total_chapters or 0,
+            createdAt=b.created_at
+        )
+        for b in books
+    ]
+
 
 @router.get("/sample", response_model=List[SampleBook])
 async def get_sample_books():
@@ -58,27 +166,28 @@ async def upload_book(file: UploadFile = File(...), db: Session = Depends(get_db
             category="Uploaded"
         )
         
-        # Create chapters in database
-        for chapter_data in analysis["chapters"]:
-            crud.get_or_create_chapter(
-                db=db,
-                book_id=db_book.id,
-                number=chapter_data["number"],
-                title=chapter_data["title"],
-                content=chapter_data.get("content"),
-                summary=chapter_data.get("summary"),
-                key_points=chapter_data.get("keyPoints", [])
-            )
+        # Create chapters in database (one bulk insert; the book is new)
+        crud.create_chapters(db, db_book.id, [
+            {
+                "number": chapter_data["number"],
+                "title": chapter_data["title"],
+                "content": chapter_data.get("content"),
+                "summary": chapter_data.get("summary"),
+                "key_points": chapter_data.get("keyPoints", []),
+                "token_count": count_tokens(chapter_data.get("content")),
+            }
+            for chapter_data in analysis["chapters"]
+        ])
         
         # Refresh to get chapters
-        db_book = crud.get_book(db, db_book.id)
+        db_book = crud.update_book(db, db_book.id, total_chapters=len(analysis["chapters"]))
         
         # Convert to Pydantic model
         return Book(
             id=db_book.id,
             title=db_book.title,
             author=db_book.author,
-            content=db_book.content or text,
+            content=text,
             chapters=analysis["chapters"],
             concepts=analysis["concepts"],
             totalPages=analysis["totalPages"],
@@ -92,14 +201,38 @@ async def upload_book(file: UploadFile = File(...), db: Session = Depends(get_db
 
 
 @router.get("/{book_id}", response_model=Book)
-async def get_book(book_id: str, db: Session = Depends(get_db)):
-    """Get a book by ID from database."""
+async def get_book(
+    book_id: str,
+    fields: Optional[str] = Query(None, description="Comma-separated book fields to return"),
+    include: Optional[str] = Query(None, description="Heavy payloads to add: content, chapters, chapter_content"),
+    db: Session = Depends(get_db)
+):
+    """Get a book by ID from database.
+
+    Without ``fields``/``include`` the full book is returned. With either,
+    only the named fields are returned and the book/chapter text columns
+    are read from the database only when requested. Responses are served
+    from the read cache until the book or its chapters change.
+    """
+    selected = _book_selection(fields, include)
+    return cached_json(
+        db, ("book", book_id, frozenset(selected) if selected else None), [("book", book_id)],
+        lambda: (_book_content(db, book_id, selected), {}),
+    )
+
+
+def _book_content(db: Session, book_id: str, selected: Optional[Set[str]]):
+    """Build the (possibly sparse) book response body."""
+    want_content = selected is None or "content" in selected
+    want_chapters = selected is None or "chapters" in selected
+    want_chapter_content = selected is None or "chapters.content" in selected
+
     db_book = crud.get_book(db, book_id)
     if not db_book:
         # Try sample books
         sample = get_sample_book(book_id)
         if sample:
-            return Book(
+            book = Book(
                 id=sample["id"],
                 title=sample["title"],
                 author=sample["author"],
@@ -108,22 +241,24 @@ async def get_book(book_id: str, db: Session = Depends(get_db)):
                 concepts=[],
                 category=sample["category"]
             )
+            return _sparse_book(book, selected)
         raise HTTPException(status_code=404, detail="Book not found")
     
-    # Get chapters
-    chapters = crud.get_chapters_by_book(db, book_id)
+    # Get chapters (text is deferred and only loaded when asked for)
+    chapters = crud.get_chapters_by_book(db, book_id, with_content=want_chapter_content) if want_chapters else []
+    contents = crud.get_chapter_contents(db, chapters) if want_chapter_content else {}
     
-    return Book(
+    book = Book(
         id=db_book.id,
         title=db_book.title,
         author=db_book.author,
-        content=db_book.content or "",
+        content=(db_book.content or "") if want_content else "",
         chapters=[
             {
                 "id": c.id,
                 "number": c.number,
                 "title": c.title,
-                "content": c.content or "",
+                "content": contents.get(c.id) or "",
                 "summary": c.summary,
                 "keyPoints": c.key_points or [],
                 "startIndex": 0,
@@ -135,18 +270,39 @@ async def get_book(book_id: str, db: Session = Depends(get_db)):
         concepts=[],
         category=db_book.category
     )
+    return _sparse_book(book, selected)
+
+
+def _sparse_book(book: Book, selected: Optional[Set[str]]):
+    """Serialize only the selected book fields (all of them when selected is None)."""
+    if selected is None:
+        return book
+    spec = {name: True for name in selected if "." not in name}
+    if "chapters" in spec:
+        chapter_keys = CHAPTER_FIELDS if "chapters.content" in selected else CHAPTER_FIELDS - {"content"}
+        spec["chapters"] = {"__all__": set(chapter_keys)}
+    return jsonable_encoder(book, include=spec)
 
 
 @router.post("/sample/sync/{sample_id}")
-async def sync_sample_book(sample_id: str, db: Session = Depends(get_db)):
-    """Sync a sample book to the database with its chapters."""
+async def sync_sample_book(
+    sample_id: str,
+    db: Session = Depends(get_db),
+    catalog_db: Session = Depends(get_catalog_db)
+):
+    """Sync a sample book to the database with its chapters.
+
+    With sharding the book is synced once into the shared catalog and then
+    copied into the tenant's shard.
+    """
     sample = get_sample_book(sample_id)
     if not sample:
         raise HTTPException(status_code=404, detail="Sample book not found")
+    sync_db = catalog_db if settings.DATABASE_SHARDING else db
     
     # Create or get book
     db_book = crud.get_or_create_book(
-        db=db,
+        db=sync_db,
         title=sample["title"],
         author=sample["author"],
         sample_id=sample_id,
@@ -162,16 +318,21 @@ async def sync_sample_book(sample_id: str, db: Session = Depends(get_db)):
     created_chapters = []
     for chapter_data in analysis["chapters"]:
         chapter = crud.get_or_create_chapter(
-            db=db,
+            db=sync_db,
             book_id=db_book.id,
             number=chapter_data["number"],
             title=chapter_data["title"],
             content=chapter_data.get("content"),
             summary=chapter_data.get("summary"),
-            key_points=chapter_data.get("keyPoints", [])
+            key_points=chapter_data.get("keyPoints", []),
+            token_count=count_tokens(chapter_data.get("content"))
         )
         created_chapters.append(chapter)
     
+    crud.update_book(sync_db, db_book.id, total_chapters=len(created_chapters))
+    if sync_db is not db:
+        copy_from_catalog(db, sync_db.get_bind().url.database, db_book.id)
+    
     return {
         "message": f"Synced book '{db_book.title}' with {len(created_chapters)} chapters",
         "book_id": db_book.id,
@@ -180,18 +341,101 @@ async def sync_sample_book(sample_id: str, db: Session = Depends(get_db)):
 
 
 @router.get("/{book_id}/chapters")
-async def get_book_chapters(book_id: str, db: Session = Depends(get_db)):
-    """Get all chapters for a book."""
-    chapters = crud.get_chapters_by_book(db, book_id)
-    return [
-        {
-            "id": c.id,
-            "number": c.number,
-            "title": c.title,
-            "content": c.content,
-            "summary": c.summary,
-            "word_count": c.word_count,
-            "key_points": c.key_points or []
-        }
-        for c in chapters
-    ]
+async def get_book_chapters(
+    book_id: str,
+    request: Request,
+    fields: Optional[str] = Query(None, description="Comma-separated chapter fields to return"),
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Page size (all chapters when omitted)"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    format: Optional[str] = Query(None, pattern="^(json|ndjson)$", description="ndjson streams one chapter per line"),
+    db: Session = Depends(get_db)
+):
+    """Get chapters for a book.
+
+    Pass ``fields`` (e.g. ``id,number,title``) for a sparse listing; chapter
+    text is only read from the database when ``content`` is among them.
+    With ``limit`` the listing is paged by chapter number and the cursor for
+    the next page is returned in the ``X-Next-Cursor`` header. Ask for
+    ``application/x-ndjson`` (or ``?format=ndjson``) to stream rows as they
+    are fetched instead of building one JSON array. JSON responses are served
+    from the read cache until the book's chapters change.
+    """
+    selected = _parse_csv(fields, CHAPTER_LIST_FIELDS, "fields")
+    with_content = selected is None or "content" in selected
+
+    def rows(chapters):
+        contents = crud.get_chapter_contents(db, chapters) if with_content else {}
+        for c in chapters:
+            row = {
+                "id": c.id,
+                "number": c.number,
+                "title": c.title,
+                "content": contents.get(c.id),
+                "summary": c.summary,
+                "word_count": c.word_count,
+                "token_count": c.token_count,
+                "key_points": c.key_points or []
+            }
+            yield row if selected is None else {k: v for k, v in row.items() if k in selected}
+
+    try:
+        if wants_ndjson(request, format):
+            pages = crud.iter_chapter_pages(db, book_id, with_content=with_content, cursor=cursor)
+            first = next(pages, [])  # Validate the cursor before the response starts
+
+            def lines():
+                try:
+                    for page in itertools.chain([first], pages):
+                        for row in rows(page):
+                            yield json.dumps(row)
+                finally:
+                    db.close()
+
+            return ndjson_response(lines())
+
+        def build():
+            if limit is None and cursor is None:
+                return list(rows(crud.get_chapters_by_book(db, book_id, with_content=with_content))), {}
+            chapters, next_cursor = crud.get_chapters_page(db, book_id, limit or 100, cursor, with_content)
+            return list(rows(chapters)), {"X-Next-Cursor": next_cursor} if next_cursor else {}
+
+        return cached_json(
+            db, ("chapters", book_id, frozenset(selected) if selected else None, limit, cursor),
+            [("book", book_id)], build,
+        )
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/{book_id}/chapters/{chapter_number}/text")
+async def get_chapter_text(
+    book_id: str,
+    chapter_number: int,
+    offset: int = Query(0, ge=0, description="Start byte offset in the chapter's UTF-8 text"),
+    length: Optional[int] = Query(None, ge=1, description="Number of bytes to read"),
+    word_start: Optional[int] = Query(None, ge=0, description="First word of a word window"),
+    word_count: int = Query(200, ge=1, le=5000, description="Words in the window"),
+    db: Session = Depends(get_db)
+):
+    """Read part of a chapter without loading the whole text.
+
+    Use ``offset``/``length`` for a page (byte range) or ``word_start``/
+    ``word_count`` for a window of words, as the Power Reader does.
+    """
+    chapter = crud.get_chapter_by_number(db, book_id, chapter_number)
+    if not chapter:
+        raise HTTPException(status_code=404, detail="Chapter not found")
+
+    if word_start is not None:
+        text = crud.read_chapter_words(db, chapter, word_start, word_count)
+    else:
+        end = offset + length if length is not None else None
+        text = crud.read_chapter_range(db, chapter, offset, end)
+
+    return {
+        "chapter_id": chapter.id,
+        "number": chapter.number,
+        "offset": offset if word_start is None else None,
+        "word_start": word_start,
+        "text": text,
+    }
@@ -0,0 +1,28 @@
+"""Router for database maintenance endpoints."""
+
+from fastapi import APIRouter, HTTPException
+
+from app.db.database import engine
+from app.db.maintenance import backup_all, is_sqlite, scheduler
+
+router = APIRouter(prefix="/maintenance", tags=["maintenance"])
+
+
+@router.get("/status")
+async def get_maintenance_status():
+    """Scheduler state and the results of the last maintenance pass."""
+    return scheduler.get_status()
+
+
+@router.post("/run")
+def run_maintenance():
+    """Run every maintenance task now, ignoring the off-peak window."""
+    return scheduler.run_once(force=True)
+
+
+@router.post("/backup")
+def create_backup():
+    """Take an online backup of the main database and all tenant shards."""
+    if not is_sqlite(engine):
+        raise HTTPException(status_code=501, detail="Online backups require the SQLite backend")
+    return {"success": True, "path": backup_all()}
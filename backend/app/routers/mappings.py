@@ -43,7 +43,8 @@ async def find_concept_mappings_endpoint(request: FindConceptMappingsRequest):
                     source_concept=request.concept,
                     source_domain=request.source_domain,
                     source_context=request.context,
-                    target_books=target_books
+                    target_books=target_books,
+                    use_cache=request.use_cache
                 )
                 
                 if ai_analogies:
@@ -0,0 +1,64 @@
+"""Router for operational metrics endpoints."""
+
+import asyncio
+
+from fastapi import APIRouter
+
+from app.db.database import shards
+from app.db.instrumentation import get_sql_metrics, reset_sql_metrics
+from app.db.response_cache import response_cache
+from app.services.llm_cache import llm_cache
+from app.services.openai_service import in_flight, in_flight_streams, openai_breaker, rate_limiter, token_usage
+from app.services.progress_service import progress_buffer
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+
+@router.get("/db")
+async def get_db_metrics():
+    """Per-route query counts, DB time and the slowest statements seen."""
+    return get_sql_metrics()
+
+
+@router.delete("/db")
+async def reset_db_metrics():
+    """Reset the collected SQL metrics."""
+    reset_sql_metrics()
+    return {"success": True}
+
+
+@router.get("/progress")
+async def get_progress_metrics():
+    """Write-behind progress buffer: pending pairs, flushes and rows written."""
+    return progress_buffer.get_stats()
+
+
+@router.get("/shards")
+async def get_shard_metrics():
+    """Tenant shard engine LRU: open engines, hits, opens and evictions."""
+    return shards.get_stats()
+
+
+@router.get("/cache")
+async def get_cache_metrics():
+    """Read cache: entries, bytes, hits, misses, evictions and invalidations."""
+    return response_cache.get_stats()
+
+
+@router.get("/llm-cache")
+async def get_llm_cache_metrics():
+    """LLM response cache (entries, hits, misses, evictions) and request coalescing."""
+    stats = await asyncio.to_thread(llm_cache.get_stats)
+    return {**stats, "single_flight": in_flight.get_stats(), "shared_streams": in_flight_streams.get_stats()}
+
+
+@router.delete("/llm-cache")
+async def clear_llm_cache():
+    """Drop every cached LLM response."""
+    return {"success": True, "deleted": await asyncio.to_thread(llm_cache.clear)}
+
+
+@router.get("/openai")
+async def get_openai_metrics():
+    """OpenAI circuit breaker state, rate limiter budgets and queue waits, and token usage per call."""
+    return {**openai_breaker.get_stats(), "rate_limiter": rate_limiter.get_stats(), "usage": token_usage.get_stats()}
@@ -0,0 +1,54 @@
+"""Router for note and highlight endpoints."""
+
+from fastapi import APIRouter, HTTPException, Depends, Query
+from typing import List, Optional
+from sqlalchemy.orm import Session
+
+from app.models.schemas import CreateNoteRequest, NoteResponse, DeleteNoteResponse
+from app.db import get_db
+from app.db import crud
+
+router = APIRouter(prefix="/notes", tags=["notes"])
+
+
+@router.post("", response_model=NoteResponse)
+async def create_note(request: CreateNoteRequest, db: Session = Depends(get_db)):
+    """Create a note or highlight."""
+    if not crud.get_chapter(db, request.chapter_id):
+        raise HTTPException(status_code=404, detail="Chapter not found")
+    note = crud.create_note(db, **request.model_dump())
+    return NoteResponse.model_validate(note)
+
+
+@router.get("/chapter/{chapter_id}", response_model=List[NoteResponse])
+async def get_chapter_notes(
+    chapter_id: str,
+    user_id: str = Query(..., description="Owner of the notes"),
+    start: Optional[int] = Query(None, ge=0, description="Window start (character offset, inclusive)"),
+    end: Optional[int] = Query(None, ge=0, description="Window end (character offset, exclusive)"),
+    limit: Optional[int] = Query(None, ge=1, le=10000),
+    db: Session = Depends(get_db)
+):
+    """Get a user's notes for a chapter.
+
+    With ``start`` and ``end`` only notes overlapping the visible window
+    ``[start, end)`` are returned, ordered by position, through the interval
+    index. Without them every note is returned, newest first.
+    """
+    if (start is None) != (end is None):
+        raise HTTPException(status_code=400, detail="start and end must be given together")
+    if start is None:
+        notes = crud.get_notes_by_chapter(db, user_id, chapter_id)
+        return [NoteResponse.model_validate(n) for n in notes[:limit]]
+    if end < start:
+        raise HTTPException(status_code=400, detail="end must not be before start")
+    notes = crud.get_notes_in_range(db, user_id, chapter_id, start, end, limit=limit)
+    return [NoteResponse.model_validate(n) for n in notes]
+
+
+@router.delete("/{note_id}", response_model=DeleteNoteResponse)
+async def delete_note(note_id: str, user_id: str = Query(...), db: Session = Depends(get_db)):
+    """Delete a note (only its owner can)."""
+    if not crud.delete_note(db, note_id, user_id):
+        raise HTTPException(status_code=404, detail="Note not found")
+    return DeleteNoteResponse(success=True, message="Note deleted successfully", deleted_id=note_id)
@@ -0,0 +1,121 @@
+"""Router for reading-progress endpoints."""
+
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
+from typing import List, Optional
+from sqlalchemy.orm import Session
+
+from app.models.schemas import BookSummary, ProgressUpdateRequest, ReadingProgress, ShelfEntry
+from app.db import get_db
+from app.db.database import get_tenant
+from app.db import crud
+from app.db.pagination import InvalidCursor
+from app.services import progress_service
+from app.services.progress_service import progress_buffer
+
+router = APIRouter(prefix="/progress", tags=["progress"])
+
+
+@router.put("/{user_id}/books/{book_id}", response_model=ReadingProgress)
+async def report_progress(
+    user_id: str,
+    book_id: str,
+    request: ProgressUpdateRequest,
+    tenant: Optional[str] = Depends(get_tenant),
+    db: Session = Depends(get_db)
+):
+    """Record reading progress.
+
+    Updates are buffered and written in batches, so the response only echoes
+    what was reported (``pending`` is true until the next flush).
+    """
+    if not crud.get_book(db, book_id):
+        raise HTTPException(status_code=404, detail="Book not found")
+    state = progress_buffer.record(
+        user_id,
+        book_id,
+        current_chapter=request.current_chapter,
+        progress_percent=request.progress_percent,
+        is_completed=request.is_completed,
+        tenant=tenant,
+    )
+    return ReadingProgress(
+        **{**state, "is_completed": None if state.get("is_completed") is None else bool(state["is_completed"])},
+        pending=not progress_buffer.write_through,
+    )
+
+
+@router.get("/{user_id}/books/{book_id}", response_model=ReadingProgress)
+async def get_progress(
+    user_id: str,
+    book_id: str,
+    tenant: Optional[str] = Depends(get_tenant),
+    db: Session = Depends(get_db)
+):
+    """Get a user's progress in a book, including updates not yet flushed."""
+    state = progress_service.get_progress(db, user_id, book_id, tenant)
+    if not state:
+        raise HTTPException(status_code=404, detail="No progress recorded for this book")
+    return ReadingProgress(**state)
+
+
+@router.get("/{user_id}/shelf", response_model=List[ShelfEntry])
+async def get_shelf(
+    user_id: str,
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    tenant: Optional[str] = Depends(get_tenant),
+    db: Session = Depends(get_db)
+):
+    """A user's shelf: book metadata, progress and chapter/insight counts, most recently read first.
+
+    One query per page, keyset-paginated (next cursor in ``X-Next-Cursor``).
+    Progress includes buffered updates; the order follows stored progress.
+    """
+    try:
+        rows, next_cursor = crud.get_shelf(db, user_id, limit=limit, cursor=cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    pending = {state["book_id"]: state for state in progress_buffer.pending(user_id, tenant=tenant)}
+    return [
+        ShelfEntry(
+            book=BookSummary(
+                id=book.id,
+                title=book.title,
+                author=book.author,
+                category=book.category,
+                description=book.description,
+                coverColor=book.cover_color,
+                sampleId=book.sample_id,
+                isSample=book.sample_id is not None,
+                totalChapters=book.total_chapters or 0,
+                createdAt=book.created_at
+            ),
+            progress=ReadingProgress(**progress_service.overlay(
+                progress_service.progress_to_dict(user_book), pending.get(book.id)
+            )),
+            chapter_count=chapters,
+            insight_count=insights
+        )
+        for user_book, book, chapters, insights in rows
+    ]
+
+
+@router.get("/{user_id}", response_model=List[ReadingProgress])
+async def list_progress(
+    user_id: str,
+    tenant: Optional[str] = Depends(get_tenant),
+    db: Session = Depends(get_db)
+):
+    """List a user's books, most recently read first."""
+    return [ReadingProgress(**state) for state in progress_service.list_progress(db, user_id, tenant)]
+
+
+@router.post("/flush")
+def flush_progress():
+    """Write all buffered progress now."""
+    written = progress_buffer.flush()
+    return {"success": True, "written": written}
@@ -0,0 +1,46 @@
+"""Router for full-text search endpoints."""
+
+from fastapi import APIRouter, HTTPException, Depends, Query
+from typing import Optional
+from sqlalchemy.orm import Session
+
+from app.models.schemas import SearchResponse, SearchResult
+from app.db import get_db
+from app.db import search as search_index
+
+router = APIRouter(prefix="/search", tags=["search"])
+
+
+@router.get("", response_model=SearchResponse)
+async def search(
+    q: str = Query(..., min_length=1, description="Search terms"),
+    types: str = Query("chapters,insights,notes", description="Comma-separated: chapters, insights, notes"),
+    book_id: Optional[str] = None,
+    chapter_id: Optional[str] = None,
+    user_id: Optional[str] = Query(None, description="Required to search the user's notes"),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    """Search chapters, insights and notes, ranked by bm25 with highlighted snippets."""
+    if not search_index.search_enabled(db.get_bind()):
+        raise HTTPException(status_code=501, detail="Full-text search requires the SQLite backend")
+
+    requested = [t.strip() for t in types.split(",") if t.strip()]
+    unknown = set(requested) - set(search_index.SEARCH_TYPES)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown search types: {', '.join(sorted(unknown))}")
+
+    results = search_index.search(
+        db,
+        query=q,
+        types=requested,
+        book_id=book_id,
+        chapter_id=chapter_id,
+        user_id=user_id,
+        limit=limit
+    )
+    return SearchResponse(
+        query=q,
+        results=[SearchResult(**r) for r in results],
+        total=len(results)
+    )
@@ -0,0 +1,214 @@
+"""Token-aware packing of chapter text into prompts.
+
+Tokens are counted locally, with ``tiktoken`` when it is installed and its
+vocabulary is already cached (``TIKTOKEN_CACHE_DIR``); it is never
+downloaded at runtime. Otherwise they are estimated from the UTF-8 length:
+CJK characters count as a token each and ASCII text as four characters per
+token. ``pack_context`` fills a token budget with whole sentences instead of
+slicing at a fixed character count. The budget for each kind of prompt comes
+from settings, capped by the model's context window. ``TokenUsage`` keeps
+the reported usage of every upstream call.
+"""
+
+import functools
+import hashlib
+import math
+import os
+import re
+import tempfile
+import time
+from collections import deque
+from typing import NamedTuple, Optional
+
+from app.core.config import get_settings
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken is optional; tokens are estimated without it
+    tiktoken = None
+
+settings = get_settings()
+
+DEFAULT_MODEL = "gpt-4o-mini"
+
+# Context windows (tokens); unknown models get the smallest
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-4o-mini": 128_000,
+    "gpt-4o": 128_000,
+    "gpt-4-turbo": 128_000,
+    "gpt-4": 8_192,
+    "gpt-3.5-turbo": 16_385,
+}
+DEFAULT_CONTEXT_WINDOW = 8_192
+
+# Instructions, examples and chat history that surround the packed text
+PROMPT_RESERVE_TOKENS = 1_500
+
+# Chapter text budget per kind of prompt
+PURPOSE_BUDGETS = {
+    "insights": lambda: settings.CONTEXT_TOKENS_ANALYSIS,
+    "dialectic": lambda: settings.CONTEXT_TOKENS_ANALYSIS,
+    "first_principles": lambda: settings.CONTEXT_TOKENS_SHORT,
+    "summary": lambda: settings.CONTEXT_TOKENS_SHORT,
+    "chat": lambda: settings.CONTEXT_TOKENS_CHAT,
+}
+
+# A sentence ends after terminal punctuation (plus closing quotes/brackets) and whitespace,
+# after CJK full stops, or at a line break
+SENTENCE_END = re.compile(r"[.!?]+[\"'”’)\]]*\s+|[。！？]+[”」』]?\s*|\n\s*")
+# No real token spans more characters than this; bounds how much text a budget can need
+MAX_CHARS_PER_TOKEN = 8
+
+# Vocabulary files tiktoken downloads on first use; only used here when already in its cache
+VOCABULARY_URL = "https://openaipublic.blob.core.windows.net/encodings/{}.tiktoken"
+VOCABULARIES = ("o200k_base", "cl100k_base")
+
+
+def _vocabulary_cached(name: str) -> bool:
+    """Whether tiktoken would load ``name`` from its cache (same lookup as ``tiktoken.load``)."""
+    cache_dir = os.environ.get("TIKTOKEN_CACHE_DIR", os.environ.get(
+        "DATA_GYM_CACHE_DIR", os.path.join(tempfile.gettempdir(), "data-gym-cache")))
+    key = hashlib.sha1(VOCABULARY_URL.format(name).encode()).hexdigest()
+    return bool(cache_dir) and os.path.exists(os.path.join(cache_dir, key))
+
+
+def get_encoding(model: str = DEFAULT_MODEL):
+    """The tiktoken encoding for ``model``, or None to fall back to estimates."""
+    if tiktoken is None:
+        return None
+    try:
+        name = tiktoken.encoding_name_for_model(model)
+    except KeyError:
+        name = "o200k_base"
+    return _load_encoding(name)
+
+
+@functools.lru_cache(maxsize=None)
+def _load_encoding(name: str):
+    if name not in VOCABULARIES or not _vocabulary_cached(name):
+        print(f"⚠️  tiktoken vocabulary {name} not cached; estimating token counts")
+        return None
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception as e:  # Corrupt cache file
+        print(f"⚠️  tiktoken vocabulary {name} unavailable ({type(e).__name__}); estimating token counts")
+        return None
+
+
+def approximate_tokens(text: str) -> int:
+    """Offline estimate: ~1 token per 3-byte (CJK) character, 4 ASCII characters per token."""
+    wide = (len(text.encode("utf-8")) - len(text)) / 2  # Extra UTF-8 bytes; 2 per CJK character
+    return math.ceil(wide + (len(text) - wide) / 4)
+
+
+def count_tokens(text: Optional[str], model: str = DEFAULT_MODEL) -> int:
+    """Tokens in ``text`` for ``model``."""
+    if not text:
+        return 0
+    encoding = get_encoding(model)
+    if encoding is None:
+        return approximate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def context_budget(purpose: str, model: str = DEFAULT_MODEL, max_tokens: int = 0) -> int:
+    """Tokens of chapter text a ``purpose`` prompt may carry for ``model``."""
+    window = MODEL_CONTEXT_WINDOWS.get(model, DEFAULT_CONTEXT_WINDOW)
+    return max(min(PURPOSE_BUDGETS[purpose](), window - PROMPT_RESERVE_TOKENS - max_tokens), 0)
+
+
+class PackedContext(NamedTuple):
+    text: str
+    tokens: int  # Tokens in ``text``
+    total_tokens: int  # Tokens in the full source text
+    truncated: bool
+
+
+def _fit_position(text: str, budget: int, model: str) -> int:
+    """Largest character offset whose prefix fits in ``budget`` tokens."""
+    window = text[:budget * MAX_CHARS_PER_TOKEN]
+    encoding = get_encoding(model)
+    if encoding is not None:
+        tokens = encoding.encode(window, disallowed_special=())
+        if len(tokens) <= budget:
+            return len(window)
+        return len(encoding.decode_bytes(tokens[:budget]).decode("utf-8", errors="ignore"))
+    low, high = 0, len(window)
+    while low < high:  # Longest prefix whose estimate fits
+        mid = (low + high + 1) // 2
+        if approximate_tokens(window[:mid]) <= budget:
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+
+def pack_context(
+    text: Optional[str],
+    budget: int,
+    model: str = DEFAULT_MODEL,
+    known_tokens: Optional[int] = None
+) -> PackedContext:
+    """Fit ``text`` into ``budget`` tokens, cutting at the last sentence boundary that fits.
+
+    ``known_tokens`` (e.g. the count stored for a chapter at ingest) skips
+    counting; it must be the count of ``text`` itself. A first sentence
+    longer than the budget is cut at a word boundary instead.
+    """
+    text = text or ""
+    total = known_tokens if known_tokens is not None else count_tokens(text, model)
+    if total <= budget:
+        return PackedContext(text, total, total, False)
+
+    limit = _fit_position(text, budget, model)
+    cut = 0
+    for match in SENTENCE_END.finditer(text, 0, limit):
+        cut = match.end()
+    if cut == 0:
+        cut = text.rfind(" ", 0, limit) + 1 or limit
+    packed = text[:cut].rstrip()
+    return PackedContext(packed, count_tokens(packed, model), total, True)
+
+
+class TokenUsage:
+    """Per-call and per-purpose token accounting for upstream calls."""
+
+    def __init__(self, recent: int = 200):
+        self.recent = deque(maxlen=recent)
+        self.totals = {}
+
+    def record_context(self, purpose: str, packed: PackedContext) -> None:
+        totals = self._totals(purpose)
+        totals["context_tokens"] += packed.tokens
+        totals["context_dropped_tokens"] += packed.total_tokens - packed.tokens
+        totals["truncated"] += packed.truncated
+
+    def record_call(self, purpose: str, model: str, estimated: int, usage: Optional[dict], stream: bool) -> None:
+        usage = usage or {}
+        totals = self._totals(purpose)
+        totals["calls"] += 1
+        for field in ("prompt_tokens", "completion_tokens", "total_tokens"):
+            totals[field] += usage.get(field) or 0
+        self.recent.append({
+            "at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "purpose": purpose,
+            "model": model,
+            "stream": stream,
+            "estimated_tokens": estimated,
+            "prompt_tokens": usage.get("prompt_tokens"),
+            "completion_tokens": usage.get("completion_tokens"),
+            "total_tokens": usage.get("total_tokens"),
+        })
+
+    def _totals(self, purpose: str) -> dict:
+        if purpose not in self.totals:
+            self.totals[purpose] = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0,
+                                    "context_tokens": 0, "context_dropped_tokens": 0, "truncated": 0}
+        return self.totals[purpose]
+
+    def get_stats(self, recent: int = 20) -> dict:
+        return {
+            "tokenizer": "tiktoken" if get_encoding(DEFAULT_MODEL) is not None else "estimate",
+            "by_purpose": self.totals,
+            "recent_calls": list(self.recent)[-recent:][::-1],
+        }
@@ -0,0 +1,60 @@
+"""Shared outbound HTTP client.
+
+One ``httpx.AsyncClient`` is created by the app lifespan and reused by every
+OpenAI call, so requests ride pooled keep-alive connections instead of
+paying a TCP + TLS handshake each time. Pool size, keep-alive expiry and
+HTTP/2 come from settings.
+"""
+
+from typing import Optional
+
+import httpx
+
+from app.core.config import get_settings
+
+settings = get_settings()
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def build_client() -> httpx.AsyncClient:
+    """A pooled client configured from settings (HTTP/2 only if ``h2`` is installed)."""
+    limits = httpx.Limits(
+        max_connections=settings.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY_SECONDS,
+    )
+    timeout = httpx.Timeout(settings.OPENAI_TIMEOUT_SECONDS, connect=settings.HTTP_CONNECT_TIMEOUT_SECONDS)
+    try:
+        return httpx.AsyncClient(limits=limits, timeout=timeout, http2=settings.HTTP_HTTP2)
+    except ImportError:
+        print("⚠️  HTTP_HTTP2 needs the h2 package (pip install 'httpx[http2]'); using HTTP/1.1")
+        return httpx.AsyncClient(limits=limits, timeout=timeout)
+
+
+async def start_http_client() -> httpx.AsyncClient:
+    """Create the shared client (called from the app lifespan)."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = build_client()
+    return _client
+
+
+async def close_http_client() -> None:
+    """Close the shared client and its pooled connections."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """The shared client started by the app lifespan.
+
+    Raises ``RuntimeError`` outside it (before startup or after shutdown)
+    rather than creating a client nobody closes; scripts and benchmarks
+    call ``start_http_client()`` themselves or pass their own client.
+    """
+    if _client is None or _client.is_closed:
+        raise RuntimeError("Shared HTTP client is not running; call start_http_client() first")
+    return _client
@@ -0,0 +1,123 @@
+"""Incremental JSON parsing for streamed LLM replies.
+
+``JSONStreamParser`` is fed the reply text chunk by chunk and returns each
+value whose path matches one of the requested patterns as soon as its last
+character has arrived, e.g. ``("insights", "*")`` for every element of the
+``insights`` array or ``("*",)`` for every top-level member. Text before the
+root object or array (such as a markdown code fence) and after it is
+ignored.
+"""
+
+import json
+from typing import Any, Hashable, List, Sequence, Tuple
+
+Path = Tuple[Hashable, ...]
+
+_SCALAR_END = frozenset(",}] \t\r\n")
+
+
+class _Frame:
+    __slots__ = ("kind", "path", "start", "key", "index", "expect_key")
+
+    def __init__(self, kind: str, path: Path, start: int):
+        self.kind = kind  # "{" or "["
+        self.path = path
+        self.start = start
+        self.key = None
+        self.index = 0
+        self.expect_key = kind == "{"
+
+
+class JSONStreamParser:
+    """Emit completed JSON values at matching paths while text streams in."""
+
+    def __init__(self, *patterns: Sequence[Hashable]):
+        self.patterns = [tuple(p) for p in patterns]
+        self.text = ""
+        self.done = False
+        self.root_span = None  # (start, end) of the root value in ``text`` once done
+        self._pos = 0
+        self._stack: List[_Frame] = []
+        self._string_start = None
+        self._string_is_key = False
+        self._escape = False
+        self._scalar_start = None
+
+    def feed(self, chunk: str) -> List[Tuple[Path, Any]]:
+        """Consume ``chunk``; return the ``(path, value)`` pairs it completed."""
+        self.text += chunk
+        text = self.text
+        completed = []
+        i = self._pos
+        while i < len(text) and not self.done:
+            c = text[i]
+            if self._string_start is not None:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    start, self._string_start = self._string_start, None
+                    if self._string_is_key:
+                        self._stack[-1].key = json.loads(text[start:i + 1])
+                    else:
+                        self._complete(self._child_path(), start, i + 1, completed)
+                i += 1
+                continue
+            if self._scalar_start is not None:
+                if c not in _SCALAR_END:
+                    i += 1
+                    continue
+                start, self._scalar_start = self._scalar_start, None
+                self._complete(self._child_path(), start, i, completed)
+
+            if not self._stack:
+                if c in "{[":
+                    self._stack.append(_Frame(c, (), i))
+                i += 1
+                continue
+
+            top = self._stack[-1]
+            if c in "{[":
+                self._stack.append(_Frame(c, self._child_path(), i))
+            elif c in "}]":
+                frame = self._stack.pop()
+                self._complete(frame.path, frame.start, i + 1, completed)
+            elif c == '"':
+                self._string_start = i
+                self._string_is_key = top.kind == "{" and top.expect_key
+            elif c == ":":
+                top.expect_key = False
+            elif c == ",":
+                if top.kind == "{":
+                    top.expect_key = True
+                else:
+                    top.index += 1
+            elif c not in " \t\r\n":
+                self._scalar_start = i
+            i += 1
+        self._pos = i
+        return completed
+
+    @property
+    def json_text(self) -> str:
+        """The root value's text, without any fence or prose around it."""
+        if self.root_span is None:
+            raise ValueError("JSON value not complete")
+        start, end = self.root_span
+        return self.text[start:end]
+
+    def _child_path(self) -> Path:
+        top = self._stack[-1]
+        return top.path + ((top.key,) if top.kind == "{" else (top.index,))
+
+    def _complete(self, path: Path, start: int, end: int, completed: list) -> None:
+        if not self._stack:
+            self.done = True
+            self.root_span = (start, end)
+        if any(self._matches(pattern, path) for pattern in self.patterns):
+            completed.append((path, json.loads(self.text[start:end])))
+
+    @staticmethod
+    def _matches(pattern: Path, path: Path) -> bool:
+        return len(pattern) == len(path) and all(p == "*" or p == k for p, k in zip(pattern, path))
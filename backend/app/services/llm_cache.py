@@ -0,0 +1,137 @@
+"""Persistent cache of LLM responses in SQLite.
+
+Responses are keyed by a hash of (model, messages, temperature, max_tokens,
+prompt version), so a popular chapter's insights or dialectic are generated
+once and then served from disk. Entries expire after ``LLM_CACHE_TTL_SECONDS``
+and the table is capped at ``LLM_CACHE_MAX_ENTRIES``, least recently used
+evicted first. The cache lives in its own SQLite file regardless of which
+database backs the app.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from app.core.config import get_settings
+from app.db.database import DATA_DIR, create_db_engine
+
+settings = get_settings()
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS llm_responses (
+        key TEXT PRIMARY KEY,
+        model TEXT NOT NULL,
+        response TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        expires_at REAL NOT NULL,
+        last_used_at REAL NOT NULL,
+        hits INTEGER NOT NULL DEFAULT 0
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_llm_responses_lru ON llm_responses (last_used_at)",
+    "CREATE INDEX IF NOT EXISTS idx_llm_responses_expiry ON llm_responses (expires_at)",
+]
+
+
+def cache_key(model: str, messages: list[dict], temperature: float, max_tokens: int, prompt_version: str) -> str:
+    """Stable hash of everything that determines a completion."""
+    payload = json.dumps(
+        {"model": model, "messages": messages, "temperature": temperature,
+         "max_tokens": max_tokens, "prompt_version": prompt_version},
+        sort_keys=True, separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """SQLite-backed response cache with TTL and LRU eviction."""
+
+    def __init__(
+        self,
+        path: str,
+        ttl_seconds: float = settings.LLM_CACHE_TTL_SECONDS,
+        max_entries: int = settings.LLM_CACHE_MAX_ENTRIES,
+        enabled: bool = settings.LLM_CACHE_ENABLED,
+    ):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._engine: Optional[Engine] = None
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "stores": 0, "evictions": 0, "bypassed": 0}
+
+    @property
+    def engine(self) -> Engine:
+        with self._lock:
+            if self._engine is None:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                self._engine = create_db_engine(f"sqlite:///{self.path}")
+                with self._engine.begin() as conn:
+                    for ddl in SCHEMA:
+                        conn.execute(text(ddl))
+            return self._engine
+
+    def get(self, key: str) -> Optional[str]:
+        """Cached response for ``key``, or None when missing or expired."""
+        now = time.time()
+        with self.engine.begin() as conn:
+            row = conn.execute(
+                text("SELECT response, expires_at FROM llm_responses WHERE key = :key"), {"key": key}
+            ).first()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            if row.expires_at <= now:
+                conn.execute(text("DELETE FROM llm_responses WHERE key = :key"), {"key": key})
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+            conn.execute(
+                text("UPDATE llm_responses SET last_used_at = :now, hits = hits + 1 WHERE key = :key"),
+                {"now": now, "key": key},
+            )
+        self.stats["hits"] += 1
+        return row.response
+
+    def put(self, key: str, model: str, response: str) -> None:
+        """Store a response, dropping expired rows and evicting beyond the size cap."""
+        now = time.time()
+        with self.engine.begin() as conn:
+            conn.execute(
+                text("INSERT OR REPLACE INTO llm_responses "
+                     "(key, model, response, created_at, expires_at, last_used_at, hits) "
+                     "VALUES (:key, :model, :response, :now, :expires_at, :now, 0)"),
+                {"key": key, "model": model, "response": response, "now": now,
+                 "expires_at": now + self.ttl_seconds},
+            )
+            conn.execute(text("DELETE FROM llm_responses WHERE expires_at <= :now"), {"now": now})
+            evicted = conn.execute(
+                text("DELETE FROM llm_responses WHERE key IN ("
+                     "SELECT key FROM llm_responses ORDER BY last_used_at DESC LIMIT -1 OFFSET :keep)"),
+                {"keep": self.max_entries},
+            ).rowcount
+        self.stats["stores"] += 1
+        self.stats["evictions"] += evicted
+
+    def clear(self) -> int:
+        with self.engine.begin() as conn:
+            return conn.execute(text("DELETE FROM llm_responses")).rowcount
+
+    def get_stats(self) -> dict:
+        stats = {**self.stats, "enabled": self.enabled, "ttl_seconds": self.ttl_seconds,
+                 "max_entries": self.max_entries}
+        if self.enabled:
+            with self.engine.connect() as conn:
+                stats["entries"] = conn.execute(text("SELECT count(*) FROM llm_responses")).scalar()
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else None
+        return stats
+
+
+llm_cache = LLMCache(settings.LLM_CACHE_PATH or os.path.join(DATA_DIR, "llm_cache.db"))
@@ -1,47 +1,315 @@
 """OpenAI API Service for generating insights, first principles, and analysis."""
 
+import asyncio
 import httpx
 import json
-from typing import List, Optional
+import re
+from typing import AsyncIterator, Callable, List, Optional
 from app.core.config import get_settings
+from app.services.context_packing import TokenUsage, context_budget, pack_context
+from app.services.http_client import get_http_client
+from app.services.json_stream import JSONStreamParser
+from app.services.llm_cache import cache_key, llm_cache
+from app.services.passage_index import get_passage_index
+from app.services.rate_limiter import Priority, RateLimiter, estimate_tokens
+from app.services.resilience import (
+    CircuitBreaker, UpstreamError, attempt_timeout, call_with_retries, error_from_response
+)
+from app.services.single_flight import SharedStream, SingleFlight
 
 settings = get_settings()
 
-OPENAI_API_URL = "https://api.openai.com/v1/chat/completions"
+# Part of the LLM cache key: bump when prompts change so old responses are not reused
+PROMPT_VERSION = "1"
+
+# Identical cacheable calls in flight at the same time share one upstream request
+in_flight = SingleFlight()
+in_flight_streams = SharedStream()
+
+# Shared by every OpenAI call: while open, calls fail fast and callers use their fallbacks
+openai_breaker = CircuitBreaker()
+
+# Client-side RPM/TPM budgets; chat is served before analysis, analysis before background work
+rate_limiter = RateLimiter()
+
+# Packed context and reported token usage per call and per purpose
+token_usage = TokenUsage()
+
+# Returned when insights cannot be generated
+FALLBACK_INSIGHT = {
+    "title": "Core Concept Identified",
+    "summary": "The chapter presents fundamental principles that form the foundation of this subject.",
+    "evidence": "Key arguments and examples throughout the text support this understanding.",
+    "implication": "These principles can be applied to analyze and understand related phenomena in the real world.",
+    "insight_type": "pattern"
+}
 
 
 async def call_openai(
     messages: list[dict],
     temperature: float = 0.7,
     max_tokens: int = 2000,
-    model: str = "gpt-4o-mini"
+    model: str = "gpt-4o-mini",
+    client: Optional[httpx.AsyncClient] = None,
+    cache: bool = False,
+    bypass_cache: bool = False,
+    validate: Optional[Callable[[str], object]] = None,
+    priority: Priority = Priority.ANALYSIS,
+    purpose: str = "other"
+) -> str:
+    """Make a call to the OpenAI API.
+
+    Uses the shared pooled client from the app lifespan unless ``client`` is given.
+    With ``cache`` the response is looked up in / stored to the LLM response
+    cache (``validate`` must accept it first), and concurrent calls with the
+    same cache key share a single upstream request. ``bypass_cache`` skips
+    both for a cacheable call whose caller opted out; only those calls are
+    counted as ``bypassed``. Transient failures are retried with backoff;
+    while ``openai_breaker`` is open the call raises ``CircuitOpenError`` at
+    once. Each attempt waits for rate-limit budget in the ``priority`` lane.
+    Token usage is recorded under ``purpose``.
+    """
+    if not cache or bypass_cache:
+        if cache and llm_cache.enabled:
+            llm_cache.stats["bypassed"] += 1
+        return await _request_completion(messages, temperature, max_tokens, model, client, priority, purpose)
+
+    key = cache_key(model, messages, temperature, max_tokens, PROMPT_VERSION)
+    return await in_flight.run(
+        key, lambda: _cached_completion(
+            key, messages, temperature, max_tokens, model, client, validate, priority, purpose
+        )
+    )
+
+
+async def _cached_completion(
+    key: str,
+    messages: list[dict],
+    temperature: float,
+    max_tokens: int,
+    model: str,
+    client: Optional[httpx.AsyncClient],
+    validate: Optional[Callable[[str], object]],
+    priority: Priority,
+    purpose: str
+) -> str:
+    if llm_cache.enabled:
+        cached = await asyncio.to_thread(llm_cache.get, key)
+        if cached is not None:
+            return cached
+    content = await _request_completion(messages, temperature, max_tokens, model, client, priority, purpose)
+    if validate:
+        validate(content)
+    if llm_cache.enabled:
+        await asyncio.to_thread(llm_cache.put, key, model, content)
+    return content
+
+
+async def _request_completion(
+    messages: list[dict],
+    temperature: float,
+    max_tokens: int,
+    model: str,
+    client: Optional[httpx.AsyncClient],
+    priority: Priority,
+    purpose: str
 ) -> str:
-    """Make a call to the OpenAI API."""
     if not settings.OPENAI_API_KEY:
         raise ValueError("OpenAI API key not configured")
     
-    async with httpx.AsyncClient() as client:
+    client = client or get_http_client()
+    payload = {
+        "model": model,
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+    }
+    estimated = estimate_tokens(messages, max_tokens, model)
+
+    async def attempt(until: float) -> str:
+        await rate_limiter.acquire(estimated, priority)
         response = await client.post(
-            OPENAI_API_URL,
-            headers={
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {settings.OPENAI_API_KEY}",
-            },
-            json={
-                "model": model,
-                "messages": messages,
-                "temperature": temperature,
-                "max_tokens": max_tokens,
-            },
-            timeout=60.0,
+            f"{settings.OPENAI_BASE_URL}/chat/completions", headers=_headers(), json=payload,
+            timeout=attempt_timeout(until)
         )
-        
         if not response.is_success:
-            error_data = response.json()
-            raise Exception(error_data.get("error", {}).get("message", "OpenAI API error"))
-        
-        data = response.json()
-        return data["choices"][0]["message"]["content"]
+            raise error_from_response(response)
+        try:
+            data = response.json()
+            content = data["choices"][0]["message"]["content"]
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            raise UpstreamError(f"OpenAI returned a malformed response: {e!r}") from e
+        rate_limiter.settle(estimated, (data.get("usage") or {}).get("total_tokens"))
+        token_usage.record_call(purpose, model, estimated, data.get("usage"), stream=False)
+        return content
+
+    return await call_with_retries(attempt, openai_breaker)
+
+
+async def stream_openai(
+    messages: list[dict],
+    temperature: float = 0.7,
+    max_tokens: int = 2000,
+    model: str = "gpt-4o-mini",
+    client: Optional[httpx.AsyncClient] = None,
+    priority: Priority = Priority.ANALYSIS,
+    purpose: str = "other"
+) -> AsyncIterator[dict]:
+    """Stream a completion with ``stream: true``.
+
+    Yields ``{"delta": text}`` for each content chunk as it arrives, then one
+    ``{"finish_reason": ..., "usage": ...}``. Chunks are read from upstream
+    only as fast as the consumer takes them; closing the generator closes
+    the upstream response. Opening the stream is retried like any call;
+    once chunks have been yielded a failure is raised, not retried.
+    """
+    if not settings.OPENAI_API_KEY:
+        raise ValueError("OpenAI API key not configured")
+
+    client = client or get_http_client()
+    payload = {
+        "model": model,
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "stream": True,
+        "stream_options": {"include_usage": True},
+    }
+    estimated = estimate_tokens(messages, max_tokens, model)
+
+    async def attempt(until: float) -> httpx.Response:
+        await rate_limiter.acquire(estimated, priority)
+        request = client.build_request(
+            "POST", f"{settings.OPENAI_BASE_URL}/chat/completions", headers=_headers(), json=payload,
+            timeout=attempt_timeout(until)
+        )
+        response = await client.send(request, stream=True)
+        if not response.is_success:
+            await response.aread()
+            await response.aclose()
+            raise error_from_response(response)
+        return response
+
+    response = await call_with_retries(attempt, openai_breaker)
+    try:
+        finish_reason = usage = None
+        async for line in response.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            chunk = json.loads(data)
+            usage = chunk.get("usage") or usage
+            for choice in chunk.get("choices", []):
+                content = choice.get("delta", {}).get("content")
+                if content:
+                    yield {"delta": content}
+                finish_reason = choice.get("finish_reason") or finish_reason
+    except httpx.TransportError:
+        openai_breaker.record_failure()
+        raise
+    finally:
+        await response.aclose()
+    rate_limiter.settle(estimated, (usage or {}).get("total_tokens"))
+    token_usage.record_call(purpose, model, estimated, usage, stream=True)
+    yield {"finish_reason": finish_reason, "usage": usage}
+
+
+def _headers() -> dict:
+    return {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {settings.OPENAI_API_KEY}",
+    }
+
+
+def parse_json_response(response: str):
+    """Parse a JSON reply, tolerating markdown code fences."""
+    cleaned = response.replace("```json\n", "").replace("\n```", "").replace("```", "").strip()
+    return json.loads(cleaned)
+
+
+def parse_json_array(response: str) -> list:
+    """Parse the first JSON array in a reply."""
+    json_match = re.search(r'\[[\s\S]*\]', response)
+    if not json_match:
+        raise ValueError("No JSON array in response")
+    return json.loads(json_match.group())
+
+
+def _pack(purpose: str, chapter_content: str, max_tokens: int, chapter_tokens: Optional[int] = None) -> str:
+    """Chapter text cut to the ``purpose`` token budget at a sentence boundary."""
+    packed = pack_context(chapter_content, context_budget(purpose, max_tokens=max_tokens), known_tokens=chapter_tokens)
+    token_usage.record_context(purpose, packed)
+    return packed.text
+
+
+def _retrieve(purpose: str, query: str, chapter_content: str, max_tokens: int) -> str:
+    """The chapter passages most relevant to ``query`` within the ``purpose`` token budget."""
+    packed = get_passage_index(chapter_content or "").retrieve(query, context_budget(purpose, max_tokens=max_tokens))
+    token_usage.record_context(purpose, packed)
+    return packed.text
+
+
+async def _stream_json(
+    messages: list[dict],
+    temperature: float,
+    max_tokens: int,
+    patterns: list[tuple],
+    use_cache: bool,
+    purpose: str,
+    model: str = "gpt-4o-mini"
+) -> AsyncIterator[tuple]:
+    """Stream a JSON completion, yielding ``(path, value)`` for values matching ``patterns``.
+
+    A cached response is replayed at once; otherwise the completion is
+    streamed and each matching value is yielded as soon as it closes.
+    Concurrent identical cacheable requests share one upstream stream. The
+    finished JSON is stored under the same key as ``call_openai`` uses, so
+    streamed and blocking requests share cache entries.
+    """
+    parser = JSONStreamParser(*patterns)
+    key = cache_key(model, messages, temperature, max_tokens, PROMPT_VERSION)
+    if use_cache:
+        deltas = in_flight_streams.subscribe(
+            key, lambda: _stream_json_text(messages, temperature, max_tokens, model, purpose, key)
+        )
+    else:
+        if llm_cache.enabled:
+            llm_cache.stats["bypassed"] += 1
+        deltas = _stream_json_text(messages, temperature, max_tokens, model, purpose)
+
+    async for delta in deltas:
+        for item in parser.feed(delta):
+            yield item
+    if not parser.done:
+        raise ValueError("Streamed response ended before the JSON was complete")
+
+
+async def _stream_json_text(
+    messages: list[dict],
+    temperature: float,
+    max_tokens: int,
+    model: str,
+    purpose: str,
+    key: Optional[str] = None
+) -> AsyncIterator[str]:
+    """Reply text of a JSON completion: from the cache under ``key`` if there, else streamed and cached."""
+    if key and llm_cache.enabled:
+        cached = await asyncio.to_thread(llm_cache.get, key)
+        if cached is not None:
+            yield cached
+            return
+
+    parser = JSONStreamParser()
+    async for chunk in stream_openai(messages, temperature, max_tokens, model, purpose=purpose):
+        if "delta" in chunk:
+            parser.feed(chunk["delta"])
+            yield chunk["delta"]
+    if key and llm_cache.enabled and parser.done:
+        json_text = parser.json_text
+        json.loads(json_text)
+        await asyncio.to_thread(llm_cache.put, key, model, json_text)
 
 
 async def generate_insights(
@@ -49,10 +317,67 @@ async def generate_insights(
     chapter_content: str,
     chapter_summary: str = "",
     book_title: str = "",
-    book_author: str = ""
+    book_author: str = "",
+    use_cache: bool = True,
+    chapter_tokens: Optional[int] = None
 ) -> List[dict]:
-    """Generate pedagogically powerful insights from chapter content."""
-    
+    """Generate pedagogically powerful insights from chapter content.
+
+    ``chapter_tokens`` is the stored token count of ``chapter_content``, if known.
+    """
+    try:
+        response = await call_openai(
+            messages=_insights_messages(
+                chapter_title, chapter_content, chapter_summary, book_title, book_author, chapter_tokens
+            ),
+            temperature=0.6,
+            max_tokens=2500,
+            cache=True,
+            bypass_cache=not use_cache,
+            validate=parse_json_response,
+            purpose="insights",
+        )
+        
+        parsed = parse_json_response(response)
+        insights = parsed.get("insights", [])
+        
+        # Ensure each insight has required fields
+        for insight in insights:
+            insight.setdefault("insight_type", "pattern")
+        
+        return insights
+    except Exception as e:
+        print(f"Failed to generate insights: {e}")
+        # Return fallback insight
+        return [dict(FALLBACK_INSIGHT)]
+
+
+async def stream_insights(
+    chapter_title: str,
+    chapter_content: str,
+    chapter_summary: str = "",
+    book_title: str = "",
+    book_author: str = "",
+    use_cache: bool = True,
+    chapter_tokens: Optional[int] = None
+) -> AsyncIterator[dict]:
+    """Like ``generate_insights``, but yield each insight as soon as it is complete."""
+    messages = _insights_messages(
+        chapter_title, chapter_content, chapter_summary, book_title, book_author, chapter_tokens
+    )
+    async for _, insight in _stream_json(messages, 0.6, 2500, [("insights", "*")], use_cache, "insights"):
+        insight.setdefault("insight_type", "pattern")
+        yield insight
+
+
+def _insights_messages(
+    chapter_title: str,
+    chapter_content: str,
+    chapter_summary: str,
+    book_title: str,
+    book_author: str,
+    chapter_tokens: Optional[int] = None
+) -> list[dict]:
     prompt = f"""You are a master teacher who helps students understand complex books deeply. Your goal is to extract insights that create "aha!" moments - the kind of understanding that stays with someone for years.
 
 ## CHAPTER CONTEXT
@@ -61,7 +386,7 @@ Chapter: "{chapter_title}"
 Summary: {chapter_summary}
 
 ## CHAPTER CONTENT
-{chapter_content[:8000]}
+{_pack("insights", chapter_content, 2500, chapter_tokens)}
 
 ## YOUR TASK
 Extract 3-5 insights from this chapter. Each insight should:
@@ -101,47 +426,22 @@ GOOD: "Cognitive Biases Are Systematic, Not Random Errors"
 
 Respond with JSON only. No markdown code blocks."""
 
-    try:
-        response = await call_openai(
-            messages=[
-                {"role": "system", "content": "You are a master teacher who creates 'aha!' moments by extracting transferable, counter-intuitive insights from complex texts."},
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.6,
-            max_tokens=2500,
-        )
-        
-        # Clean up the response to ensure valid JSON
-        cleaned = response.replace("```json\n", "").replace("\n```", "").replace("```", "").strip()
-        parsed = json.loads(cleaned)
-        insights = parsed.get("insights", [])
-        
-        # Ensure each insight has required fields
-        for insight in insights:
-            insight.setdefault("insight_type", "pattern")
-        
-        return insights
-    except Exception as e:
-        print(f"Failed to generate insights: {e}")
-        # Return fallback insight
-        return [{
-            "title": "Core Concept Identified",
-            "summary": "The chapter presents fundamental principles that form the foundation of this subject.",
-            "evidence": "Key arguments and examples throughout the text support this understanding.",
-            "implication": "These principles can be applied to analyze and understand related phenomena in the real world.",
-            "insight_type": "pattern"
-        }]
+    return [
+        {"role": "system", "content": "You are a master teacher who creates 'aha!' moments by extracting transferable, counter-intuitive insights from complex texts."},
+        {"role": "user", "content": prompt},
+    ]
 
 
 async def generate_first_principles(
     chapter_title: str,
     chapter_content: str,
-    concept: str
+    concept: str,
+    use_cache: bool = True
 ) -> dict:
     """Break down a concept into first principles."""
     prompt = f"""Break down the concept "{concept}" from the chapter "{chapter_title}" into first principles.
 
-Chapter Content: {chapter_content[:6000]}
+Chapter Content: {_pack("first_principles", chapter_content, 2000)}
 
 A first principle is a fundamental truth that cannot be deduced from any other assumption within the system. 
 
@@ -166,10 +466,13 @@ Respond ONLY with valid JSON, no markdown formatting."""
                 {"role": "user", "content": prompt},
             ],
             temperature=0.4,
+            cache=True,
+            bypass_cache=not use_cache,
+            validate=parse_json_response,
+            purpose="first_principles",
         )
         
-        cleaned = response.replace("```json\n", "").replace("\n```", "").replace("```", "").strip()
-        return json.loads(cleaned)
+        return parse_json_response(response)
     except Exception as e:
         print(f"Failed to generate first principles: {e}")
         return {
@@ -191,8 +494,37 @@ async def generate_ai_response(
     conversation_history: List[dict] = None
 ) -> str:
     """Generate AI response to user questions."""
+    messages = _chat_messages(question, chapter_title, chapter_content, conversation_history)
+
+    try:
+        return await call_openai(messages, temperature=0.7, priority=Priority.INTERACTIVE, purpose="chat")
+    except Exception as e:
+        print(f"Failed to generate AI response: {e}")
+        return "I apologize, but I'm having trouble processing your question right now. Please try again."
+
+
+async def stream_ai_response(
+    question: str,
+    chapter_title: str,
+    chapter_content: str,
+    conversation_history: List[dict] = None
+) -> AsyncIterator[dict]:
+    """Stream the answer to a user question (see ``stream_openai`` for the items)."""
+    messages = _chat_messages(question, chapter_title, chapter_content, conversation_history)
+    async for item in stream_openai(messages, temperature=0.7, priority=Priority.INTERACTIVE, purpose="chat"):
+        yield item
+
+
+def _chat_messages(
+    question: str,
+    chapter_title: str,
+    chapter_content: str,
+    conversation_history: Optional[List[dict]]
+) -> list[dict]:
     if conversation_history is None:
         conversation_history = []
+    # The previous question helps follow-ups like "why does that matter?" find their passages
+    previous = next((m["content"] for m in reversed(conversation_history) if m.get("role") == "user"), "")
     
     system_prompt = f"""You are an expert teaching assistant helping a student understand the chapter "{chapter_title}". 
 
@@ -203,27 +535,22 @@ Your approach:
 - Break down complex ideas into first principles when asked
 - Be encouraging and patient
 
-Chapter content for reference: {chapter_content[:5000]}"""
+Chapter content for reference ([…] marks parts left out as not relevant to the question):
+{_retrieve("chat", f"{question} {previous}", chapter_content, 2000)}"""
 
-    messages = [
+    return [
         {"role": "system", "content": system_prompt},
         *conversation_history,
         {"role": "user", "content": question},
     ]
 
-    try:
-        return await call_openai(messages, temperature=0.7)
-    except Exception as e:
-        print(f"Failed to generate AI response: {e}")
-        return "I apologize, but I'm having trouble processing your question right now. Please try again."
-
 
 async def generate_chapter_summary(chapter_title: str, chapter_content: str) -> str:
     """Generate a concise chapter summary."""
     prompt = f"""Provide a concise 2-3 sentence summary of this chapter that captures the main ideas and why they matter.
 
 Chapter Title: {chapter_title}
-Chapter Content: {chapter_content[:6000]}"""
+Chapter Content: {_pack("summary", chapter_content, 300)}"""
 
     try:
         return await call_openai(
@@ -233,6 +560,8 @@ Chapter Content: {chapter_content[:6000]}"""
             ],
             temperature=0.5,
             max_tokens=300,
+            priority=Priority.BACKGROUND,
+            purpose="summary",
         )
     except Exception as e:
         print(f"Failed to generate summary: {e}")
@@ -243,16 +572,50 @@ async def generate_dialectical_analysis(
     chapter_title: str,
     chapter_content: str,
     book_title: str,
-    author: str = "Unknown"
+    author: str = "Unknown",
+    use_cache: bool = True
 ) -> dict:
     """Generate dialectical analysis (thesis-antithesis-synthesis)."""
+    try:
+        response = await call_openai(
+            messages=_dialectic_messages(chapter_title, chapter_content, book_title, author),
+            temperature=0.7,
+            max_tokens=2500,
+            cache=True,
+            bypass_cache=not use_cache,
+            validate=parse_json_response,
+            purpose="dialectic",
+        )
+        
+        return parse_json_response(response)
+    except Exception as e:
+        print(f"Failed to generate dialectical analysis: {e}")
+        from app.data.dialectic_fallbacks import get_fallback_dialectic
+        return get_fallback_dialectic(chapter_title, book_title)
+
+
+async def stream_dialectical_analysis(
+    chapter_title: str,
+    chapter_content: str,
+    book_title: str,
+    author: str = "Unknown",
+    use_cache: bool = True
+) -> AsyncIterator[tuple[str, dict]]:
+    """Like ``generate_dialectical_analysis``, but yield each ``(section, value)``
+    (thesis, antithesis, synthesis, implications) as soon as it is complete."""
+    messages = _dialectic_messages(chapter_title, chapter_content, book_title, author)
+    async for (section,), value in _stream_json(messages, 0.7, 2500, [("*",)], use_cache, "dialectic"):
+        yield section, value
+
+
+def _dialectic_messages(chapter_title: str, chapter_content: str, book_title: str, author: str) -> list[dict]:
     prompt = f"""Analyze the provided chapter content through the lens of thesis-antithesis-synthesis.
 
 Book: "{book_title}" by {author}
 Chapter: "{chapter_title}"
 
 Chapter Content:
-{chapter_content[:8000]}
+{_pack("dialectic", chapter_content, 2500)}
 
 Your task is to:
 1. Identify the core thesis/argument the author is making
@@ -297,30 +660,18 @@ Respond in JSON format with this structure:
   }}
 }}"""
 
-    try:
-        response = await call_openai(
-            messages=[
-                {"role": "system", "content": "You are a dialectical reasoning engine. Analyze arguments through thesis-antithesis-synthesis framework."},
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.7,
-            max_tokens=2500,
-        )
-        
-        # Extract JSON from response
-        cleaned = response.replace("```json\n", "").replace("\n```", "").replace("```", "").strip()
-        return json.loads(cleaned)
-    except Exception as e:
-        print(f"Failed to generate dialectical analysis: {e}")
-        from app.data.dialectic_fallbacks import get_fallback_dialectic
-        return get_fallback_dialectic(chapter_title, book_title)
+    return [
+        {"role": "system", "content": "You are a dialectical reasoning engine. Analyze arguments through thesis-antithesis-synthesis framework."},
+        {"role": "user", "content": prompt},
+    ]
 
 
 async def generate_concept_mapping(
     source_concept: str,
     source_domain: str,
     source_context: str,
-    target_books: list[dict]
+    target_books: list[dict],
+    use_cache: bool = True
 ) -> List[dict]:
     """Generate cross-domain concept mappings using AI."""
     if not target_books:
@@ -353,18 +704,17 @@ Generate 2-3 cross-domain analogies in this JSON format:
             ],
             temperature=0.7,
             max_tokens=1500,
+            cache=True,
+            bypass_cache=not use_cache,
+            validate=parse_json_array,
+            purpose="concept_mapping",
         )
         
-        # Extract JSON array
-        import re
-        json_match = re.search(r'\[[\s\S]*\]', response)
-        if json_match:
-            analogies = json.loads(json_match.group())
-            # Add IDs
-            for i, analogy in enumerate(analogies):
-                analogy["id"] = f"ai-map-{i}"
-            return analogies
-        return []
+        analogies = parse_json_array(response)
+        # Add IDs
+        for i, analogy in enumerate(analogies):
+            analogy["id"] = f"ai-map-{i}"
+        return analogies
     except Exception as e:
         print(f"Failed to generate concept mapping: {e}")
         return []
@@ -0,0 +1,179 @@
+"""Local BM25 passage index over chapter text, for retrieval-augmented chat.
+
+A chapter is split into passages of about ``CHAT_PASSAGE_TOKENS`` tokens at
+sentence boundaries, and each passage's terms are indexed in NumPy arrays
+with their BM25 weights precomputed, so ranking a question is a few array
+additions per query term. Everything runs in-process with no network calls.
+Indexes are cached per chapter text, so follow-up questions about the same
+chapter reuse the index built for the first one.
+"""
+
+import functools
+import re
+from collections import Counter
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+
+from app.core.config import get_settings
+from app.services.context_packing import (
+    DEFAULT_MODEL, SENTENCE_END, PackedContext, count_tokens, pack_context
+)
+
+settings = get_settings()
+
+# BM25 parameters (the usual defaults)
+K1 = 1.2
+B = 0.75
+
+# Words, or single CJK characters (CJK text has no spaces to split on)
+_CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af"
+_TERM = re.compile(f"[{_CJK}]|[^\\W_{_CJK}]+")
+
+STOPWORDS = frozenset("""
+a about after all also an and any are as at be because been but by can could did do does for from had has
+have he her his how i if in into is it its just me more most my no not of on one or our out she so some
+such than that the their them then there these they this those to up us was we were what when where which
+while who why will with would you your s t
+""".split())
+
+# Shown between non-adjacent passages in the prompt
+GAP = "\n\n[…]\n\n"
+
+# Chapters whose index is kept in memory
+INDEX_CACHE_SIZE = 64
+
+
+def _stem(term: str) -> str:
+    """Fold plurals so "markets" matches "market"."""
+    if len(term) > 4 and term.endswith("ies"):
+        return term[:-3] + "y"
+    if len(term) > 3 and term.endswith("s") and not term.endswith(("ss", "us", "is")):
+        return term[:-1]
+    return term
+
+
+def terms(text: str) -> List[str]:
+    """Lower-cased, stemmed index terms of ``text`` without stopwords."""
+    return [_stem(t) for t in _TERM.findall(text.lower()) if t not in STOPWORDS]
+
+
+class Passage(NamedTuple):
+    position: int  # Order in the chapter
+    start: int  # Character offsets into the chapter text
+    end: int
+    tokens: int
+
+
+def chunk_passages(text: str, passage_tokens: int, model: str = DEFAULT_MODEL) -> List[Passage]:
+    """Split ``text`` into passages of up to ``passage_tokens`` tokens, at sentence boundaries.
+
+    A sentence longer than a whole passage is split at word boundaries.
+    """
+    bounds = [0, *(m.end() for m in SENTENCE_END.finditer(text)), len(text)]
+    spans = []
+    start, tokens = None, 0
+    for sentence_start, sentence_end in zip(bounds, bounds[1:]):
+        sentence_tokens = count_tokens(text[sentence_start:sentence_end], model)
+        if start is not None and tokens + sentence_tokens > passage_tokens:
+            spans.append((start, sentence_start, tokens))
+            start, tokens = None, 0
+        if sentence_tokens > passage_tokens:
+            while sentence_tokens > passage_tokens:  # Cut off passage-sized pieces
+                piece = pack_context(text[sentence_start:sentence_end], passage_tokens, model, sentence_tokens)
+                spans.append((sentence_start, sentence_start + len(piece.text), piece.tokens))
+                sentence_start += len(piece.text) or 1
+                sentence_tokens = count_tokens(text[sentence_start:sentence_end], model)
+        if start is None:
+            start = sentence_start
+        tokens += sentence_tokens
+    if start is not None:
+        spans.append((start, len(text), tokens))
+
+    passages = []
+    for start, end, tokens in spans:
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        if start < end:
+            passages.append(Passage(len(passages), start, end, tokens))
+    return passages
+
+
+class PassageIndex:
+    """BM25 over one chapter's passages.
+
+    Postings are stored term by term: ``docs[offsets[t]:offsets[t + 1]]``
+    are the passages containing term ``t`` and ``weights`` the matching
+    slice of their BM25 term weights.
+    """
+
+    def __init__(self, text: str, passage_tokens: int = settings.CHAT_PASSAGE_TOKENS, model: str = DEFAULT_MODEL):
+        self.text = text
+        self.model = model
+        self.passages = chunk_passages(text, passage_tokens, model)
+        self.total_tokens = count_tokens(text, model)
+
+        counts = [Counter(terms(text[p.start:p.end])) for p in self.passages]
+        self.vocabulary = {term: i for i, term in enumerate(sorted(set().union(*counts)))}
+        term_ids = np.fromiter((self.vocabulary[t] for c in counts for t in c), dtype=np.int32)
+        docs = np.repeat(np.arange(len(counts), dtype=np.int32), [len(c) for c in counts])
+        tf = np.fromiter((n for c in counts for n in c.values()), dtype=np.float32)
+
+        order = np.argsort(term_ids, kind="stable")
+        term_ids, self.docs, tf = term_ids[order], docs[order], tf[order]
+        df = np.bincount(term_ids, minlength=len(self.vocabulary))
+        self.offsets = np.concatenate(([0], np.cumsum(df)))
+
+        lengths = np.array([sum(c.values()) for c in counts], dtype=np.float32)
+        norm = K1 * (1 - B + B * lengths / max(float(lengths.mean()) if len(lengths) else 0.0, 1.0))
+        idf = np.log1p((len(counts) - df + 0.5) / (df + 0.5)).astype(np.float32)
+        self.weights = idf[term_ids] * tf * (K1 + 1) / (tf + norm[self.docs])
+
+    def search(self, query: str, k: Optional[int] = None) -> List[tuple]:
+        """``(passage, score)`` for passages matching ``query``, best first."""
+        scores = np.zeros(len(self.passages), dtype=np.float32)
+        for term in set(terms(query)):
+            t = self.vocabulary.get(term)
+            if t is not None:
+                lo, hi = self.offsets[t], self.offsets[t + 1]
+                scores[self.docs[lo:hi]] += self.weights[lo:hi]
+        ranked = np.argsort(-scores, kind="stable")[:int(np.count_nonzero(scores))]
+        return [(self.passages[i], float(scores[i])) for i in ranked[:k]]
+
+    def retrieve(self, query: str, budget: int, top_k: int = settings.CHAT_TOP_K_PASSAGES) -> PackedContext:
+        """The chapter text to send for ``query`` within ``budget`` tokens.
+
+        The whole chapter if it fits, otherwise the best-ranked passages that
+        fit (at most ``top_k``) in chapter order, with ``GAP`` between
+        non-adjacent ones. With no matching passage, the start of the chapter.
+        """
+        if self.total_tokens <= budget:
+            return PackedContext(self.text, self.total_tokens, self.total_tokens, False)
+
+        chosen, used = [], 0
+        for passage, _ in self.search(query):
+            if len(chosen) == top_k:
+                break
+            if used + passage.tokens <= budget:
+                chosen.append(passage)
+                used += passage.tokens
+        if not chosen:
+            return pack_context(self.text, budget, self.model, self.total_tokens)
+
+        chosen.sort()
+        parts = []
+        for passage in chosen:
+            if parts and parts[-1][1] == passage.position - 1:  # Adjacent: extend the excerpt
+                parts[-1] = (parts[-1][0], passage.position)
+            else:
+                parts.append((passage.position, passage.position))
+        text = GAP.join(self.text[self.passages[first].start:self.passages[last].end] for first, last in parts)
+        return PackedContext(text, used, self.total_tokens, True)
+
+
+@functools.lru_cache(maxsize=INDEX_CACHE_SIZE)
+def get_passage_index(text: str) -> PassageIndex:
+    """The (cached) index of a chapter's text."""
+    return PassageIndex(text)
@@ -0,0 +1,320 @@
+"""Write-behind buffer for reading-progress updates.
+
+Progress reports are coalesced in memory per (user, book): only the latest
+state of each pair is kept, and a background task writes everything pending
+in one batched transaction every ``PROGRESS_FLUSH_INTERVAL_SECONDS`` (sooner
+once ``PROGRESS_MAX_PENDING`` pairs are waiting) and again at shutdown. Stored
+progress therefore lags by at most one interval plus the flush itself, while
+reads through this module merge pending state and are never stale.
+
+With ``PROGRESS_DURABILITY=journal`` every update is also appended to a
+journal file before it is acknowledged; the journal is rotated on each flush
+and replayed at startup, so a crash loses nothing that was acknowledged.
+"""
+
+import asyncio
+import json
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import get_settings
+from app.db import crud
+from app.db.database import DATA_DIR, session_for_tenant
+
+settings = get_settings()
+
+Key = Tuple[Optional[str], str, str]  # (tenant, user_id, book_id)
+
+
+def _utcnow() -> datetime:
+    # Naive UTC, matching what CURRENT_TIMESTAMP stores
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class ProgressBuffer:
+    """Coalesces progress updates per (tenant, user, book) and flushes them in batches."""
+
+    def __init__(
+        self,
+        session_factory=session_for_tenant,
+        flush_interval: float = settings.PROGRESS_FLUSH_INTERVAL_SECONDS,
+        max_pending: int = settings.PROGRESS_MAX_PENDING,
+        journal_path: Optional[str] = None,
+        journal_fsync: bool = settings.PROGRESS_JOURNAL_FSYNC,
+    ):
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.journal_path = journal_path
+        self.journal_fsync = journal_fsync
+        self._pending: Dict[Key, dict] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._journal = None
+        self._rotated: List[str] = []  # Journals whose updates are not stored yet
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"updates": 0, "flushes": 0, "rows_written": 0, "flush_errors": 0, "replayed": 0}
+
+    @property
+    def write_through(self) -> bool:
+        return self.flush_interval <= 0
+
+    # ---------- recording ----------
+
+    def record(
+        self,
+        user_id: str,
+        book_id: str,
+        current_chapter: Optional[int] = None,
+        progress_percent: Optional[int] = None,
+        is_completed: Optional[bool] = None,
+        tenant: Optional[str] = None,
+    ) -> dict:
+        """Buffer one progress report; returns the merged pending state."""
+        now = _utcnow()
+        update = {"tenant": tenant, "user_id": user_id, "book_id": book_id, "last_read_at": now}
+        if current_chapter is not None:
+            update["current_chapter"] = current_chapter
+        if progress_percent is not None:
+            update["progress_percent"] = progress_percent
+        if is_completed is not None:
+            update["is_completed"] = 1 if is_completed else 0
+            if is_completed:
+                update["completed_at"] = now
+
+        if self.write_through:
+            with self.session_factory(tenant) as db:
+                crud.apply_progress_updates(db, [update])
+            self.stats["updates"] += 1
+            self.stats["rows_written"] += 1
+            return update
+
+        with self._lock:
+            if self._journal:
+                self._journal.write(json.dumps(update, default=str) + "\n")
+                self._journal.flush()
+                if self.journal_fsync:
+                    os.fsync(self._journal.fileno())
+            merged = self._merge((tenant, user_id, book_id), update)
+            pending = len(self._pending)
+        self.stats["updates"] += 1
+
+        if pending >= self.max_pending and self._wake is not None:
+            self._wake.set()
+        return merged
+
+    def _merge(self, key: Key, update: dict) -> dict:
+        """Fold an update over the pending state for ``key`` (caller holds the lock)."""
+        merged = {**self._pending.get(key, {}), **update}
+        if update.get("is_completed") == 0:
+            merged.pop("completed_at", None)  # Reopened since a buffered completion
+        self._pending[key] = merged
+        return merged
+
+    def pending(self, user_id: str, book_id: Optional[str] = None, tenant: Optional[str] = None) -> List[dict]:
+        """Buffered (not yet stored) state for a user, optionally one book."""
+        with self._lock:
+            return [
+                dict(state) for (tid, uid, bid), state in self._pending.items()
+                if tid == tenant and uid == user_id and (book_id is None or bid == book_id)
+            ]
+
+    # ---------- flushing ----------
+
+    def flush(self) -> int:
+        """Write everything pending, one transaction per tenant; returns rows written."""
+        with self._flush_lock:
+            with self._lock:
+                batch = self._pending
+                self._pending = {}
+                if batch:
+                    self._rotate_journal()
+            if not batch:
+                return 0
+
+            by_tenant: Dict[Optional[str], Dict[Key, dict]] = {}
+            for key, state in batch.items():
+                by_tenant.setdefault(key[0], {})[key] = state
+
+            written = 0
+            failed = False
+            for tenant, states in by_tenant.items():
+                try:
+                    with self.session_factory(tenant) as db:
+                        written += crud.apply_progress_updates(db, list(states.values()))
+                except Exception as e:
+                    # Put the batch back underneath anything recorded since
+                    with self._lock:
+                        for key, state in states.items():
+                            self._pending[key] = {**state, **self._pending.get(key, {})}
+                    failed = True
+                    self.stats["flush_errors"] += 1
+                    print(f"⚠️  Progress flush failed ({len(states)} pending kept): {e}")
+            self.stats["rows_written"] += written
+            if failed:
+                return written
+
+            for path in self._rotated:
+                os.remove(path)
+            self._rotated = []
+            self.stats["flushes"] += 1
+            return written
+
+    def _rotate_journal(self) -> None:
+        """Start a fresh journal; the old one is kept until its batch is stored."""
+        if not self._journal:
+            return
+        self._journal.close()
+        rotated = f"{self.journal_path}.{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+        os.replace(self.journal_path, rotated)
+        self._rotated.append(rotated)
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+
+    def _replay_journals(self) -> None:
+        """Re-buffer updates left in journals by a crash, oldest first."""
+        directory = os.path.dirname(self.journal_path)
+        name = os.path.basename(self.journal_path)
+        leftovers = sorted(
+            os.path.join(directory, f) for f in os.listdir(directory)
+            if f.startswith(f"{name}.")
+        )
+        if os.path.exists(self.journal_path):
+            leftovers.append(self.journal_path)
+
+        replayed = 0
+        for path in leftovers:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        update = json.loads(line)
+                    except ValueError:
+                        continue  # Torn final line from the crash
+                    for field in ("last_read_at", "completed_at"):
+                        if update.get(field):
+                            update[field] = datetime.fromisoformat(update[field])
+                    self._merge((update.get("tenant"), update["user_id"], update["book_id"]), update)
+                    replayed += 1
+        self.stats["replayed"] += replayed
+        if not leftovers:
+            return
+        if replayed:
+            print(f"♻️  Replayed {replayed} journaled progress updates")
+
+        # Carry the replayed state into a fresh journal; the flusher stores it
+        tmp_path = f"{self.journal_path}-replay"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for state in self._pending.values():
+                f.write(json.dumps(state, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.journal_path)
+        for path in leftovers:
+            if path != self.journal_path:
+                os.remove(path)
+
+    # ---------- lifecycle ----------
+
+    async def start(self) -> None:
+        """Replay any journal and start the background flusher."""
+        if self.journal_path:
+            await asyncio.to_thread(self._replay_journals)
+            self._journal = open(self.journal_path, "a", encoding="utf-8")
+        if self.write_through:
+            return
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await asyncio.to_thread(self.flush)
+
+    async def stop(self) -> None:
+        """Stop the flusher and write whatever is still pending."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.to_thread(self.flush)
+        if self._journal:
+            self._journal.close()
+            self._journal = None
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            **self.stats,
+            "pending": pending,
+            "flush_interval_seconds": self.flush_interval,
+            "durability": "journal" if self.journal_path else "memory",
+        }
+
+
+progress_buffer = ProgressBuffer(
+    journal_path=os.path.join(DATA_DIR, "progress.journal")
+    if settings.PROGRESS_DURABILITY == "journal" else None,
+)
+
+
+def get_progress(db, user_id: str, book_id: str, tenant: Optional[str] = None) -> Optional[dict]:
+    """Stored progress for one book with any buffered update applied."""
+    state = progress_to_dict(crud.get_user_book(db, user_id, book_id))
+    pending = progress_buffer.pending(user_id, book_id, tenant)
+    if not state and not pending:
+        return None
+    return overlay(state or _new_progress(user_id, book_id), pending[0] if pending else None)
+
+
+def list_progress(db, user_id: str, tenant: Optional[str] = None) -> List[dict]:
+    """All of a user's books, most recently read first, including buffered updates."""
+    states = {ub.book_id: progress_to_dict(ub) for ub in crud.get_user_books(db, user_id)}
+    for update in progress_buffer.pending(user_id, tenant=tenant):
+        book_id = update["book_id"]
+        states[book_id] = overlay(states.get(book_id) or _new_progress(user_id, book_id), update)
+    return sorted(states.values(), key=lambda s: s["last_read_at"] or datetime.min, reverse=True)
+
+
+def progress_to_dict(user_book) -> Optional[dict]:
+    if not user_book:
+        return None
+    return {
+        "user_id": user_book.user_id,
+        "book_id": user_book.book_id,
+        "current_chapter": user_book.current_chapter,
+        "progress_percent": user_book.progress_percent,
+        "is_completed": bool(user_book.is_completed),
+        "started_at": user_book.started_at,
+        "last_read_at": user_book.last_read_at,
+        "completed_at": user_book.completed_at,
+        "pending": False,
+    }
+
+
+def _new_progress(user_id: str, book_id: str) -> dict:
+    return {
+        "user_id": user_id, "book_id": book_id, "current_chapter": 1, "progress_percent": 0,
+        "is_completed": False, "started_at": None, "last_read_at": None, "completed_at": None,
+    }
+
+
+def overlay(state: dict, update: Optional[dict]) -> dict:
+    """Apply a buffered update (if any) on top of stored progress."""
+    if not update:
+        return state
+    merged = {**state, **{k: v for k, v in update.items() if v is not None}}
+    merged["is_completed"] = bool(merged["is_completed"])
+    if not merged["is_completed"]:
+        merged["completed_at"] = None
+    merged["pending"] = True
+    return merged
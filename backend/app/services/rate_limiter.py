@@ -0,0 +1,172 @@
+"""Client-side rate limiting of OpenAI requests.
+
+Two token buckets, refilled continuously, hold the requests-per-minute and
+tokens-per-minute budgets. A request takes one request plus its estimated
+tokens (counted prompt + ``max_tokens``, which is what providers reserve
+against TPM) and is corrected to the reported usage once it completes.
+
+Waiting requests queue in priority lanes: nothing from a lower lane is let
+through while a higher lane has a request waiting, so background work can
+never delay interactive chat by more than one request's worth of budget.
+Within a lane requests are served first come, first served.
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from enum import IntEnum
+from typing import Optional
+
+from app.core.config import get_settings
+from app.services.context_packing import DEFAULT_MODEL, count_tokens
+
+settings = get_settings()
+
+
+class Priority(IntEnum):
+    """Lanes, highest priority first."""
+    INTERACTIVE = 0  # Chat: a user is waiting on every token
+    ANALYSIS = 1  # On-demand insights, dialectic, first principles, mappings
+    BACKGROUND = 2  # Summaries and other precomputation
+
+
+def estimate_tokens(messages: list[dict], max_tokens: int, model: str = DEFAULT_MODEL) -> int:
+    """Token cost of a request: counted prompt tokens plus per-message overhead, plus ``max_tokens``."""
+    prompt = sum(count_tokens(m.get("content"), model) + 4 for m in messages) + 3
+    return prompt + max_tokens
+
+
+class _Waiter:
+    __slots__ = ("tokens", "future", "enqueued_at")
+
+    def __init__(self, tokens: int, future: asyncio.Future):
+        self.tokens = tokens
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+
+class _Bucket:
+    __slots__ = ("capacity", "rate", "level", "updated_at")
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.level = per_minute
+        self.updated_at = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_for(self, amount: float) -> float:
+        """Seconds until ``amount`` is available (0 if it already is)."""
+        return max(amount - self.level, 0) / self.rate
+
+
+class RateLimiter:
+    """RPM + TPM token buckets with strict-priority queueing."""
+
+    def __init__(self, rpm: int = settings.OPENAI_RPM_LIMIT, tpm: int = settings.OPENAI_TPM_LIMIT):
+        self.enabled = rpm > 0 or tpm > 0
+        self.requests = _Bucket(rpm) if rpm > 0 else None
+        self.tokens = _Bucket(tpm) if tpm > 0 else None
+        self._queue: list[tuple[int, int, _Waiter]] = []
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._waits = {lane: deque(maxlen=500) for lane in Priority}
+        self.stats = {lane.name.lower(): {"requests": 0, "queued": 0, "wait_ms_total": 0.0, "wait_ms_max": 0.0}
+                      for lane in Priority}
+
+    async def acquire(self, tokens: int, priority: Priority = Priority.ANALYSIS) -> float:
+        """Wait for budget for one request of ``tokens``; return the seconds spent queued."""
+        if not self.enabled:
+            return 0.0
+        if self.tokens:
+            tokens = min(tokens, int(self.tokens.capacity))  # An oversized request would never fit
+        waiter = _Waiter(tokens, asyncio.get_running_loop().create_future())
+        heapq.heappush(self._queue, (priority, next(self._seq), waiter))
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                self.settle(tokens, 0, requests=1)  # Granted just as we were cancelled: give it back
+            self._dispatch()
+            raise
+        waited = time.monotonic() - waiter.enqueued_at
+        self._record(priority, waited)
+        return waited
+
+    def settle(self, estimated: int, actual: Optional[int], requests: int = 0) -> None:
+        """Correct the TPM bucket once the real usage of a request is known."""
+        now = time.monotonic()
+        if self.requests and requests:
+            self.requests.refill(now)
+            self.requests.level = min(self.requests.capacity, self.requests.level + requests)
+        if self.tokens and actual is not None:
+            self.tokens.refill(now)
+            self.tokens.level = min(self.tokens.capacity, self.tokens.level + estimated - actual)
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Grant queued requests in priority order while the budget allows."""
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        now = time.monotonic()
+        for bucket in (self.requests, self.tokens):
+            if bucket:
+                bucket.refill(now)
+
+        while self._queue:
+            _, _, waiter = self._queue[0]
+            if waiter.future.done():  # Cancelled while queued
+                heapq.heappop(self._queue)
+                continue
+            delay = max(self.requests.wait_for(1) if self.requests else 0,
+                        self.tokens.wait_for(waiter.tokens) if self.tokens else 0)
+            if delay > 0:
+                # The head of the highest lane waits; everything behind it waits too
+                self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+            heapq.heappop(self._queue)
+            if self.requests:
+                self.requests.level -= 1
+            if self.tokens:
+                self.tokens.level -= waiter.tokens
+            waiter.future.set_result(None)
+
+    def _record(self, priority: Priority, waited: float) -> None:
+        lane = self.stats[priority.name.lower()]
+        lane["requests"] += 1
+        ms = waited * 1000
+        if ms >= 1:
+            lane["queued"] += 1
+        lane["wait_ms_total"] += ms
+        lane["wait_ms_max"] = max(lane["wait_ms_max"], ms)
+        self._waits[priority].append(ms)
+
+    def get_stats(self) -> dict:
+        now = time.monotonic()
+        lanes = {}
+        for lane in Priority:
+            stats = dict(self.stats[lane.name.lower()])
+            recent = sorted(self._waits[lane])
+            stats["wait_ms_mean"] = round(stats.pop("wait_ms_total") / stats["requests"], 1) if stats["requests"] else None
+            stats["wait_ms_p95"] = round(recent[min(len(recent) - 1, int(len(recent) * 0.95))], 1) if recent else None
+            stats["wait_ms_max"] = round(stats["wait_ms_max"], 1)
+            stats["waiting"] = sum(1 for p, _, w in self._queue if p == lane and not w.future.done())
+            lanes[lane.name.lower()] = stats
+        for bucket in (self.requests, self.tokens):
+            if bucket:
+                bucket.refill(now)
+        return {
+            "enabled": self.enabled,
+            "rpm_limit": int(self.requests.capacity) if self.requests else None,
+            "tpm_limit": int(self.tokens.capacity) if self.tokens else None,
+            "requests_available": int(self.requests.level) if self.requests else None,
+            "tokens_available": int(self.tokens.level) if self.tokens else None,
+            "lanes": lanes,
+        }
@@ -0,0 +1,234 @@
+"""Retries and circuit breaking for upstream (OpenAI) calls.
+
+``call_with_retries`` retries connection errors, timeouts, 408, 429 and 5xx
+responses with full-jitter exponential backoff, waiting for ``Retry-After``
+instead when the server sends one. Each attempt's timeout is cut to what is
+left of the retry deadline, so a hanging provider cannot hold a caller for
+more than the deadline. ``CircuitBreaker`` counts consecutive failed
+attempts (429s excluded: a rate-limiting provider is healthy); once open it
+rejects calls immediately with ``CircuitOpenError`` (so callers drop straight
+to their fallbacks) until a single trial call after the reset timeout
+succeeds.
+"""
+
+import asyncio
+import email.utils
+import random
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+
+import httpx
+
+from app.core.config import get_settings
+
+settings = get_settings()
+
+T = TypeVar("T")
+
+RETRY_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+
+
+class UpstreamError(Exception):
+    """A failed upstream request; ``status_code`` is None for connection errors and timeouts."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self) -> bool:
+        return self.status_code is None or self.status_code in RETRY_STATUSES
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling upstream while the breaker is open."""
+
+
+class DeadlineExceeded(UpstreamError):
+    """The retry deadline passed before an attempt could be sent."""
+
+
+def attempt_timeout(until: float) -> httpx.Timeout:
+    """httpx timeout for an attempt: the client's timeouts, cut to the time left before ``until``.
+
+    Raises ``DeadlineExceeded`` when none is left (e.g. after a long rate-limit wait).
+    """
+    remaining = until - time.monotonic()
+    if remaining <= 0:
+        raise DeadlineExceeded("OpenAI retry deadline passed before the request was sent")
+    return httpx.Timeout(min(settings.OPENAI_TIMEOUT_SECONDS, remaining),
+                         connect=min(settings.HTTP_CONNECT_TIMEOUT_SECONDS, remaining))
+
+
+def parse_retry_after(headers: httpx.Headers) -> Optional[float]:
+    """Seconds to wait from ``retry-after-ms`` / ``Retry-After`` (delta seconds or HTTP date)."""
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return max(float(value) / 1000, 0.0)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(email.utils.parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def error_from_response(response: httpx.Response) -> UpstreamError:
+    """Build an ``UpstreamError`` from a non-2xx response (its body must already be read)."""
+    try:
+        message = response.json().get("error", {}).get("message")
+    except (ValueError, AttributeError):
+        message = None
+    message = message or response.text[:200] or response.reason_phrase
+    return UpstreamError(
+        f"OpenAI API error {response.status_code}: {message}",
+        status_code=response.status_code,
+        retry_after=parse_retry_after(response.headers),
+    )
+
+
+class CircuitBreaker:
+    """Closed -> open after N consecutive failures -> half-open trial -> closed."""
+
+    def __init__(
+        self,
+        failure_threshold: int = settings.CIRCUIT_FAILURE_THRESHOLD,
+        reset_seconds: float = settings.CIRCUIT_RESET_SECONDS,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial = False
+        self.stats = {"opened": 0, "short_circuited": 0, "retries": 0, "failures": 0}
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def before_call(self) -> None:
+        """Raise ``CircuitOpenError`` unless a call may go upstream now."""
+        state = self.state
+        if state == "closed":
+            return
+        if state == "half_open" and not self._trial:
+            self._trial = True  # Let exactly one request probe the provider
+            return
+        self.stats["short_circuited"] += 1
+        raise CircuitOpenError(f"OpenAI circuit open; retrying upstream in {self.retry_in():.0f}s")
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self.stats["failures"] += 1
+        if self._trial or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                print(f"⚡ OpenAI circuit opened after {self.failures} consecutive failures")
+            self.stats["opened"] += 1
+            self.opened_at = time.monotonic()
+        self._trial = False
+
+    def release(self) -> None:
+        """Give up a half-open trial without a verdict (the caller was cancelled)."""
+        self._trial = False
+
+    def retry_in(self) -> float:
+        if self.opened_at is None:
+            return 0.0
+        return max(self.reset_seconds - (time.monotonic() - self.opened_at), 0.0)
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "state": self.state, "consecutive_failures": self.failures,
+                "retry_in_seconds": round(self.retry_in(), 1),
+                "failure_threshold": self.failure_threshold, "reset_seconds": self.reset_seconds}
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Full-jitter exponential backoff before retry number ``attempt`` (1-based)."""
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+async def call_with_retries(
+    attempt: Callable[[float], Awaitable[T]],
+    breaker: CircuitBreaker,
+    max_retries: int = settings.OPENAI_MAX_RETRIES,
+    base_delay: float = settings.OPENAI_RETRY_BASE_DELAY_SECONDS,
+    max_delay: float = settings.OPENAI_RETRY_MAX_DELAY_SECONDS,
+    deadline: float = settings.OPENAI_RETRY_DEADLINE_SECONDS,
+) -> T:
+    """Run ``attempt(until)`` through the breaker, retrying transient failures.
+
+    ``until`` is the monotonic time of the deadline; ``attempt`` passes
+    ``attempt_timeout(until)`` to its request so no attempt outlives it.
+    ``attempt`` raises ``UpstreamError`` for failed responses; httpx
+    transport errors are treated as retryable failures. 429s are retried
+    but do not count toward opening the breaker. A retry is skipped
+    (and the last error raised) when the wait would pass ``deadline``
+    seconds from the first attempt, when the server asks to wait longer
+    than ``max_delay``, or when the breaker has opened meanwhile. Any other
+    exception from ``attempt`` counts as a failure and is raised as is.
+    """
+    started = time.monotonic()
+    until = started + deadline
+    retries = 0
+    while True:
+        if retries:
+            try:
+                breaker.before_call()
+            except CircuitOpenError:
+                raise error from None
+        else:
+            breaker.before_call()
+        try:
+            result = await attempt(until)
+        except (asyncio.CancelledError, DeadlineExceeded):
+            breaker.release()
+            raise
+        except httpx.TransportError as e:
+            error = UpstreamError(f"OpenAI request failed: {e!r}")
+        except UpstreamError as e:
+            if not e.retryable:
+                breaker.record_success()  # The provider answered; the request itself was bad
+                raise
+            error = e
+        except BaseException:
+            breaker.record_failure()  # Unexpected: never leave a half-open trial claimed
+            raise
+        else:
+            breaker.record_success()
+            return result
+
+        if error.status_code == 429:
+            breaker.release()  # Rate limited, not down: Retry-After and the rate limiter handle it
+        else:
+            breaker.record_failure()
+        if retries >= max_retries:
+            raise error
+        retries += 1
+        if error.retry_after is not None:
+            if error.retry_after > max_delay:
+                raise error
+            delay = error.retry_after
+        else:
+            delay = backoff_delay(retries, base_delay, max_delay)
+        if time.monotonic() - started + delay > deadline:
+            raise error
+        breaker.stats["retries"] += 1
+        await asyncio.sleep(delay)
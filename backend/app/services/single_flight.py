@@ -0,0 +1,137 @@
+"""Coalesce identical concurrent async calls into one in-flight task.
+
+The first caller for a key starts the work; callers arriving while it runs
+await the same task instead of starting their own. Each waiter awaits it
+through ``asyncio.shield``, so a cancelled waiter (e.g. a client that hung
+up) only stops waiting. The shared task itself is cancelled once every
+waiter has gone, and a later caller starts fresh.
+
+``SharedStream`` does the same for streams: one task reads the upstream
+stream, and every subscriber replays the chunks that have arrived so far,
+then follows along as new ones come in.
+"""
+
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """One in-flight call per key."""
+
+    def __init__(self):
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.stats = {"calls": 0, "coalesced": 0, "abandoned": 0}
+
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable[T]]) -> T:
+        """Await ``factory()``, sharing the call with concurrent callers of ``key``."""
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(factory()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _, key=key, flight=flight: self._forget(key, flight))
+            self.stats["calls"] += 1
+        else:
+            self.stats["coalesced"] += 1
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # Every waiter was cancelled: stop the upstream call
+                self._forget(key, flight)
+                flight.task.cancel()
+                self.stats["abandoned"] += 1
+
+    def _forget(self, key: Hashable, flight: _Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "in_flight": len(self._flights)}
+
+
+class _StreamFlight:
+    __slots__ = ("task", "chunks", "done", "error", "changed", "subscribers")
+
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self.chunks: List = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.changed = asyncio.Event()
+        self.subscribers = 0
+
+    def notify(self) -> None:
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+
+class SharedStream:
+    """One in-flight stream per key, fanned out to every subscriber."""
+
+    def __init__(self):
+        self._flights: Dict[Hashable, _StreamFlight] = {}
+        self.stats = {"streams": 0, "coalesced": 0, "abandoned": 0}
+
+    async def subscribe(self, key: Hashable, factory: Callable[[], AsyncIterator[T]]) -> AsyncIterator[T]:
+        """Iterate ``factory()``, sharing one iteration with concurrent subscribers of ``key``."""
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _StreamFlight()
+            self._flights[key] = flight
+            flight.task = asyncio.ensure_future(self._pump(key, flight, factory()))
+            self.stats["streams"] += 1
+        else:
+            self.stats["coalesced"] += 1
+
+        flight.subscribers += 1
+        try:
+            position = 0
+            while True:
+                while position < len(flight.chunks):
+                    yield flight.chunks[position]
+                    position += 1
+                if flight.done:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                await flight.changed.wait()
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                # Every subscriber went away: stop the upstream stream
+                self._forget(key, flight)
+                flight.task.cancel()
+                self.stats["abandoned"] += 1
+
+    async def _pump(self, key: Hashable, flight: _StreamFlight, stream: AsyncIterator[T]) -> None:
+        try:
+            async for chunk in stream:
+                flight.chunks.append(chunk)
+                flight.notify()
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.done = True
+            self._forget(key, flight)
+            flight.notify()
+            await stream.aclose()
+
+    def _forget(self, key: Hashable, flight: _StreamFlight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "in_flight": len(self._flights)}
@@ -0,0 +1 @@
+# Benchmarks for storage and AI-service performance work
@@ -0,0 +1,184 @@
+"""Compare SQLite and PostgreSQL for ingestion and concurrent traffic.
+
+For each backend this reports:
+- chapter + insight ingestion, row at a time vs. bulk (COPY on PostgreSQL)
+- mixed read/write throughput from concurrent worker threads
+and checks that bulk-loaded rows read back intact.
+
+PostgreSQL needs a driver (``pip install "psycopg[binary]"``) and a scratch
+database: the benchmark creates the schema there and drops it afterwards.
+
+Usage (from backend/):
+    python -m benchmarks.bench_backends [--postgres postgresql+psycopg://localhost/bookmind_bench]
+        [--books 20] [--workers 8] [--seconds 10]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+from sqlalchemy.orm import sessionmaker
+
+from app.data import get_all_sample_books
+from app.db import crud
+from app.db.database import Base, create_db_engine, init_db
+from app.services.file_service import analyze_book_content
+
+INSIGHTS_PER_CHAPTER = 5
+
+
+def build_books(num_books: int, seed: int = 11) -> list[list[dict]]:
+    """Synthetic books as chapter lists, built from the sample book paragraphs."""
+    rng = random.Random(seed)
+    paragraphs = []
+    for book in get_all_sample_books():
+        paragraphs.extend(p for p in book["content"].split("\n\n") if p.strip())
+
+    books = []
+    for _ in range(num_books):
+        text = "\n\n".join(
+            f"Chapter {n}: Part {n}\n\n" + "\n\n".join(rng.choice(paragraphs) for _ in range(20))
+            for n in range(1, 21)
+        )
+        books.append([
+            {"number": c["number"], "title": c["title"], "content": c["content"], "key_points": []}
+            for c in analyze_book_content(text)["chapters"]
+        ])
+    return books
+
+
+def insights_for(chapter: dict) -> list[dict]:
+    return [
+        {"title": f"{chapter['title']} insight {i}", "summary": "s" * 200,
+         "evidence": "e" * 400, "implication": "i" * 200}
+        for i in range(INSIGHTS_PER_CHAPTER)
+    ]
+
+
+def ingest(Session, books: list[list[dict]], bulk: bool) -> tuple[int, float, list[str]]:
+    """Load books with their insights; returns (rows, seconds, chapter ids)."""
+    rows = 0
+    chapter_ids = []
+    start = time.perf_counter()
+    with Session() as db:
+        for i, chapters in enumerate(books):
+            book = crud.get_or_create_book(db, title=f"Bench {'bulk' if bulk else 'rows'} {i}")
+            if bulk:
+                created = crud.create_chapters(db, book.id, chapters)
+            else:
+                created = [
+                    crud.get_or_create_chapter(db, book.id, c["number"], c["title"], content=c["content"])
+                    for c in chapters
+                ]
+            for chapter, data in zip(created, chapters):
+                if bulk:
+                    crud.create_insights_batch(db, book.id, chapter.id, insights_for(data))
+                else:
+                    for insight in insights_for(data):
+                        crud.create_insight(db, book.id, chapter.id, **insight)
+                chapter_ids.append(chapter.id)
+            rows += len(chapters) * (1 + INSIGHTS_PER_CHAPTER)
+    return rows, time.perf_counter() - start, chapter_ids
+
+
+def verify(Session, books: list[list[dict]], chapter_ids: list[str]) -> None:
+    """Bulk-loaded rows must read back exactly as written."""
+    expected = [c for chapters in books for c in chapters]
+    with Session() as db:
+        for chapter_id, data in zip(chapter_ids, expected):
+            chapter = crud.get_chapter(db, chapter_id)
+            assert chapter.title == data["title"], chapter_id
+            assert crud.get_chapter_content(db, chapter) == data["content"], chapter_id
+            insights = crud.get_insights_by_chapter(db, chapter_id)
+            assert len(insights) == INSIGHTS_PER_CHAPTER, chapter_id
+            assert insights[0].evidence == "e" * 400, chapter_id
+
+
+def mixed_load(Session, chapter_ids: list[str], workers: int, seconds: float) -> tuple[int, int, int]:
+    """Workers read chapter/insight pages and replace insights (1 write per 10 ops)."""
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def worker(seed: int) -> None:
+        rng = random.Random(seed)
+        local = {"reads": 0, "writes": 0, "errors": 0}
+        with Session() as db:
+            while time.perf_counter() < deadline:
+                chapter = crud.get_chapter(db, rng.choice(chapter_ids))
+                try:
+                    if rng.random() < 0.1:
+                        crud.replace_chapter_insights(db, chapter.book_id, chapter.id, insights_for({"title": "w"}))
+                        local["writes"] += 1
+                    else:
+                        crud.get_chapters_page(db, chapter.book_id, limit=20)
+                        crud.get_insights_page(db, chapter.book_id, limit=20)
+                        local["reads"] += 1
+                except Exception:
+                    db.rollback()
+                    local["errors"] += 1
+                db.expire_all()
+        with lock:
+            for key, value in local.items():
+                counts[key] += value
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(workers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return counts["reads"], counts["writes"], counts["errors"]
+
+
+def bench_backend(name: str, url: str, books: list[list[dict]], workers: int, seconds: float) -> None:
+    engine = create_db_engine(url)
+    init_db(engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    try:
+        row_count, row_s, _ = ingest(Session, books, bulk=False)
+        bulk_count, bulk_s, chapter_ids = ingest(Session, books, bulk=True)
+        verify(Session, books, chapter_ids)
+        reads, writes, errors = mixed_load(Session, chapter_ids, workers, seconds)
+        print(f"{name:<12}{row_count / row_s:>14,.0f}{bulk_count / bulk_s:>14,.0f}"
+              f"{reads / seconds:>12,.0f}{writes / seconds:>12,.0f}{errors:>8}")
+    finally:
+        if not url.startswith("sqlite"):
+            Base.metadata.drop_all(engine)
+        engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare SQLite and PostgreSQL throughput.")
+    parser.add_argument("--postgres", default=os.environ.get("BENCH_POSTGRES_URL"),
+                        help="Scratch PostgreSQL database URL (schema is dropped afterwards)")
+    parser.add_argument("--books", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    books = build_books(args.books)
+    chapters = sum(len(b) for b in books)
+    print(f"📚 {len(books)} books, {chapters} chapters, {chapters * INSIGHTS_PER_CHAPTER} insights per load; "
+          f"{args.workers} workers for {args.seconds:g}s")
+    print(f"\n{'backend':<12}{'rows/s 1x1':>14}{'rows/s bulk':>14}{'reads/s':>12}{'writes/s':>12}{'errors':>8}")
+
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    try:
+        bench_backend("sqlite", f"sqlite:///{path}", books, args.workers, args.seconds)
+    finally:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+    if args.postgres:
+        bench_backend("postgresql", args.postgres, books, args.workers, args.seconds)
+    else:
+        print("(no --postgres URL, skipping PostgreSQL)")
+
+
+if __name__ == "__main__":
+    main()
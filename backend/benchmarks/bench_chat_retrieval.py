@@ -0,0 +1,82 @@
+"""Benchmark the chapter context sent with chat questions: leading text vs retrieved passages.
+
+Builds one long chapter from the sample books and asks ``--questions``
+questions, each made from the rarest words of a randomly chosen sentence.
+For each way of choosing the context it reports how often that sentence
+made it into the prompt and how many context tokens were sent. It also
+reports the time to build a chapter's passage index and to rank a question.
+
+Usage (from backend/):
+    python -m benchmarks.bench_chat_retrieval [--questions 200]
+"""
+
+import argparse
+import random
+import statistics
+import time
+from collections import Counter
+
+from app.core.config import get_settings
+from app.data import get_all_sample_books
+from app.services.context_packing import DEFAULT_MODEL, SENTENCE_END, context_budget, count_tokens, get_encoding, pack_context
+from app.services.passage_index import PassageIndex, terms
+
+settings = get_settings()
+
+
+def build_chapter() -> str:
+    return "\n\n".join(book["content"] for book in get_all_sample_books())
+
+
+def make_questions(chapter: str, count: int, seed: int = 7) -> list[tuple[str, str]]:
+    """``(question, sentence)`` pairs; the question uses the sentence's four rarest terms."""
+    rng = random.Random(seed)
+    frequency = Counter(terms(chapter))
+    sentences = [s.strip() for s in SENTENCE_END.split(chapter) if len(terms(s)) >= 8]
+    questions = []
+    for sentence in rng.choices(sentences, k=count):
+        rare = sorted(set(terms(sentence)), key=lambda t: (frequency[t], t))[:4]
+        questions.append((f"What does the chapter say about {' '.join(rare)}?", sentence))
+    return questions
+
+
+def run(args) -> None:
+    chapter = build_chapter()
+    budget = context_budget("chat", max_tokens=2000)
+    questions = make_questions(chapter, args.questions)
+    get_encoding(DEFAULT_MODEL)  # Load (or fail to fetch) the vocabulary outside the timings
+
+    start = time.perf_counter()
+    index = PassageIndex(chapter)
+    build_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    for question, _ in questions:
+        index.search(question)
+    search_us = (time.perf_counter() - start) / len(questions) * 1e6
+
+    print(f"📚 Chapter: {len(chapter):,} chars, {index.total_tokens:,} tokens, {len(index.passages)} passages; "
+          f"chat budget {budget} tokens; {len(questions)} questions")
+    print(f"⏱️  Index build {build_ms:.1f} ms, ranking {search_us:.0f} us per question")
+
+    leading = pack_context(chapter, budget).text
+    strategies = {
+        "first 5000 chars": lambda q: chapter[:5000],
+        "leading tokens": lambda q: leading,
+        "BM25 passages": lambda q: index.retrieve(q, budget).text,
+    }
+    print(f"\n{'context':<20}{'answer sent':>13}{'tokens mean':>13}")
+    for name, choose in strategies.items():
+        contexts = [(choose(question), sentence) for question, sentence in questions]
+        hits = sum(sentence in context for context, sentence in contexts)
+        tokens = statistics.mean(count_tokens(context) for context, _ in contexts)
+        print(f"{name:<20}{hits / len(contexts):>12.0%}{tokens:>13.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chat context selection.")
+    parser.add_argument("--questions", type=int, default=200)
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
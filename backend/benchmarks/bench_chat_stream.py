@@ -0,0 +1,93 @@
+"""Benchmark time-to-first-token of /analysis/chat vs /analysis/chat/stream.
+
+Runs the app and a streaming OpenAI stub locally. The stub emits
+``--tokens`` tokens, ``--token-delay-ms`` apart, after ``--latency-ms`` of
+"prompt processing". For the blocking endpoint the first token arrives with
+the whole answer; for the SSE endpoint it arrives with the first ``token``
+event.
+
+Usage (from backend/):
+    python -m benchmarks.bench_chat_stream [--requests 20] [--tokens 200] [--token-delay-ms 20] [--latency-ms 300]
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+from app.core.config import get_settings
+from benchmarks.openai_stub import StubOpenAI, serve
+
+settings = get_settings()
+
+PAYLOAD = {
+    "question": "What is the central argument of this chapter?",
+    "chapter_title": "Chapter 1",
+    "chapter_content": "It was the best of times, it was the worst of times. " * 50,
+    "conversation_history": [],
+}
+
+
+async def blocking_chat(client: httpx.AsyncClient, url: str) -> tuple[float, float]:
+    start = time.perf_counter()
+    response = await client.post(f"{url}/analysis/chat", json=PAYLOAD)
+    response.raise_for_status()
+    elapsed = time.perf_counter() - start
+    return elapsed, elapsed
+
+
+async def streamed_chat(client: httpx.AsyncClient, url: str) -> tuple[float, float]:
+    start = time.perf_counter()
+    first = None
+    async with client.stream("POST", f"{url}/analysis/chat/stream", json=PAYLOAD) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if first is None and line == "event: token":
+                first = time.perf_counter() - start
+            elif line == "event: error":
+                raise RuntimeError("stream reported an error")
+    return first, time.perf_counter() - start
+
+
+def report(name: str, results: list[tuple[float, float]]) -> None:
+    ttft = sorted(r[0] * 1000 for r in results)
+    total = sorted(r[1] * 1000 for r in results)
+    print(f"{name:<18}{statistics.mean(ttft):>12.1f}{ttft[len(ttft) // 2]:>12.1f}"
+          f"{statistics.mean(total):>12.1f}{total[len(total) // 2]:>12.1f}")
+
+
+async def main_async(args) -> None:
+    stub_server, stub_url = serve(StubOpenAI(args.latency_ms, args.tokens, args.token_delay_ms))
+    settings.OPENAI_BASE_URL = f"{stub_url}/v1"
+    settings.OPENAI_API_KEY = settings.OPENAI_API_KEY or "bench"
+
+    from app.main import app
+    app_server, app_url = serve(app)
+
+    print(f"🔌 Stub: {args.tokens} tokens, {args.token_delay_ms:g} ms apart, +{args.latency_ms:g} ms latency; "
+          f"{args.requests} requests per endpoint")
+    print(f"\n{'endpoint':<18}{'ttft mean':>12}{'ttft p50':>12}{'total mean':>12}{'total p50':>12}")
+    try:
+        async with httpx.AsyncClient(timeout=None) as client:
+            for name, call in (("/chat", blocking_chat), ("/chat/stream", streamed_chat)):
+                await call(client, app_url)  # Warm up
+                results = [await call(client, app_url) for _ in range(args.requests)]
+                report(name, results)
+    finally:
+        app_server.should_exit = True
+        stub_server.should_exit = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark time-to-first-token of blocking vs streamed chat.")
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--tokens", type=int, default=200)
+    parser.add_argument("--token-delay-ms", type=float, default=20)
+    parser.add_argument("--latency-ms", type=float, default=300, help="Delay before the first token")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Benchmark compressed storage for book and chapter text.
+
+Reports, for each available codec:
+- stored size vs. raw UTF-8 size
+- compression throughput
+- read-path decompression cost per chapter
+- SQLite file size and ORM read time for a synthetic library
+
+Usage (from backend/):
+    python -m benchmarks.bench_compression [--books 50]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import get_settings
+from app.data import get_all_sample_books
+from app.db import crud
+from app.db.compression import (
+    CODEC_RAW, CODEC_ZLIB, CODEC_ZSTD,
+    compress_text, decompress_text, zstd_available,
+)
+from app.db.database import Base
+from app.services.file_service import analyze_book_content
+
+settings = get_settings()
+
+
+def build_corpus(num_books: int, seed: int = 7) -> list[str]:
+    """Synthesize book texts by shuffling paragraphs from the sample books."""
+    rng = random.Random(seed)
+    paragraphs = []
+    for book in get_all_sample_books():
+        paragraphs.extend(p for p in book["content"].split("\n\n") if p.strip())
+
+    books = []
+    for _ in range(num_books):
+        chapters = []
+        for number in range(1, 11):
+            body = "\n\n".join(rng.choice(paragraphs) for _ in range(40))
+            chapters.append(f"Chapter {number}: Part {number}\n\n{body}")
+        books.append("\n\n".join(chapters))
+    return books
+
+
+def bench_codecs(texts: list[str], codecs: dict[str, int]) -> None:
+    raw_bytes = sum(len(t.encode("utf-8")) for t in texts)
+    print(f"\n{'codec':<8}{'stored':>14}{'ratio':>9}{'compress MB/s':>16}{'decompress us/row':>20}")
+    for name, codec in codecs.items():
+        start = time.perf_counter()
+        packed = [compress_text(t, codec) for t in texts]
+        compress_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for p in packed:
+            decompress_text(p)
+        decompress_s = time.perf_counter() - start
+
+        stored = sum(len(p) for p in packed)
+        print(f"{name:<8}{stored:>14,}{raw_bytes / stored:>8.2f}x"
+              f"{raw_bytes / compress_s / 1e6:>16.1f}{decompress_s / len(texts) * 1e6:>20.1f}")
+
+
+def bench_database(books: list[str], compression: str) -> tuple[int, float]:
+    """Load the library into a fresh SQLite file; return (file size, read seconds)."""
+    settings.CONTENT_COMPRESSION_ENABLED = compression != "none"
+    settings.CONTENT_COMPRESSION = compression if compression != "none" else settings.CONTENT_COMPRESSION
+
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+
+    book_ids = []
+    with Session() as db:
+        for i, text in enumerate(books):
+            book = crud.get_or_create_book(db, title=f"Bench Book {i}", content=text)
+            for chapter in analyze_book_content(text)["chapters"]:
+                crud.get_or_create_chapter(db, book.id, chapter["number"], chapter["title"], content=chapter["content"])
+            book_ids.append(book.id)
+
+    start = time.perf_counter()
+    with Session() as db:
+        for book_id in book_ids:
+            for chapter in crud.get_chapters_by_book(db, book_id, with_content=True):
+                len(chapter.content)
+    read_s = time.perf_counter() - start
+
+    engine.dispose()
+    size = os.path.getsize(path)
+    os.remove(path)
+    return size, read_s
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark compressed content storage.")
+    parser.add_argument("--books", type=int, default=50)
+    args = parser.parse_args()
+
+    books = build_corpus(args.books)
+    chapters = [c["content"] for text in books for c in analyze_book_content(text)["chapters"]]
+    print(f"📚 {len(books)} books, {len(chapters)} chapters, "
+          f"{sum(len(t.encode('utf-8')) for t in books):,} bytes of book text")
+
+    codecs = {"none": CODEC_RAW, "zlib": CODEC_ZLIB}
+    if zstd_available():
+        codecs["zstd"] = CODEC_ZSTD
+    else:
+        print("(zstandard not installed, skipping zstd)")
+    bench_codecs(chapters, codecs)
+
+    print(f"\n{'storage':<8}{'db file bytes':>16}{'read all chapters':>20}")
+    original = (settings.CONTENT_COMPRESSION_ENABLED, settings.CONTENT_COMPRESSION)
+    try:
+        for name in codecs:
+            size, read_s = bench_database(books, name)
+            print(f"{name:<8}{size:>16,}{read_s * 1000:>17.1f} ms")
+    finally:
+        settings.CONTENT_COMPRESSION_ENABLED, settings.CONTENT_COMPRESSION = original
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Benchmark per-call overhead of OpenAI requests against a local stub.
+
+Compares the old behaviour (a new ``httpx.AsyncClient`` per call) with the
+shared pooled client, sequentially and with concurrent callers, reporting
+latency percentiles, throughput and how many TCP connections the stub saw.
+The stub speaks plain HTTP, so the per-call TLS handshake a fresh client
+pays against api.openai.com comes on top of the difference shown here.
+
+Usage (from backend/):
+    python -m benchmarks.bench_http_client [--calls 500] [--concurrency 20] [--latency-ms 0]
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+from app.core.config import get_settings
+from app.services.http_client import build_client
+from app.services.openai_service import call_openai
+from benchmarks.openai_stub import StubOpenAI, serve
+
+settings = get_settings()
+
+async def one_call(client):
+    start = time.perf_counter()
+    if client is None:  # Previous behaviour: fresh client, fresh connection
+        async with httpx.AsyncClient() as fresh:
+            await call_openai([{"role": "user", "content": "hi"}], client=fresh)
+    else:
+        await call_openai([{"role": "user", "content": "hi"}], client=client)
+    return time.perf_counter() - start
+
+
+async def run(client, calls: int, concurrency: int) -> tuple[list[float], float]:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def guarded():
+        async with semaphore:
+            return await one_call(client)
+
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(guarded() for _ in range(calls)))
+    return list(latencies), time.perf_counter() - start
+
+
+def report(name: str, latencies: list[float], elapsed: float, connections: int) -> None:
+    ms = sorted(x * 1000 for x in latencies)
+    p95 = ms[int(len(ms) * 0.95) - 1]
+    print(f"{name:<28}{statistics.mean(ms):>10.2f}{ms[len(ms) // 2]:>10.2f}{p95:>10.2f}"
+          f"{len(ms) / elapsed:>12.0f}{connections:>8}")
+
+
+async def main_async(args) -> None:
+    stub = StubOpenAI(args.latency_ms)
+    server, url = serve(stub)
+    url = f"{url}/v1"
+    settings.OPENAI_BASE_URL = url
+    settings.OPENAI_API_KEY = settings.OPENAI_API_KEY or "bench"
+
+    print(f"🔌 Stub at {url}, {args.calls} calls per run, +{args.latency_ms:g} ms server latency")
+    print(f"\n{'client':<28}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'calls/s':>12}{'conns':>8}")
+    try:
+        for concurrency in (1, args.concurrency):
+            for name, shared in (("per-call", False), ("shared pool", True)):
+                client = build_client() if shared else None
+                await one_call(client)  # Warm up (and open the first pooled connection)
+                stub.connections.clear()
+                latencies, elapsed = await run(client, args.calls, concurrency)
+                report(f"{name} (x{concurrency})", latencies, elapsed, len(stub.connections))
+                if client:
+                    await client.aclose()
+    finally:
+        server.should_exit = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pooled vs per-call HTTP clients.")
+    parser.add_argument("--calls", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=0, help="Simulated server processing time")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Benchmark queue wait of chat requests behind a background backlog.
+
+Against a local OpenAI stub, queues ``--background`` summary requests
+(more than one minute's RPM budget, so the excess has to wait), then
+sends ``--chat`` chat requests while the backlog drains. Runs once with
+everything in one lane, as before priority lanes, and once with chat in
+its own interactive lane, reporting how long the chat requests took.
+
+Usage (from backend/):
+    python -m benchmarks.bench_rate_limiter [--rpm 600] [--background 700] [--chat 5]
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from app.core.config import get_settings
+from app.services import openai_service
+from app.services.http_client import build_client
+from app.services.rate_limiter import Priority, RateLimiter
+from benchmarks.openai_stub import StubOpenAI, serve
+
+settings = get_settings()
+
+MESSAGES = [{"role": "user", "content": "Summarise this chapter. " * 20}]
+
+
+async def call(client, priority: Priority) -> float:
+    start = time.perf_counter()
+    await openai_service.call_openai(MESSAGES, max_tokens=300, client=client, priority=priority)
+    return time.perf_counter() - start
+
+
+async def scenario(client, args, chat_priority: Priority) -> list[float]:
+    openai_service.rate_limiter = RateLimiter(rpm=args.rpm, tpm=0)
+    background = [asyncio.create_task(call(client, Priority.BACKGROUND)) for _ in range(args.background)]
+    chat = []
+    for _ in range(args.chat):
+        await asyncio.sleep(60 / args.rpm * 5)  # Chat trickles in while the backlog drains
+        chat.append(asyncio.create_task(call(client, chat_priority)))
+    await asyncio.gather(*background)
+    return await asyncio.gather(*chat)
+
+
+async def main_async(args) -> None:
+    server, url = serve(StubOpenAI())
+    settings.OPENAI_BASE_URL = f"{url}/v1"
+    settings.OPENAI_API_KEY = settings.OPENAI_API_KEY or "bench"
+
+    print(f"🔌 {args.background} background requests queued at {args.rpm} RPM, then {args.chat} chat requests")
+    print(f"\n{'lanes':<18}{'chat mean ms':>14}{'chat max ms':>13}{'background wait mean ms':>25}")
+    client = build_client()
+    try:
+        await asyncio.gather(*(call(client, Priority.ANALYSIS) for _ in range(100)))  # Warm up the pool
+        for name, chat_priority in (("one lane (FIFO)", Priority.BACKGROUND), ("priority lanes", Priority.INTERACTIVE)):
+            chat = [x * 1000 for x in await scenario(client, args, chat_priority)]
+            background = openai_service.rate_limiter.get_stats()["lanes"]["background"]
+            print(f"{name:<18}{statistics.mean(chat):>14.1f}{max(chat):>13.1f}{background['wait_ms_mean']:>25.1f}")
+    finally:
+        await client.aclose()
+        server.should_exit = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chat queue wait behind background work.")
+    parser.add_argument("--rpm", type=int, default=600)
+    parser.add_argument("--background", type=int, default=700)
+    parser.add_argument("--chat", type=int, default=5)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Benchmark time to the first insight / dialectic section, blocking vs streamed.
+
+Runs the app and a streaming OpenAI stub that writes a realistic insights
+or dialectic JSON reply 4 characters per token, ``--token-delay-ms`` apart.
+The blocking endpoints return once the whole reply has arrived; the SSE
+endpoints send each insight or section as soon as it is complete.
+
+Usage (from backend/):
+    python -m benchmarks.bench_structured_stream [--requests 5] [--token-delay-ms 5] [--latency-ms 300]
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+
+from app.core.config import get_settings
+from benchmarks.openai_stub import StubOpenAI, serve
+
+settings = get_settings()
+
+INSIGHTS = {"insights": [
+    {
+        "title": f"Insight {i}: Specialisation Multiplies Output",
+        "summary": "Dividing work into narrow tasks raises output far more than adding workers doing the same task.",
+        "evidence": "Ten workers in the pin factory produce 48,000 pins a day, against perhaps 200 working alone.",
+        "implication": "When a team stalls, look at how the work is split before adding headcount.",
+        "insight_type": "causal",
+    }
+    for i in range(5)
+]}
+
+CRITIC = {"thinker": "Karl Marx", "era": "19th century", "critique": "Specialisation alienates workers from their labour.",
+          "keyWork": "Capital"}
+IMPACT = {"domain": "Labour markets", "consequence": "Productivity gains concentrate in specialised firms",
+          "severity": "high"}
+DIALECTIC = {
+    "thesis": {"statement": "Division of labour is the main source of productivity growth.",
+               "keyArguments": ["Dexterity", "Time saved switching tasks", "Invention of machines"],
+               "evidenceFromText": "The pin factory example."},
+    "antithesis": {"historicalCritics": [CRITIC] * 2, "modernCritics": [CRITIC] * 2,
+                   "contemporaryDebates": [{"topic": "Automation", "modernContext": "AI replaces narrow tasks",
+                                            "currentRelevance": "Specialised roles are the easiest to automate"}]},
+    "synthesis": {"nuancedPosition": "Specialisation raises output but needs counterweights.",
+                  "conditionsWhereThesisHolds": ["Stable demand", "Routine work"],
+                  "conditionsWhereCriticsAreRight": ["Creative work", "Rapid change"],
+                  "modernPerspective": "Pair specialisation with rotation and retraining."},
+    "implications": {"ifThesisTrue": [IMPACT] * 2, "ifCriticsRight": [IMPACT] * 2,
+                     "realWorldExamples": [{"example": "Ford assembly line", "supports": "thesis",
+                                            "description": "Model T build time fell from 12 hours to 93 minutes",
+                                            "year": "1913"}]},
+}
+
+CHAPTER = {"chapter_title": "Of the Division of Labour", "chapter_content": "It is the great multiplication... " * 50}
+CASES = [
+    ("insights", INSIGHTS, "/analysis/insights", "insight",
+     {**CHAPTER, "book_title": "The Wealth of Nations", "save_to_db": False, "use_cache": False}),
+    ("dialectic", DIALECTIC, "/analysis/dialectic", "section",
+     {**CHAPTER, "book_title": "The Wealth of Nations", "author": "Adam Smith", "use_cache": False}),
+]
+
+
+async def blocking(client: httpx.AsyncClient, url: str, payload: dict, event: str) -> tuple[float, float]:
+    start = time.perf_counter()
+    response = await client.post(url, json=payload)
+    response.raise_for_status()
+    elapsed = time.perf_counter() - start
+    return elapsed, elapsed
+
+
+async def streamed(client: httpx.AsyncClient, url: str, payload: dict, event: str) -> tuple[float, float]:
+    start = time.perf_counter()
+    first = None
+    async with client.stream("POST", f"{url}/stream", json=payload) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if first is None and line == f"event: {event}":
+                first = time.perf_counter() - start
+            elif line == "event: error":
+                raise RuntimeError("stream reported an error")
+    return first, time.perf_counter() - start
+
+
+async def main_async(args) -> None:
+    stub = StubOpenAI(args.latency_ms, token_delay_ms=args.token_delay_ms)
+    stub_server, stub_url = serve(stub)
+    settings.OPENAI_BASE_URL = f"{stub_url}/v1"
+    settings.OPENAI_API_KEY = settings.OPENAI_API_KEY or "bench"
+
+    from app.main import app
+    app_server, app_url = serve(app)
+
+    print(f"🔌 Stub: 4 chars per token, {args.token_delay_ms:g} ms apart, +{args.latency_ms:g} ms latency; "
+          f"{args.requests} requests per endpoint")
+    print(f"\n{'endpoint':<28}{'first mean':>12}{'first p50':>12}{'total mean':>12}{'total p50':>12}")
+    try:
+        async with httpx.AsyncClient(timeout=None) as client:
+            for name, reply, path, event, payload in CASES:
+                stub.pieces = StubOpenAI(content=json.dumps(reply, indent=2)).pieces
+                for label, call in (("", blocking), ("/stream", streamed)):
+                    await call(client, app_url + path, payload, event)  # Warm up
+                    results = [await call(client, app_url + path, payload, event) for _ in range(args.requests)]
+                    first = sorted(r[0] * 1000 for r in results)
+                    total = sorted(r[1] * 1000 for r in results)
+                    print(f"{path + label:<28}{statistics.mean(first):>12.1f}{first[len(first) // 2]:>12.1f}"
+                          f"{statistics.mean(total):>12.1f}{total[len(total) // 2]:>12.1f}")
+    finally:
+        app_server.should_exit = True
+        stub_server.should_exit = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark time to the first structured item, blocking vs streamed.")
+    parser.add_argument("--requests", type=int, default=5)
+    parser.add_argument("--token-delay-ms", type=float, default=5)
+    parser.add_argument("--latency-ms", type=float, default=300, help="Delay before the first token")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Local stand-in for the OpenAI chat completions API, used by the benchmarks.
+
+Answers ``POST /v1/chat/completions`` after a configurable delay, either as
+one JSON body or, with ``"stream": true``, as SSE chunks emitted one token
+at a time. The reply is ``tok0 tok1 ...`` or a given ``content`` split into
+4-character tokens. Records the client connections it saw.
+"""
+
+import asyncio
+import json
+import socket
+import threading
+import time
+from typing import Optional
+
+import uvicorn
+
+
+class StubOpenAI:
+    """Minimal ASGI app answering chat completions."""
+
+    def __init__(self, latency_ms: float = 0, tokens: int = 1, token_delay_ms: float = 0,
+                 content: Optional[str] = None):
+        self.latency = latency_ms / 1000
+        if content is None:
+            self.pieces = [f"tok{i}" if i == tokens - 1 else f"tok{i} " for i in range(tokens)]
+        else:
+            self.pieces = [content[i:i + 4] for i in range(0, len(content), 4)]
+        self.token_delay = token_delay_ms / 1000
+        self.connections = set()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return
+        self.connections.add(tuple(scope["client"]))
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        stream = bool(body and json.loads(body).get("stream"))
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if not stream:
+            # A non-streaming completion arrives once every token is generated
+            await asyncio.sleep(self.token_delay * len(self.pieces))
+            content = "".join(self.pieces)
+            await send({"type": "http.response.start", "status": 200,
+                        "headers": [(b"content-type", b"application/json")]})
+            await send({"type": "http.response.body", "body": json.dumps(
+                {"choices": [{"message": {"role": "assistant", "content": content}}]}).encode()})
+            return
+
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"text/event-stream")]})
+        for piece in self.pieces:
+            chunk = {"choices": [{"delta": {"content": piece}, "finish_reason": None}]}
+            await send({"type": "http.response.body", "body": f"data: {json.dumps(chunk)}\n\n".encode(),
+                        "more_body": True})
+            await asyncio.sleep(self.token_delay)
+        final = {"choices": [{"delta": {}, "finish_reason": "stop"}]}
+        usage = {"choices": [], "usage": {"prompt_tokens": 10, "completion_tokens": len(self.pieces),
+                                          "total_tokens": 10 + len(self.pieces)}}
+        tail = f"data: {json.dumps(final)}\n\ndata: {json.dumps(usage)}\n\ndata: [DONE]\n\n"
+        await send({"type": "http.response.body", "body": tail.encode()})
+
+
+def serve(app, **config) -> tuple[uvicorn.Server, str]:
+    """Run an ASGI app on a free local port in a background thread."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning",
+                                           timeout_keep_alive=60, **config))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server, f"http://127.0.0.1:{port}"
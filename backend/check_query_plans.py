@@ -0,0 +1,251 @@
+"""Query-plan regression check and index audit.
+
+Seeds a throwaway SQLite database, runs every read/update/delete path in
+``crud`` (plus search and FTS maintenance statements), captures the SQL each
+one issues and runs EXPLAIN QUERY PLAN on it. The check fails when a plan
+contains a full table scan or a temp B-tree sort, or when an index is a
+redundant prefix of another index on the same table.
+
+Exits non-zero on failure, so it can gate CI.
+
+Usage:
+    python check_query_plans.py [--verbose]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, event, insert, text
+from sqlalchemy.orm import sessionmaker
+
+from app.db import crud
+from app.db import search as search_index
+from app.db.database import init_db
+from app.db.models import Book, Chapter, Insight, Note, UserBook, generate_uuid
+
+NUM_BOOKS = 300
+CHAPTERS_PER_BOOK = 12
+INSIGHTS_PER_CHAPTER = 4
+NUM_USERS = 40
+
+
+def seed(engine) -> dict:
+    """Fill the database with enough rows that the planner prefers indexes."""
+    rng = random.Random(42)
+    now = datetime(2025, 1, 1)
+    categories = ["physics", "philosophy", "economics", "psychology", "Uploaded"]
+    books, chapters, insights, user_books, notes = [], [], [], [], []
+
+    for b in range(NUM_BOOKS):
+        book_id = generate_uuid()
+        books.append({
+            "id": book_id, "title": f"Book {b:04d}", "author": f"Author {b % 37}",
+            "category": rng.choice(categories), "sample_id": f"sample-{b}" if b % 10 == 0 else None,
+            "created_at": now + timedelta(minutes=b), "total_chapters": CHAPTERS_PER_BOOK,
+        })
+        for n in range(1, CHAPTERS_PER_BOOK + 1):
+            chapter_id = generate_uuid()
+            chapters.append({
+                "id": chapter_id, "book_id": book_id, "number": n, "title": f"Chapter {n}",
+                "summary": "Summary", "key_points": [], "word_count": 100,
+            })
+            for i in range(INSIGHTS_PER_CHAPTER):
+                insights.append({
+                    "id": generate_uuid(), "book_id": book_id, "chapter_id": chapter_id,
+                    "title": f"Insight {i} about feedback loops", "summary": "s", "evidence": "e",
+                    "implication": "i", "created_at": now + timedelta(seconds=len(insights)),
+                })
+
+    for u in range(NUM_USERS):
+        for book in rng.sample(books, 20):
+            user_books.append({
+                "id": generate_uuid(), "user_id": f"user-{u}", "book_id": book["id"],
+                "last_read_at": now + timedelta(minutes=rng.randint(0, 10000)),
+            })
+        for chapter in rng.sample(chapters, 30):
+            notes.append({
+                "id": generate_uuid(), "user_id": f"user-{u}", "book_id": chapter["book_id"],
+                "chapter_id": chapter["id"], "content": "A note on entropy", "start_index": 10, "end_index": 40,
+            })
+
+    with engine.begin() as conn:
+        conn.execute(insert(Book), books)
+        conn.execute(insert(Chapter), chapters)
+        conn.execute(insert(Insight), insights)
+        conn.execute(insert(UserBook), user_books)
+        conn.execute(insert(Note), notes)
+        conn.execute(text("ANALYZE"))
+
+    return {
+        "book": books[5], "sample_book": books[10], "chapter": chapters[7],
+        "insight": insights[3], "user_book": user_books[0], "note": notes[0],
+    }
+
+
+def audited_calls(ids: dict):
+    """(label, callable) pairs covering the crud query paths."""
+    book_id, chapter_id = ids["book"]["id"], ids["chapter"]["id"]
+    user_id, note = ids["user_book"]["user_id"], ids["note"]
+    mid = datetime(2025, 1, 1, 2)
+
+    def page_two(fn):
+        def run(db):
+            _, cursor = fn(db, None)
+            if cursor:
+                fn(db, cursor)
+        return run
+
+    return [
+        ("get_book", lambda db: crud.get_book(db, book_id)),
+        ("get_book_by_sample_id", lambda db: crud.get_book_by_sample_id(db, ids["sample_book"]["sample_id"])),
+        ("list_books newest", page_two(lambda db, c: crud.list_books(db, limit=20, cursor=c))),
+        ("list_books by title", page_two(lambda db, c: crud.list_books(db, sort="title", descending=False, limit=20, cursor=c))),
+        ("list_books category", page_two(lambda db, c: crud.list_books(db, category="physics", limit=20, cursor=c))),
+        ("list_books category by title", page_two(lambda db, c: crud.list_books(db, category="physics", sort="title", limit=20, cursor=c))),
+        ("list_books author", page_two(lambda db, c: crud.list_books(db, author="Author 3", limit=5, cursor=c))),
+        ("list_books author by title", page_two(lambda db, c: crud.list_books(db, author="Author 3", sort="title", limit=5, cursor=c))),
+        ("list_books created range", lambda db: crud.list_books(db, created_after=mid, created_before=mid + timedelta(hours=1))),
+        ("get_chapter", lambda db: crud.get_chapter(db, chapter_id)),
+        ("get_chapter_token_count", lambda db: crud.get_chapter_token_count(db, chapter_id, "word " * 100)),
+        ("get_chapter_by_number", lambda db: crud.get_chapter_by_number(db, book_id, 3)),
+        ("get_chapters_by_book", lambda db: crud.get_chapters_by_book(db, book_id, with_content=True)),
+        ("get_chapters_page", page_two(lambda db, c: crud.get_chapters_page(db, book_id, 5, c))),
+        ("get_chapter_location", lambda db: crud.get_chapter_location(db, chapter_id)),
+        ("get_insight", lambda db: crud.get_insight(db, ids["insight"]["id"])),
+        ("get_insights_by_chapter", lambda db: crud.get_insights_by_chapter(db, chapter_id)),
+        ("get_insights_page", page_two(lambda db, c: crud.get_insights_page(db, book_id, 10, c))),
+        ("has_insights_for_chapter", lambda db: crud.has_insights_for_chapter(db, chapter_id)),
+        ("replace_chapter_insights", lambda db: crud.replace_chapter_insights(
+            db, book_id, chapter_id, [{"title": "t", "summary": "s", "evidence": "e", "implication": "i"}])),
+        ("update_insight", lambda db: crud.update_insight(db, ids["insight"]["id"], title="Edited")),
+        ("delete_insights_by_chapter", lambda db: crud.delete_insights_by_chapter(db, chapter_id)),
+        ("get_user_book", lambda db: crud.get_user_book(db, user_id, ids["user_book"]["book_id"])),
+        ("get_user_books", lambda db: crud.get_user_books(db, user_id)),
+        ("get_shelf", page_two(lambda db, c: crud.get_shelf(db, user_id, limit=5, cursor=c))),
+        ("get_notes_by_chapter", lambda db: crud.get_notes_by_chapter(db, note["user_id"], note["chapter_id"])),
+        ("get_notes_in_range", lambda db: crud.get_notes_in_range(db, note["user_id"], note["chapter_id"], 0, 100)),
+        ("delete_note", lambda db: crud.delete_note(db, note["id"], note["user_id"])),
+        ("search", lambda db: search_index.search(db, "feedback", list(search_index.SEARCH_TYPES),
+                                                  book_id=book_id, user_id=user_id)),
+    ]
+
+
+def maintenance_statements(ids: dict):
+    """FTS sync statements that run inside triggers, where the capture hook cannot see them."""
+    params = {"id": ids["chapter"]["id"]}
+    for table in search_index.FTS_TABLES:
+        for statement in search_index.fts_delete_sql(table, ":id").split(";"):
+            if statement.strip():
+                yield f"trigger delete ({table})", statement.strip(), params
+
+
+def plan_problems(plan_rows) -> list[str]:
+    """Full scans and temp B-tree sorts in an EXPLAIN QUERY PLAN result."""
+    problems = []
+    for row in plan_rows:
+        detail = row[-1]
+        if detail.startswith("SCAN ") and " USING " not in detail and "VIRTUAL TABLE" not in detail \
+                and not detail.startswith("SCAN CONSTANT ROW"):
+            problems.append(detail)
+        if "USE TEMP B-TREE" in detail:
+            problems.append(detail)
+    return problems
+
+
+def redundant_indexes(conn) -> list[str]:
+    """Non-unique indexes whose columns are a leading prefix of another index."""
+    findings = []
+    tables = [r[0] for r in conn.execute(text(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' AND sql NOT LIKE '%VIRTUAL%'"
+    ))]
+    for table in tables:
+        indexes = {}
+        for _, name, unique, origin, _ in conn.execute(text(f"PRAGMA index_list('{table}')")):
+            columns = [r[2] for r in conn.execute(text(f"PRAGMA index_info('{name}')"))]
+            indexes[name] = (columns, unique or origin == "pk")
+        for name, (columns, unique) in indexes.items():
+            if unique:
+                continue
+            for other, (other_columns, _) in indexes.items():
+                if other != name and other_columns[:len(columns)] == columns:
+                    findings.append(f"{table}.{name} {columns} is a prefix of {other} {other_columns}")
+                    break
+    return findings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check crud query plans for scans and sorts.")
+    parser.add_argument("--verbose", action="store_true", help="Print every statement and plan")
+    args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    engine = create_engine(f"sqlite:///{path}")
+    try:
+        init_db(engine)
+        ids = seed(engine)
+        Session = sessionmaker(bind=engine, autoflush=False)
+
+        captured = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            if not statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+                return
+            captured.append((statement, parameters[0] if executemany else parameters))
+
+        failures = []
+        checked = 0
+        for label, call in audited_calls(ids):
+            captured.clear()
+            event.listen(engine, "before_cursor_execute", capture)
+            try:
+                with Session() as db:
+                    call(db)
+            finally:
+                event.remove(engine, "before_cursor_execute", capture)
+
+            for statement, parameters in list(captured):
+                with engine.connect() as conn:
+                    plan = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+                checked += 1
+                problems = plan_problems(plan)
+                if problems:
+                    failures.append((label, statement, problems))
+                if args.verbose or problems:
+                    print(f"{'❌' if problems else '✅'} {label}: {' '.join(statement.split())[:160]}")
+                    for row in plan:
+                        print(f"      {row[-1]}")
+
+        with engine.connect() as conn:
+            for label, statement, params in maintenance_statements(ids):
+                plan = conn.execute(text(f"EXPLAIN QUERY PLAN {statement}"), params).all()
+                checked += 1
+                problems = plan_problems(plan)
+                if problems:
+                    failures.append((label, statement, problems))
+                if args.verbose or problems:
+                    print(f"{'❌' if problems else '✅'} {label}: {statement[:160]}")
+
+            redundant = redundant_indexes(conn)
+
+        print(f"\n🔎 Checked {checked} statements from {len(audited_calls(ids))} crud paths")
+        for finding in redundant:
+            print(f"❌ Redundant index: {finding}")
+        for label, statement, problems in failures:
+            print(f"❌ {label}: {'; '.join(problems)}")
+
+        if failures or redundant:
+            print(f"\n❌ {len(failures)} plan regressions, {len(redundant)} redundant indexes")
+            sys.exit(1)
+        print("✅ No full scans, temp B-tree sorts or redundant indexes")
+    finally:
+        engine.dispose()
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Run SQLite maintenance by hand.
+
+The API runs the same tasks from its background scheduler; this script is
+for cron jobs and one-off operations.
+
+``--enable-incremental-vacuum`` switches existing databases (created before
+auto_vacuum was set) to incremental auto-vacuum. That needs one full VACUUM,
+which blocks writers while it runs, so do it during a quiet period.
+
+Usage:
+    python maintenance.py [--backup] [--enable-incremental-vacuum]
+"""
+
+import argparse
+import json
+
+from sqlalchemy import text
+
+from app.core.config import get_settings
+from app.db.database import engine, init_db, shards
+from app.db.maintenance import backup_all, scheduler
+
+settings = get_settings()
+
+
+def enable_incremental_vacuum() -> None:
+    binds = {"main": engine}
+    if settings.DATABASE_SHARDING:
+        binds.update({f"tenant:{t}": shards.engine(t) for t in shards.tenants()})
+    for name, bind in binds.items():
+        with bind.connect() as conn:
+            if conn.execute(text("PRAGMA auto_vacuum")).scalar() == 2:
+                print(f"✅ {name}: already incremental")
+                continue
+            conn.execute(text("PRAGMA auto_vacuum=INCREMENTAL"))
+            conn.commit()
+            conn.execute(text("VACUUM"))
+            print(f"✅ {name}: auto_vacuum=INCREMENTAL")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite maintenance: optimize, vacuum, checkpoint, backup.")
+    parser.add_argument("--backup", action="store_true", help="Only take an online backup")
+    parser.add_argument("--enable-incremental-vacuum", action="store_true",
+                        help="Convert existing databases to incremental auto-vacuum (one full VACUUM)")
+    args = parser.parse_args()
+
+    init_db()
+    if args.enable_incremental_vacuum:
+        enable_incremental_vacuum()
+    elif args.backup:
+        print(f"💾 Backup written to {backup_all()}")
+    else:
+        print(json.dumps(scheduler.run_once(force=True), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""Rewrite book and chapter text into the compressed storage format.
+
+Rows stored before compression was enabled are plain TEXT. This script finds
+them with SQLite's typeof() and rewrites them in batches through the
+CompressedText column type, then optionally VACUUMs to return the space.
+
+With ``--to-segments`` chapter text is instead moved into the mmap segment
+store (CONTENT_BACKEND=segments) and cleared from the chapters table.
+
+With ``--token-counts`` chapters stored before token counts were recorded
+at ingest get their prompt token count.
+
+Usage:
+    python migrate_content.py [--codec auto|zlib|zstd|none] [--batch-size 200] [--vacuum]
+    python migrate_content.py --to-segments [--vacuum]
+    python migrate_content.py --token-counts
+"""
+
+import argparse
+
+from sqlalchemy import LargeBinary, bindparam, select, text, update
+
+from app.db import crud
+from app.db.compression import compress_text, resolve_codec
+from app.db.content_store import get_content_store
+from app.db.database import SessionLocal, engine, init_db
+from app.db.models import Book, Chapter, ChapterSegment
+from app.services.context_packing import count_tokens
+
+
+def migrate_table(model, codec: int, batch_size: int, recompress: bool) -> tuple[int, int, int]:
+    """Compress uncompressed rows of one table. Returns (rows, bytes before, bytes after)."""
+    table = model.__table__
+    rows_done = bytes_before = bytes_after = 0
+    condition = "typeof(content) = 'text'"
+    if recompress:
+        condition += " OR typeof(content) = 'blob'"
+
+    stmt = update(table).where(table.c.id == bindparam("row_id")).values(
+        content=bindparam("new_content", type_=LargeBinary)  # already packed, skip CompressedText
+    )
+    last_id = ""
+    while True:
+        with engine.begin() as conn:
+            batch = conn.execute(
+                select(table.c.id, table.c.content)
+                .where(text(f"({condition})"), table.c.id > last_id)
+                .order_by(table.c.id)
+                .limit(batch_size)
+            ).all()
+            if not batch:
+                break
+
+            params = []
+            for row_id, content in batch:
+                raw = content.encode("utf-8")
+                packed = compress_text(content, codec)
+                bytes_before += len(raw)
+                bytes_after += len(packed)
+                params.append({"row_id": row_id, "new_content": packed})
+            conn.execute(stmt, params)
+            rows_done += len(batch)
+            last_id = batch[-1][0]
+        print(f"   {table.name}: {rows_done} rows rewritten")
+    return rows_done, bytes_before, bytes_after
+
+
+def migrate_chapters_to_segments(batch_size: int) -> int:
+    """Move chapter text from the database into the segment store."""
+    store = get_content_store()
+    if store is None:
+        raise SystemExit("❌ Set CONTENT_BACKEND=segments to migrate into the segment store")
+
+    moved = 0
+    while True:
+        with SessionLocal() as db:
+            chapters = db.query(Chapter).outerjoin(
+                ChapterSegment, ChapterSegment.chapter_id == Chapter.id
+            ).filter(
+                ChapterSegment.chapter_id.is_(None),
+                Chapter.content.isnot(None)
+            ).limit(batch_size).all()
+            if not chapters:
+                break
+            for chapter in chapters:
+                location = store.append(chapter.content)
+                db.add(ChapterSegment(chapter_id=chapter.id, **location._asdict()))
+                chapter.content = None
+            db.commit()
+            moved += len(chapters)
+        print(f"   chapters: {moved} moved to segments")
+    return moved
+
+
+def backfill_token_counts(batch_size: int) -> int:
+    """Count prompt tokens for chapters that have no stored count."""
+    counted = 0
+    while True:
+        with SessionLocal() as db:
+            chapters = db.query(Chapter).filter(Chapter.token_count.is_(None)).limit(batch_size).all()
+            if not chapters:
+                break
+            contents = crud.get_chapter_contents(db, chapters)
+            for chapter in chapters:
+                chapter.token_count = count_tokens(contents.get(chapter.id))
+            db.commit()
+            counted += len(chapters)
+        print(f"   chapters: {counted} counted")
+    return counted
+
+
+def vacuum():
+    print("🧹 Running VACUUM...")
+    with engine.connect() as conn:
+        conn.execution_options(isolation_level="AUTOCOMMIT").exec_driver_sql("VACUUM")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compress stored book and chapter text.")
+    parser.add_argument("--codec", default=None, help="auto, zlib, zstd or none (default: CONTENT_COMPRESSION)")
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--recompress", action="store_true", help="Also rewrite rows that are already compressed")
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM afterwards to shrink the file")
+    parser.add_argument("--to-segments", action="store_true", help="Move chapter text into the segment store")
+    parser.add_argument("--token-counts", action="store_true", help="Store token counts for chapters missing one")
+    args = parser.parse_args()
+
+    if args.token_counts:
+        print("🧮 Counting chapter tokens...")
+        init_db()
+        counted = backfill_token_counts(args.batch_size)
+        print(f"✅ {counted} chapters counted")
+        return
+
+    if args.to_segments:
+        print("📦 Moving chapter text into the segment store...")
+        init_db()
+        moved = migrate_chapters_to_segments(args.batch_size)
+        print(f"✅ {moved} chapters moved")
+        if args.vacuum:
+            vacuum()
+        return
+
+    codec = resolve_codec(args.codec)
+    print(f"🗜️  Migrating content columns (codec marker {codec})...")
+    init_db()
+
+    total_before = total_after = 0
+    for model in (Book, Chapter):
+        rows, before, after = migrate_table(model, codec, args.batch_size, args.recompress)
+        total_before += before
+        total_after += after
+        print(f"✅ {model.__tablename__}: {rows} rows, {before:,} -> {after:,} bytes")
+
+    if total_before:
+        print(f"\n📉 Content size: {total_before:,} -> {total_after:,} bytes "
+              f"({100 * (1 - total_after / total_before):.1f}% smaller)")
+
+    if args.vacuum:
+        vacuum()
+
+    print("\n✅ Content migration complete!")
+
+
+if __name__ == "__main__":
+    main()
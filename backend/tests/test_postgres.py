@@ -0,0 +1,192 @@
+"""PostgreSQL backend: COPY bulk loads, compressed bytea text, keyset pagination, engine setup.
+
+Runs against a scratch database named by ``TEST_POSTGRES_URL`` (e.g.
+``postgresql+psycopg://localhost/bookmind_test``) and is skipped without it.
+The schema is created for the run and dropped afterwards.
+
+Usage (from backend/):
+    TEST_POSTGRES_URL=postgresql+psycopg://localhost/bookmind_test python -m unittest discover tests
+"""
+
+import os
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import get_settings
+from app.db import compression, crud
+from app.db.bulk import copy_supported
+from app.db.database import Base, create_db_engine, init_db
+from app.db.models import Book, Chapter
+
+settings = get_settings()
+
+POSTGRES_URL = os.environ.get("TEST_POSTGRES_URL")
+
+# Characters with a meaning in COPY text format, and text long enough to be compressed
+AWKWARD = "tab\there\nnew line\\backslash \\N not null\r\n naïve 中文 ✓"
+LONG = "The quick brown fox jumps over the lazy dog. " * 200
+
+
+@unittest.skipUnless(POSTGRES_URL, "set TEST_POSTGRES_URL to a scratch PostgreSQL database")
+class PostgresTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.engine = create_db_engine(POSTGRES_URL)
+        init_db(cls.engine)
+        cls.Session = sessionmaker(autocommit=False, autoflush=False, bind=cls.engine)
+
+    @classmethod
+    def tearDownClass(cls):
+        Base.metadata.drop_all(cls.engine)
+        cls.engine.dispose()
+
+    def setUp(self):
+        self.db = self.Session()
+        self.book_id = crud.get_or_create_book(self.db, title="Postgres test book").id
+
+    def tearDown(self):
+        self.db.close()
+
+    def stored_bytes(self, table: str, row_id: str) -> bytes:
+        with self.engine.connect() as conn:
+            return bytes(conn.execute(text(f"SELECT content FROM {table} WHERE id = :id"), {"id": row_id}).scalar())
+
+    def test_copy_insert_chapters(self):
+        self.assertTrue(copy_supported(self.engine))
+        data = [
+            {"number": 1, "title": AWKWARD, "content": AWKWARD, "summary": None, "key_points": [AWKWARD, "b"]},
+            {"number": 2, "title": "Long", "content": LONG, "summary": "", "key_points": None, "token_count": 450},
+        ]
+        created = [(c.id, c.number) for c in crud.create_chapters(self.db, self.book_id, data)]
+        self.assertEqual([number for _, number in created], [1, 2])
+
+        self.db.expunge_all()
+        chapters = crud.get_chapters_by_book(self.db, self.book_id, with_content=True)
+        self.assertEqual([c.id for c in chapters], [chapter_id for chapter_id, _ in created])
+        first, second = chapters
+        self.assertEqual((first.title, first.content, first.summary, first.key_points),
+                         (AWKWARD, AWKWARD, None, [AWKWARD, "b"]))
+        self.assertEqual((second.content, second.summary, second.key_points, second.token_count), (LONG, "", [], 450))
+        self.assertEqual(first.word_count, len(AWKWARD.split()))
+
+    def test_copy_insert_insights(self):
+        chapter_id = crud.create_chapters(self.db, self.book_id, [{"number": 1, "title": "C", "content": "text"}])[0].id
+        insights = crud.create_insights_batch(self.db, self.book_id, chapter_id, [
+            {"title": AWKWARD, "summary": AWKWARD, "evidence": "", "implication": "\\N"},
+            {"title": "Second", "summary": "s", "evidence": "e", "implication": "i", "insight_type": "principle"},
+        ], ai_model="test-model")
+        insight_ids = {i.id for i in insights}
+
+        self.db.expunge_all()
+        stored = crud.get_insights_by_chapter(self.db, chapter_id)
+        self.assertEqual({i.id for i in stored}, insight_ids)
+        by_title = {i.title: i for i in stored}
+        self.assertEqual((by_title[AWKWARD].summary, by_title[AWKWARD].evidence, by_title[AWKWARD].implication),
+                         (AWKWARD, "", "\\N"))
+        self.assertEqual((by_title["Second"].insight_type, by_title["Second"].ai_model), ("principle", "test-model"))
+        self.assertTrue(all(i.created_at is not None for i in stored))
+
+    def test_compressed_text_is_bytea(self):
+        with self.engine.connect() as conn:
+            types = dict(conn.execute(text(
+                "SELECT table_name, data_type FROM information_schema.columns "
+                "WHERE column_name = 'content' AND table_name IN ('books', 'chapters')"
+            )).all())
+        self.assertEqual(types, {"books": "bytea", "chapters": "bytea"})
+
+    def test_compressed_text_round_trip(self):
+        values = ["", "short", AWKWARD, LONG]
+        ids = [crud.get_or_create_book(self.db, title=f"Round trip {i}", content=v).id for i, v in enumerate(values)]
+        self.db.expunge_all()
+        for book_id, value in zip(ids, values):
+            self.assertEqual(self.db.get(Book, book_id).content, value)
+
+        self.assertEqual(self.stored_bytes("books", ids[1])[0], compression.CODEC_RAW)  # Too short to compress
+        self.assertNotEqual(self.stored_bytes("books", ids[3])[0], compression.CODEC_RAW)
+        self.assertLess(len(self.stored_bytes("books", ids[3])), len(LONG))
+
+    def test_compressed_text_round_trip_with_compression_disabled(self):
+        with mock.patch.object(compression.settings, "CONTENT_COMPRESSION_ENABLED", False):
+            book_id = crud.get_or_create_book(self.db, title="Uncompressed", content=LONG).id
+            chapter_id = crud.create_chapters(self.db, book_id, [{"number": 1, "title": "C", "content": LONG}])[0].id
+        self.db.expunge_all()
+        self.assertEqual(self.db.get(Book, book_id).content, LONG)
+        self.assertEqual(crud.get_chapter_content(self.db, self.db.get(Chapter, chapter_id)), LONG)
+        self.assertEqual(self.stored_bytes("books", book_id), bytes([compression.CODEC_RAW]) + LONG.encode("utf-8"))
+
+    def test_chapter_keyset_pages(self):
+        crud.create_chapters(self.db, self.book_id, [
+            {"number": n, "title": f"Chapter {n}", "content": f"text {n}"} for n in range(1, 8)
+        ])
+        numbers, cursor = [], None
+        while True:
+            chapters, cursor = crud.get_chapters_page(self.db, self.book_id, 3, cursor)
+            numbers.extend(c.number for c in chapters)
+            if cursor is None:
+                break
+        self.assertEqual(numbers, list(range(1, 8)))
+
+    def test_insight_keyset_pages_split_timestamp_ties_on_id(self):
+        chapter_id = crud.create_chapters(self.db, self.book_id, [{"number": 1, "title": "C", "content": "text"}])[0].id
+        # One transaction, so every row gets the same created_at
+        crud.create_insights_batch(self.db, self.book_id, chapter_id, [
+            {"title": f"Insight {i}", "summary": "s"} for i in range(7)
+        ])
+        expected = [i.id for i in crud.get_insights_by_book(self.db, self.book_id)]
+        self.assertEqual(len(expected), 7)
+
+        seen, cursor = [], None
+        while True:
+            insights, cursor = crud.get_insights_page(self.db, self.book_id, 3, cursor)
+            seen.extend(i.id for i in insights)
+            if cursor is None:
+                break
+        self.assertEqual(seen, sorted(expected, reverse=True))
+
+    def test_book_keyset_pages_and_created_filter(self):
+        started = datetime.now(timezone.utc) - timedelta(seconds=1)
+        category = f"keyset-{self.book_id}"
+        ids = set()
+        for i in range(5):
+            ids.add(crud.get_or_create_book(self.db, title=f"Listed {i}", category=category).id)
+
+        seen, cursor = [], None
+        while True:
+            books, cursor = crud.list_books(self.db, category=category, created_after=started, limit=2, cursor=cursor)
+            seen.extend(b.id for b in books)
+            if cursor is None:
+                break
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(set(seen), ids)
+        self.assertEqual(crud.list_books(self.db, category=category, created_before=started)[0], [])
+
+    def test_shelf_keyset_pages(self):
+        user_id = f"user-{self.book_id}"
+        for i in range(5):
+            book_id = crud.get_or_create_book(self.db, title=f"Shelf {i}").id
+            crud.create_or_update_user_book(self.db, user_id, book_id, progress_percent=i)
+
+        seen, cursor = [], None
+        while True:
+            rows, cursor = crud.get_shelf(self.db, user_id, limit=2, cursor=cursor)
+            seen.extend(user_book.id for user_book, *_ in rows)
+            if cursor is None:
+                break
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(len(set(seen)), 5)
+
+    def test_engine_pool_and_statement_timeout(self):
+        self.assertEqual(self.engine.pool.size(), settings.DB_POOL_SIZE)
+        self.assertEqual(self.engine.pool.timeout(), settings.DB_POOL_TIMEOUT)
+        with self.engine.connect() as conn:
+            timeout_ms = conn.execute(text("SELECT setting FROM pg_settings WHERE name = 'statement_timeout'")).scalar()
+        self.assertEqual(int(timeout_ms), settings.DB_STATEMENT_TIMEOUT_MS)
+
+
+if __name__ == "__main__":
+    unittest.main()